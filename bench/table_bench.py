@@ -0,0 +1,204 @@
+########################################################################################################################
+# Table benchmarks. Times the main table operations on synthetic tables of growing size and reports rows per second and
+# peak memory, so performance regressions show up before they bite. Run from the repository root:
+#	python bench/table_bench.py
+#	python bench/table_bench.py --sizes 1e3,1e4 --ops by,aj,lj --repeat 5
+# Operations that are expected to take longer than the budget at a size, given how their time grew so far, are skipped
+# at that size and above (e.g. `distinct` is quadratic).
+########################################################################################################################
+
+import argparse, os, shutil, sys, tempfile, time, tracemalloc
+import numpy
+from typing import Callable
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from table import Table
+
+_tmp = tempfile.mkdtemp(prefix="table_bench_") # Scratch space for CSV and save/load
+
+def mkTable(n:int, seed:int=0) -> Table:
+	"""
+	Makes a trade-like table: sym (about one symbol per 100 rows), time (ascending within sym), px, qty and a unique id.
+	@param n	{int}	Rows.
+	@param seed	{int}	Random seed.
+	@return		{Table}	Table.
+	"""
+	rng = numpy.random.default_rng(seed)
+	syms = numpy.array(["s{:06d}".format(i) for i in range(max(10, n//100))])
+	sym = syms[rng.integers(0, len(syms), n)]
+	t = rng.integers(0, 10*n, n)
+	idx = numpy.lexsort((t, sym))
+
+	return Table({
+		"id": numpy.arange(n, dtype=numpy.int64),
+		"sym": sym[idx],
+		"time": t[idx],
+		"px": rng.random(n)*100,
+		"qty": rng.integers(1, 1000, n)})
+
+#-----------------------------------------------------------------------------------------------------------------------
+# Operations. Each does its (untimed) setup for `n` rows, and returns the function to time.
+#-----------------------------------------------------------------------------------------------------------------------
+
+def _init(n:int) -> Callable:
+	d = {c: mkTable(n).getCol(c) for c in ["id", "sym", "time", "px", "qty"]}
+	return lambda: Table(d)
+
+def _append(n:int) -> Callable:
+	t, u = mkTable(n), mkTable(n, 1)
+	return lambda: t.append(u)
+
+def _getKey(n:int) -> Callable:
+	t = mkTable(n)
+	t.key("id")
+	k = numpy.random.default_rng(1).permutation(n)
+	return lambda: t.getKey(k)
+
+def _setKey(n:int) -> Callable:
+	t = mkTable(n)
+	t.key("id")
+	k = numpy.random.default_rng(1).permutation(n)
+	v = numpy.zeros(n)
+	return lambda: t.setKey(k, [v], "px")
+
+def _by(n:int) -> Callable:
+	t = mkTable(n)
+	return lambda: t.by("sym", {"qty": [sum, "qty"], "px": [max, "px"]})
+
+def _aj(n:int) -> Callable:
+	t, u = mkTable(n), mkTable(n, 1)
+	q = Table({"sym": u.getCol("sym"), "time": u.getCol("time"), "bid": u.getCol("px")})
+	return lambda: t.aj(q, ["sym", "time"])
+
+def _lj(n:int) -> Callable:
+	t = mkTable(n)
+	ref = t.by("sym", {"n": [len, "id"]})
+	ref.key("sym")
+	return lambda: t.lj(ref)
+
+def _distinct(n:int) -> Callable:
+	t = mkTable(n)
+	t.takeCol(["sym"])
+	return lambda: t.distinct()
+
+def _sort(n:int) -> Callable:
+	t = mkTable(n)
+	return lambda: t.sort(["qty", "px"], desc=[True, False])
+
+def _csv(n:int) -> Callable:
+	t = mkTable(n)
+	f = os.path.join(_tmp, "t.csv")
+	return lambda: (t.toCSV(file=f), Table.fromCSV(f, [int, str, int, float, int]))
+
+def _saveLoad(n:int) -> Callable:
+	t = mkTable(n)
+	loc = os.path.join(_tmp, "t")
+	if os.path.isdir(loc): shutil.rmtree(loc)
+	return lambda: (t.save(loc), Table.load(loc))
+
+OPS = {
+	"init": _init,
+	"append": _append,
+	"getKey": _getKey,
+	"setKey": _setKey,
+	"by": _by,
+	"aj": _aj,
+	"lj": _lj,
+	"distinct": _distinct,
+	"sort": _sort,
+	"csv": _csv,
+	"saveLoad": _saveLoad}
+
+#-----------------------------------------------------------------------------------------------------------------------
+# Running.
+#-----------------------------------------------------------------------------------------------------------------------
+
+def bench(op:str, n:int, repeat:int=3) -> tuple:
+	"""
+	Benchmarks an operation.
+	@param op		{string}	Operation (see `OPS`).
+	@param n		{int}		Rows.
+	@param repeat	{int}		Timed runs (best is kept).
+	@return			{tuple}		Best time (seconds) and peak memory allocated by the operation (bytes). Memory is
+								traced in a separate run, as tracing slows things down.
+	"""
+	secs = float("inf")
+
+	for _ in range(repeat):
+		f = OPS[op](n)
+		start = time.perf_counter()
+		f()
+		secs = min(secs, time.perf_counter() - start)
+
+	f = OPS[op](n)
+	tracemalloc.start()
+	try:
+		f()
+		peak = tracemalloc.get_traced_memory()[1]
+	finally:
+		tracemalloc.stop()
+
+	return secs, peak
+
+def run(sizes:list, ops:list, repeat:int=3, budget:float=10.0, out=sys.stdout) -> Table:
+	"""
+	Runs the benchmarks, printing results as they come.
+	@param sizes	{int[]}		Row counts.
+	@param ops		{string[]}	Operations (see `OPS`).
+	@param repeat	{int}		Timed runs per operation and size.
+	@param budget	{float}		Operations expected to take more than this many seconds at a size aren't run at it or
+								at larger sizes. Time is assumed to grow linearly until two sizes have been run, and
+								then at the rate (between linear and quadratic) seen between the last two.
+	@param out		{file}		Where to print -- optional, default is stdout, None to not print.
+	@return			{Table}		Results: op, rows, secs, rowsPerSec, peakMB.
+	"""
+	res = {"op": [], "rows": [], "secs": [], "rowsPerSec": [], "peakMB": []}
+	over = set() # Operations over budget
+	last = {} # Operation --> [(rows, secs)] of its last two runs
+	fmt = "{:<10} {:>10} {:>10} {:>14} {:>10}"
+	if not out is None: print(fmt.format(*res.keys()), file=out, flush=True)
+
+	for n in sorted(sizes):
+		for op in ops:
+			if op in last:
+				(n0, s0), (n1, s1) = ([(0, 0)] + last[op])[-2:]
+				e = min(2, max(1, numpy.log(s1/s0)/numpy.log(n1/n0))) if n0 > 0 and s0 > 0 and s1 > 0 else 1
+				if s1*(n/n1)**e > budget: over.add(op)
+
+			if op in over:
+				if not out is None: print(fmt.format(op, n, "skipped", "", ""), file=out, flush=True)
+				continue
+
+			secs, peak = bench(op, n, repeat)
+			last[op] = last.get(op, [])[-1:] + [(n, secs)]
+			row = [op, n, secs, n/secs if secs > 0 else float("inf"), peak/2**20]
+			for k, v in zip(res.keys(), row): res[k].append(v)
+			if not out is None:
+				print(fmt.format(op, n, "{:.4f}".format(secs), "{:,.0f}".format(row[3]), "{:.1f}".format(row[4])),
+					file=out, flush=True)
+
+	return Table(res)
+
+def main(argv:list=None):
+	"""
+	Command line entry point.
+	@param argv	{string[]}	Arguments -- optional, default is those of the process.
+	"""
+	p = argparse.ArgumentParser(description="Table benchmarks")
+	p.add_argument("--sizes", default="1e3,1e4,1e5,1e6,1e7", help="Comma-separated row counts")
+	p.add_argument("--ops", default=str.join(",", OPS.keys()), help="Comma-separated operations: " +
+		str.join(", ", OPS.keys()))
+	p.add_argument("--repeat", type=int, default=3, help="Timed runs per operation and size (best is kept)")
+	p.add_argument("--budget", type=float, default=10.0, help="Skip larger sizes once an operation takes this long (s)")
+	a = p.parse_args(argv)
+
+	ops = a.ops.split(",")
+	for op in ops:
+		if not op in OPS: p.error("Unknown operation: {}".format(op))
+
+	try:
+		run([int(float(s)) for s in a.sizes.split(",")], ops, a.repeat, a.budget)
+	finally:
+		shutil.rmtree(_tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,136 @@
+########################################################################################################################
+# Instrumentation. Opt-in timing of the public functions of `Table`: call counts, cumulative and max wall time, and rows
+# in/out for each, plus optional logging of slow calls. When disabled, the original functions are put back on the class,
+# so there's no overhead at all.
+########################################################################################################################
+
+import functools, threading, time
+from types import FunctionType
+from typing import Callable, Union
+from table import Table
+
+_orig = {}	# Function name --> original function, while enabled
+_stats = {}	# Function name --> [calls, total seconds, max seconds, rows in, rows out]
+_lock = threading.Lock() # Guards `_stats`, as `Table.by` may call functions from several threads
+_local = threading.local() # Set while counting rows, as that calls (wrapped) functions we don't want to time
+_slow = None # Calls taking at least this many seconds are logged, None to not log
+_log = print # Where slow calls go
+
+def enable(slow:Union[float,None]=None, log:Callable[[str],None]=print):
+	"""
+	Starts timing every public function of `Table`. Note that calls made from within other calls (e.g. `Table.by`
+	calling `Table.getRow`) are counted too, so times of nested functions are included in those of their callers.
+	@param slow	{float|None}	Log calls taking at least this many seconds (default is None, i.e. don't log).
+	@param log	{fn(1)}			Gets the message of each slow call (default is print).
+	"""
+	global _slow, _log
+	_slow, _log = slow, log
+	if len(_orig) > 0: return # Already on, just update the settings
+
+	for name, f in list(vars(Table).items()):
+		if name.startswith("_") or type(f) != FunctionType: continue
+		_orig[name] = f
+		setattr(Table, name, _wrap(name, f))
+
+def disable():
+	"""
+	Stops timing, putting back the original functions. Stats gathered so far are kept (see `reset`).
+	"""
+	for name, f in _orig.items(): setattr(Table, name, f)
+	_orig.clear()
+
+def enabled() -> bool:
+	"""
+	Determines if timing is on.
+	@return	{bool}	True if it is, False otherwise.
+	"""
+	return len(_orig) > 0
+
+def stats() -> Table:
+	"""
+	Gets the stats gathered so far.
+	@return	{Table}	One row per function called: fn, calls, total and max (seconds), mean (seconds per call), rowsIn
+					(rows of the tables passed in) and rowsOut (rows of the table returned, or of the table itself for
+					in-place calls). Sorted by descending total time.
+	"""
+	with _lock: rows = sorted(([k] + v for k, v in _stats.items()), key=lambda r: -r[2])
+
+	return Table({
+		"fn": [r[0] for r in rows],
+		"calls": [r[1] for r in rows],
+		"total": [float(r[2]) for r in rows],
+		"max": [float(r[3]) for r in rows],
+		"mean": [r[2]/r[1] for r in rows],
+		"rowsIn": [r[4] for r in rows],
+		"rowsOut": [r[5] for r in rows]})
+
+def reset():
+	"""
+	Forgets the stats gathered so far.
+	"""
+	with _lock: _stats.clear()
+
+def _wrap(name:str, f:FunctionType) -> FunctionType:
+	"""
+	Wraps a function so its calls are timed.
+	@param name	{string}	Name of the function.
+	@param f	{fn}		Function.
+	@return		{fn}		Wrapped function.
+	"""
+	@functools.wraps(f)
+	def timed(*args, **kwargs):
+		if getattr(_local, "busy", False): return f(*args, **kwargs)
+
+		_local.busy = True
+		try: rowsIn = _rows(list(args) + list(kwargs.values()))
+		finally: _local.busy = False
+
+		start = time.perf_counter()
+		res = f(*args, **kwargs)
+		secs = time.perf_counter() - start
+
+		_local.busy = True
+		try: _record(name, secs, rowsIn, args, res)
+		finally: _local.busy = False
+
+		return res
+
+	return timed
+
+def _rows(args:list) -> int:
+	"""
+	Counts the rows of the tables among arguments.
+	@param args	{list}	Arguments, including tables or lists of tables (e.g. `Table.raze`).
+	@return		{int}	Rows.
+	"""
+	res = 0
+
+	for a in args:
+		if type(a) == Table: res += len(a)
+		elif type(a) == list: res += sum(len(t) for t in a if type(t) == Table)
+
+	return res
+
+def _record(name:str, secs:float, rowsIn:int, args:tuple, res):
+	"""
+	Records a call, and logs it if it was slow.
+	@param name		{string}	Name of the function.
+	@param secs		{float}		Time taken.
+	@param rowsIn	{int}		Rows passed in.
+	@param args		{tuple}		Positional arguments (the first being the table itself for instance calls).
+	@param res		{any}		Result.
+	"""
+	if type(res) == Table: rowsOut = len(res)
+	elif res is None and len(args) > 0 and type(args[0]) == Table: rowsOut = len(args[0]) # In place
+	else: rowsOut = 0
+
+	with _lock:
+		s = _stats.setdefault(name, [0, 0.0, 0.0, 0, 0])
+		s[0] += 1
+		s[1] += secs
+		s[2] = max(s[2], secs)
+		s[3] += rowsIn
+		s[4] += rowsOut
+
+	if not _slow is None and secs >= _slow:
+		_log("Slow call: Table.{} took {:.6f}s, rows in={} out={}".format(name, secs, rowsIn, rowsOut))
@@ -2,8 +2,9 @@
 # Miscellaneous functions.
 ########################################################################################################################
 
-import datetime, numpy, math
+import datetime, numpy, builtins
 from typing import Union
+import null
 
 def now(units:str="ms") -> numpy.datetime64:
 	"""
@@ -123,47 +124,45 @@ def mkList(obj) -> list:
 	"""
 	return obj if type(obj) == list else [obj]
 
-def asof(x:list, y) -> int:
+def asof(x:list, y) -> Union[int,numpy.ndarray]:
 	"""
 	Does an "asof" search in a list sorted in ascending order (essentially `bin` in q).
-	@param x	{list}	Sorted list.
-	@param y	{any}	Value to search.
-	@return		{int}	Returns the smallest index `i` such that `x[i] =< y < 0W^x[i+1]`.
-						Returns `-1` if `y` is smaller that `x[0]`.
+	@param x	{list}		Sorted list.
+	@param y	{any|array}	Value to search, or a list/array of them to search all at once.
+	@return		{int|int[]}	Returns the largest index `i` such that `x[i] =< y`, i.e. `x[i] =< y < 0W^x[i+1]`.
+							Returns `-1` if `y` is smaller that `x[0]`.
 	"""
-	l = len(x)
-	if (l == 0) or (y < x[0]): return -1 # Trivial or smaller than our smallest
-	if l == 1: return 0 # Not much of a search
-	return _asof(x, y, 0, len(x)-1)
+	if type(y) in [list, numpy.ndarray]:
+		return numpy.searchsorted(numpy.asarray(x), y, side="right") - 1
 
-def _asof(x:list, y, i:int, j:int) -> int:
+	# Binary search, keeping `x[:i] =< y < x[j:]`.
+	i, j = 0, len(x)
+
+	while i < j:
+		mid = (i + j) // 2
+		if y < x[mid]: j = mid
+		else: i = mid + 1
+
+	return i - 1
+
+def bin(x:Union[list,numpy.ndarray], y:Union[list,numpy.ndarray]) -> numpy.ndarray:
 	"""
-	Private version of "asof" search. Calls itself recursively narrowing down its search.
-	@param x	{list}	Sorted list.
-	@param y	{any}	Value to search.
-	@param i	{int}	Left index.
-	@param j	{int}	Right index. Note: assume `j > i`.
-	@return		{int}	Returns the smallest index `k` such that `x[k] =< y < 0W^x[k+1]`.
+	Buckets a column: each value goes in the bucket of the last edge it's at or above (see `asof`).
+	@param x	{list|array}	Values.
+	@param y	{list|array}	Bucket edges, sorted in ascending order.
+	@return		{int[]}			Bucket of each value, `-1` for values below the first edge.
 	"""
-	# Base case: i and j are right next to each other. So the answer is one of them.
-	d = j - i
-	if d == 1: return j if x[j] <= y else i
+	return asof(y, numpy.asarray(x))
 
-	mid = i + math.floor(d / 2) # Mid-point between left and right indices
-	return _asof(x, y, mid, j) if y > x[mid] else _asof(x, y, i, mid) # Go left or right
-
-def where(b:list) -> list:
+def where(b:Union[list,numpy.ndarray]) -> list:
 	"""
 	Where.
-	@param b	{bool[]}	List of booleans.
+	@param b	{bool[]}	List (or array) of booleans.
 	@return		{int[]}		Where booleans are true.
 	"""
-	res = []
-
-	for i in range(len(b)):
-		if b[i]: res.append(i)
-
-	return res
+	if type(b) == numpy.ndarray and b.ndim == 1: return numpy.flatnonzero(b).tolist()
+	if len(b) == 0: return []
+	return numpy.flatnonzero(numpy.fromiter((bool(i) for i in b), dtype=bool, count=len(b))).tolist()
 
 def remove(a:list, b:Union[any,list]) -> list:
 	"""
@@ -193,14 +192,20 @@ def last(x:[list,tuple,numpy.ndarray]):
 def find(x:[list,tuple,numpy.ndarray], y, reverse:bool=False) -> int:
 	"""
 	Finds the index of the first occurrence of an element in a list, or -1 if none.
-	@param x	{list|tuple|array}	List to search.
-	@param y	{any}				Item to search.
-	@return		{int}				Index of the first of occurrence of y in x.
-	"""
+	@param x		{list|tuple|array}	List to search.
+	@param y		{any}				Item to search.
+	@param reverse	{bool}				Find the last occurrence instead -- optional, default is False.
+	@return			{int}				Index of the first (or last) of occurrence of y in x.
+	"""
+	if type(x) == numpy.ndarray and x.ndim == 1 and x.dtype.kind != "O" and numpy.ndim(y) == 0:
+		m = numpy.asarray(x == y, dtype=bool)
+		if not m.any(): return -1
+		return len(m) - 1 - int(numpy.argmax(m[::-1])) if reverse else int(numpy.argmax(m))
+
 	rng = range(len(x))
 	if reverse: rng = rng[::-1]
 
-	for i in range(len(x)):
+	for i in rng:
 		if x[i] == y: return i
 
 	return -1
@@ -212,6 +217,9 @@ def within(x, y: list) -> [bool,tuple,numpy.ndarray]:
 	@param y	{list[2]}		Two-element list.
 	@return		{bool|vector}	True if within, false otherwise. Shape matches x.
 	"""
+	if type(x) == numpy.ndarray and x.dtype.kind != "O":
+		return (y[0] <= x) & (x <= y[1])
+
 	if type(x) in [list, tuple, numpy.ndarray]:
 		res = [_within(i, y) for i in x]
 		if type(x) == tuple: return tuple(res)
@@ -229,11 +237,45 @@ def _within(x, y:list) -> bool:
 	"""
 	return y[0] <= x and x <= y[1]
 
-def vin(x:Union[list,numpy.ndarray], y:Union[list, numpy.ndarray]) -> numpy.ndarray:
-	return numpy.array([x[i] in y for i in range(len(x))])
+def vin(x:Union[list,numpy.ndarray], y:Union[list,tuple,set,numpy.ndarray]) -> numpy.ndarray:
+	"""
+	Determines which elements of x are in y. Arrays of comparable types use `numpy.isin`, anything else a hash set (or,
+	failing that because elements aren't hashable, a scan of y for each element).
+	@param x	{list|array}			Items to test.
+	@param y	{list|tuple|set|array}	Items to look for.
+	@return		{bool[]}				True where the element of x is in y.
+	"""
+	if len(x) == 0: return numpy.zeros(0, dtype=bool)
+
+	if type(x) == numpy.ndarray and x.ndim == 1 and x.dtype.kind != "O":
+		ya = numpy.asarray(list(y) if type(y) in [set, frozenset] else y)
+		if ya.ndim == 1 and _comparable(x, ya): return numpy.isin(x, ya)
+
+	try:
+		ys = set(y.tolist() if type(y) == numpy.ndarray else y)
+		return numpy.fromiter((v in ys for v in x), dtype=bool, count=len(x))
+	except TypeError: # Unhashable
+		return numpy.array([x[i] in y for i in range(len(x))])
+
+def _comparable(x:numpy.ndarray, y:numpy.ndarray) -> bool:
+	"""
+	Determines if numpy compares the elements of two arrays by value, i.e. they're both numbers, both strings, both
+	datetimes or both timedeltas.
+	@param x	{array}	Array.
+	@param y	{array}	Array.
+	@return		{bool}	True if they're comparable.
+	"""
+	kinds = ["biufc", "U", "S", "M", "m"]
+	return any(x.dtype.kind in k and y.dtype.kind in k for k in kinds)
 
-# Only used on frozensettable lists.
-def fin(x, y) -> numpy.ndarray:
+def fin(x:list, y:list) -> numpy.ndarray:
+	"""
+	Determines which rows (as dictionaries) of x are in y. Only works if the values are hashable. For the rows of
+	tables, use `Table.isIn` instead, which doesn't build a dictionary per row.
+	@param x	{dict[]}	Rows to test.
+	@param y	{dict[]}	Rows to look for.
+	@return		{bool[]}	True where the row of x is in y.
+	"""
 	yset = {frozenset(d.items()) for d in y}
 	return numpy.array([frozenset(d.items()) in yset for d in x])
 
@@ -245,7 +287,7 @@ def avg(x:Union[list,numpy.ndarray]) -> float:
 	"""
 	if len(x) == 0: return numpy.nan
 	if type(x) == list: return numpy.array(x).mean()
-	if type(x) == numpy.ndarray: return x.mean()
+	if isinstance(x, numpy.ndarray): return x.mean() # Includes masked arrays, which skip nulls
 	# Else, presumably an atom.
 	return float(x)
 
@@ -257,9 +299,290 @@ def max(x:Union[list,numpy.ndarray]) -> float:
 	"""
 	if len(x) == 0: return numpy.nan ##! Support for different types
 	if type(x) == list: return numpy.array(x).max()
-	if type(x) == numpy.ndarray: return x.max()
+	if isinstance(x, numpy.ndarray): return x.max() # Ditto
 	# Else, presumably an atom.
 	return float(x) ##! Support for different types
 
+def xbar(width, x):
+	"""
+	Rounds down to a multiple of a width, e.g. to bucket times into bars:
+	`t.by({"bar": [misc.xbar, misc.timeDelta(m=1), "time"]}, ...)`. Works on the underlying integers of datetimes and
+	timedeltas, so the result keeps their type (rather than becoming an array of objects). Nulls stay null.
+	@param width	{number|timedelta}		Width, positive. For datetimes and timedeltas, either a timedelta (calendar
+											widths, i.e. months and years, bucket by calendar month or year) or a number
+											of units of `x`.
+	@param x		{atom|list|array}		Number(s), datetime(s) or timedelta(s), possibly masked.
+	@return			{atom|array}			`x` rounded down, same shape. Datetimes and timedeltas keep their unit, unless
+											the width isn't a whole number of them (e.g. 1 hour on days, or 1.5 seconds
+											on seconds), in which case they come back in the unit of the width, as the
+											result may not be representable otherwise.
+	"""
+	zero = numpy.timedelta64(0) if isinstance(width, numpy.timedelta64) else 0
+	if not width > zero: raise ValueError("Width must be positive, width={}".format(width))
+
+	if isinstance(x, numpy.ma.MaskedArray):
+		return numpy.ma.MaskedArray(xbar(width, x.data), mask=numpy.ma.getmaskarray(x))
+
+	a = numpy.asarray(x)
+	kind = a.dtype.kind
+
+	if kind in "mM":
+		m = numpy.isnat(a)
+
+		if isinstance(width, numpy.timedelta64):
+			unit = numpy.datetime_data(width.dtype)[0]
+			if unit in ["Y", "M"]: # Calendar units, bucket in them and come back
+				typ = "{}[{}]".format(a.dtype.name.split("[")[0], unit)
+				res = xbar(int(width.astype(numpy.int64)), a.astype(typ)).astype(a.dtype)
+				return res if a.ndim > 0 else res[()]
+
+			w = width.astype("timedelta64[{}]".format(numpy.datetime_data(a.dtype)[0]))
+
+			if w == width: # Whole number of units of x
+				width = w
+			else: # Common (i.e. finer) unit
+				a = a.astype(numpy.result_type(a.dtype, width.dtype))
+				width = width.astype("timedelta64[{}]".format(numpy.datetime_data(a.dtype)[0]))
+
+		w = int(numpy.asarray(width).astype(numpy.int64))
+		i = a.view(numpy.int64)
+		res = numpy.where(m, i, i//w*w).view(a.dtype)
+	elif kind in "iu" and isinstance(width, (int, numpy.integer)):
+		res = numpy.where(a == null.INT, a, a//width*width)
+	else:
+		res = numpy.floor(a/width)*width
+
+	return res if a.ndim > 0 else res[()]
+
+def msum(x:Union[list,numpy.ndarray], n:int) -> numpy.ndarray:
+	"""
+	Moving sum over the last n elements (fewer at the start), nulls counting as 0. Computed from a cumulative sum, so
+	integer sums are exact while float ones carry the rounding of the running total.
+	@param x	{list|array}	Numbers, possibly masked.
+	@param n	{int}			Window length.
+	@return		{array}			Sums, same length as `x`.
+	"""
+	v, m = _mvals(x)
+	return _mwin(numpy.where(m, 0, v), n)
+
+def mavg(x:Union[list,numpy.ndarray], n:int) -> numpy.ndarray:
+	"""
+	Moving average over the last n elements (fewer at the start), skipping nulls.
+	@param x	{list|array}	Numbers, possibly masked.
+	@param n	{int}			Window length.
+	@return		{float[]}		Averages, NaN where the window only holds nulls.
+	"""
+	v, m = _mvals(x)
+	k = _mwin((~m).astype(numpy.int64), n)
+	with numpy.errstate(invalid="ignore", divide="ignore"): return _mwin(numpy.where(m, 0.0, v), n)/k
+
+def mdev(x:Union[list,numpy.ndarray], n:int) -> numpy.ndarray:
+	"""
+	Moving (population) standard deviation over the last n elements (fewer at the start), skipping nulls.
+	@param x	{list|array}	Numbers, possibly masked.
+	@param n	{int}			Window length.
+	@return		{float[]}		Deviations, NaN where the window only holds nulls.
+	"""
+	v, m = _mvals(x)
+	v = numpy.where(m, 0.0, v - (v[~m].mean() if (~m).any() else 0)) # Centred, to limit cancellation
+	k = _mwin((~m).astype(numpy.int64), n)
+
+	with numpy.errstate(invalid="ignore", divide="ignore"):
+		mu = _mwin(v, n)/k
+		var = _mwin(v*v, n)/k - mu*mu
+		noise = 8*numpy.finfo(numpy.float64).eps*numpy.cumsum(v*v)/k # Rounding of the running sums
+		return numpy.where(k > 0, numpy.sqrt(numpy.where(var > noise, var, 0)), numpy.nan)
+
+def mmin(x:Union[list,numpy.ndarray], n:int) -> numpy.ndarray:
+	"""
+	Moving min over the last n elements (fewer at the start), skipping nulls.
+	@param x	{list|array}	Numbers, booleans, datetimes or timedeltas, possibly masked.
+	@param n	{int}			Window length.
+	@return		{array}			Mins, same type as `x` (integers as int64), null where the window only holds nulls.
+	"""
+	return _mext(x, n, numpy.minimum)
+
+def mmax(x:Union[list,numpy.ndarray], n:int) -> numpy.ndarray:
+	"""
+	Moving max over the last n elements (fewer at the start), skipping nulls.
+	@param x	{list|array}	Numbers, booleans, datetimes or timedeltas, possibly masked.
+	@param n	{int}			Window length.
+	@return		{array}			Maxes, same type as `x` (integers as int64), null where the window only holds nulls.
+	"""
+	return _mext(x, n, numpy.maximum)
+
+def ema(x:Union[list,numpy.ndarray], a:float) -> numpy.ndarray:
+	"""
+	Exponential moving average: `s[0] = x[0]` and `s[i] = a*x[i] + (1-a)*s[i-1]`. Nulls are skipped (the average
+	carries over them), and the average starts at the first non-null.
+	@param x	{list|array}	Numbers, possibly masked.
+	@param a	{float}			Smoothing factor, in (0, 1).
+	@return		{float[]}		Averages, NaN before the first non-null.
+	"""
+	if not 0 < a < 1: raise ValueError("Smoothing factor must be in (0, 1), a={}".format(a))
+	v, m = _mvals(x)
+	l = len(v)
+	res = numpy.full(l, numpy.nan)
+	if m.all(): return res
+	f = int(numpy.argmax(~m)) # First non-null
+
+	# With b_i = 1-a (1 at nulls) and P_i the product of b_0, ..., b_i, the recurrence unrolls to
+	# s_i = P_i*(s_-1 + sum_j<=i a_j*x_j/P_j), which is a cumulative product and a cumulative sum. P shrinks
+	# geometrically, so we go in blocks short enough for 1/P to stay finite.
+	b = numpy.where(m, 1.0, 1.0 - a)[f:]
+	ax = numpy.where(m, 0.0, a*v)[f:]
+	step = builtins.max(1, int(230/-numpy.log(1.0 - a)))
+	prev = float(v[f])
+
+	for lo in range(0, l - f, step):
+		p = numpy.cumprod(b[lo:lo + step])
+		s = p*(prev + numpy.cumsum(ax[lo:lo + step]/p))
+		res[f + lo:f + lo + len(s)] = s
+		prev = s[-1]
+
+	return res
+
+def _mvals(x:Union[list,numpy.ndarray]) -> tuple:
+	"""
+	Splits the input of a moving window function into values and nulls.
+	@param x	{list|array}	Numbers, possibly masked.
+	@return		{array,bool[]}	Values (integers and booleans as int64) and null mask.
+	"""
+	if isinstance(x, numpy.ma.MaskedArray):
+		m = numpy.ma.getmaskarray(x)
+		x = x.data
+	else:
+		x = numpy.asarray(x)
+		m = numpy.zeros(len(x), dtype=bool)
+
+	if x.dtype.kind in "iu": m = m | (x == null.INT) # Before casting, so that other widths don't have nulls
+	elif x.dtype.kind == "f": m = m | numpy.isnan(x)
+	elif x.dtype.kind in "mM": m = m | numpy.isnat(x)
+	if x.dtype.kind in "biu": x = x.astype(numpy.int64)
+	return x, m
+
+def _mwin(x:numpy.ndarray, n:int) -> numpy.ndarray:
+	"""
+	Sums over moving windows, from a cumulative sum.
+	@param x	{array}	Numbers, no nulls.
+	@param n	{int}	Window length.
+	@return		{array}	Sums.
+	"""
+	n = int(n)
+	if n < 1: raise ValueError("Window length must be positive, n={}".format(n))
+	c = numpy.cumsum(x)
+	res = c.copy()
+	if n < len(c): res[n:] -= c[:len(c) - n]
+	return res
+
+def _mext(x:Union[list,numpy.ndarray], n:int, f:numpy.ufunc) -> numpy.ndarray:
+	"""
+	Moving min or max (van Herk/Gil-Werman): cut the (padded) array into blocks of n, and take the running extreme
+	forwards and backwards within each block. A window then spans at most two blocks, so its extreme is that of the
+	backward run at its start and the forward run at its end. Linear time whatever the window, without a python loop.
+	@param x	{list|array}	Numbers, booleans, datetimes or timedeltas, possibly masked.
+	@param n	{int}			Window length.
+	@param f	{ufunc}			`numpy.minimum` or `numpy.maximum`.
+	@return		{array}			Extremes, same type as `x` (integers as int64), null where the window only holds nulls.
+	"""
+	typ = numpy.asarray(numpy.ma.getdata(x)).dtype
+	if not typ.kind in "biufmM": raise ValueError("Moving min/max needs numbers, booleans, datetimes or timedeltas, "
+		"got {}".format(typ))
+
+	if int(n) < 1: raise ValueError("Window length must be positive, n={}".format(n))
+	v, m = _mvals(x)
+	if typ.kind in "mM": v = v.view(numpy.int64) # Compare as integers, NaT are nulls already
+	l = len(v)
+	if l == 0: return v.astype(typ)
+	n = builtins.min(int(n), l)
+
+	# Pad with the identity of f: n-1 in front for the first windows, and enough behind to fill the last block.
+	lo = f == numpy.minimum
+	if v.dtype.kind == "f": pad = numpy.inf if lo else -numpy.inf
+	else: pad = numpy.iinfo(v.dtype).max if lo else numpy.iinfo(v.dtype).min
+	y = numpy.concatenate([numpy.full(n - 1, pad, v.dtype), numpy.where(m, pad, v),
+		numpy.full(-(l + n - 1) % n, pad, v.dtype)]).reshape(-1, n)
+
+	fwd = f.accumulate(y, axis=1).reshape(-1)
+	bwd = f.accumulate(y[:, ::-1], axis=1)[:, ::-1].reshape(-1)
+	res = f(bwd[:l], fwd[n - 1:n - 1 + l])
+
+	empty = _mwin((~m).astype(numpy.int64), n) == 0
+	if typ.kind in "bmM": res = res.view(typ) if typ.kind != "b" else res.astype(bool)
+	k = res.dtype.kind
+	if empty.any(): res[empty] = null.INT if k == "i" else numpy.nan if k == "f" else null.getNull(res.dtype.name)
+	return res
+
 def fill(x:Union[list,numpy.ndarray], val:object) -> numpy.ndarray:
-	return numpy.array([val if numpy.isnan(y) else y for y in x]) ##! Support for other types
+	"""
+	Fills nulls with a value.
+	@param x	{list|array}	Array. Masked entries of masked arrays count as nulls.
+	@param val	{any}			Value to put where `x` is null.
+	@return		{array}			`x` with nulls filled.
+	"""
+	if type(x) == numpy.ma.MaskedArray:
+		m = numpy.ma.getmaskarray(x) | null.isNullArray(x.data)
+		x = x.data
+	else:
+		x = numpy.asarray(x)
+		m = null.isNullArray(x)
+
+	if not m.any(): return x.copy()
+	return numpy.where(m, val, x)
+
+def itop(x:Union[list,numpy.ndarray], k:int, desc:bool=True) -> numpy.ndarray:
+	"""
+	Gets the indices of the k largest (or smallest) elements, in order, without sorting the whole array: this runs in
+	O(n + k log k) rather than O(n log n). Ties are broken by position and nulls (including masked elements) are the
+	largest, so the result is the first k of a stable sort.
+	@param x	{list|array}	Array, possibly masked.
+	@param k	{int}			Number of elements.
+	@param desc	{bool}			Largest (default) or smallest.
+	@return		{int[]}			Indices into `x`.
+	"""
+	if isinstance(x, numpy.ma.MaskedArray):
+		m = numpy.ma.getmaskarray(x)
+		x = x.data
+	else:
+		x = numpy.asarray(x)
+		m = null.isNullArray(x) if x.dtype.kind in "fcmM" else None
+
+	n = len(x)
+	k = min(builtins.max(k, 0), n)
+
+	# Nulls go first if descending, last otherwise.
+	if not m is None and m.any():
+		nn = numpy.flatnonzero(~m)
+		nul = numpy.flatnonzero(m)
+		if desc: return numpy.concatenate([nul[:k], nn[itop(x[nn], k - len(nul[:k]), True)]])
+		i = nn[itop(x[nn], k, False)]
+		return numpy.concatenate([i, nul[:k - len(i)]])
+
+	# Partition around the k-th element, keeping everything strictly beyond it and the first ties.
+	cand = numpy.arange(n)
+
+	if 0 < k < n:
+		try:
+			p = numpy.argpartition(x, n - k if desc else k - 1)
+			v = x[p[n - k] if desc else p[k - 1]]
+			better = numpy.flatnonzero(x > v if desc else x < v)
+			cand = numpy.sort(numpy.concatenate([better, numpy.flatnonzero(x == v)[:k - len(better)]]))
+		except TypeError: # Can't be partitioned (e.g. python objects), just sort
+			pass
+
+	# Stable sort of the candidates. Descending is a stable ascending sort of the reversed candidates, reversed.
+	if desc: cand = cand[::-1]
+	cand = cand[numpy.argsort(x[cand], kind="stable")]
+	return (cand[::-1] if desc else cand)[:k]
+
+def top(x:Union[list,numpy.ndarray], k:int, desc:bool=True) -> numpy.ndarray:
+	"""
+	Gets the k largest (or smallest) elements, in order (see `itop`). Use it in a `Table.by` clause, e.g.
+	`{"best": [misc.top, "price", 3]}`, for the top k of each group.
+	@param x	{list|array}	Array, possibly masked.
+	@param k	{int}			Number of elements.
+	@param desc	{bool}			Largest (default) or smallest.
+	@return		{array}			Elements.
+	"""
+	x = x if isinstance(x, numpy.ndarray) else numpy.asarray(x)
+	return x[itop(x, k, desc)]
@@ -32,7 +32,7 @@ def getNull(typ:str):
 def isNull(val) -> bool:
 	"""
 	Determines if a value is null. Note that this is really only handy for single values.
-	If doing this on a column, consider using `numpy.isnan`.
+	If doing this on a column, use `isNullArray`.
 	@param val	{any}	A value.
 	@return		{bool}	True if the value is null.
 	"""
@@ -49,4 +49,24 @@ def isNull(val) -> bool:
 	if styp.find("datetime64") != -1: return numpy.isnan(val)
 	if styp.find("timedelta64") != -1: return numpy.isnan(val)
 
-	raise Exception("Unrecognized type for null check, type={} val={}".format(styp, val))
\ No newline at end of file
+	raise Exception("Unrecognized type for null check, type={} val={}".format(styp, val))
+
+def isNullArray(arr) -> numpy.ndarray:
+	"""
+	Determines which elements of an array are null. This is the column-wise version of `isNull`, and gives the same
+	answer element by element, except that object arrays only treat `None` as null.
+	@param arr	{list|array}	Array (or anything numpy can make an array of).
+	@return		{bool[]}		Mask of nulls, same shape as `arr`.
+	"""
+	arr = numpy.asarray(arr)
+	kind = arr.dtype.kind
+
+	if kind in "iu": return arr == INT
+	if kind in "fc": return numpy.isnan(arr)
+	if kind in "mM": return numpy.isnat(arr)
+	if kind in "US": return arr == arr.dtype.type()
+	if kind == "b": return ~arr ##~ Imperfect, same as `isNull`
+	if kind == "O": # Elements can be anything (even arrays), so test identity rather than equality
+		return numpy.fromiter((x is None for x in arr.flat), bool, arr.size).reshape(arr.shape)
+
+	raise Exception("Unrecognized type for null check, dtype={}".format(arr.dtype))
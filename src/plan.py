@@ -0,0 +1,155 @@
+########################################################################################################################
+# Compiled clauses. Turns the functional clauses used by `Table.by`, `Table.select` and `Table.where` (i.e. column
+# names, literals and nested (function, param_1, ..., param_n) lists) into a flat plan that can be run many times, e.g.
+# once per group. Repeated column references and sub-expressions are only evaluated once per run, and compiled plans
+# are cached so repeating a query doesn't compile it again. The cache only keeps the shape of clauses, not their
+# functions, so it neither keeps functions (and whatever their closures hold) alive nor mixes up functions that come and
+# go: a cached plan is bound to the functions of the clause at hand each time.
+########################################################################################################################
+
+import copy
+from typing import Callable
+
+_cache = {} # Clause key --> compiled plan, without functions
+_cacheSize = 256 # Max number of plans to keep around (oldest are dropped first)
+
+class Plan:
+	def __init__(self):
+		"""
+		Init. Use `compileClause` rather than building plans by hand.
+		"""
+		self._nodes = [] # ("col", name) | ("lit", value) | ("call", fn slot, [node]), children always come first
+		self._seen = {} # Node key --> node, to dedupe
+		self._outs = {} # Target --> node
+		self._uses = [] # References to each node (as an argument or a target)
+		self._fns = [] # Function of each slot, in order of first appearance in the clause
+		self.cols = [] # Source columns, in order of first reference
+
+	def run(self, getCol:Callable[[str],object]) -> dict:
+		"""
+		Runs the plan.
+		@param getCol	{fn(1)}	Gets a source column by name. Called once per column, however often it's referenced.
+		@return			{dict}	Target --> value.
+		"""
+		vals = []
+		left = list(self._uses) # References still to hand out
+
+		def use(i:int):
+			# Values referenced more than once are copied for all but their last reference, so a function that modifies
+			# its arguments can't affect the others.
+			left[i] -= 1
+			return vals[i] if left[i] == 0 else copy.copy(vals[i])
+
+		for node in self._nodes:
+			if node[0] == "col":
+				vals.append(getCol(node[1]))
+			elif node[0] == "lit":
+				vals.append(node[1])
+			else:
+				vals.append(self._fns[node[1]](*[use(i) for i in node[2]]))
+
+		return {k: use(i) for k, i in self._outs.items()}
+
+	def _bind(self, fns:list) -> "Plan":
+		"""
+		Gets a copy of the plan calling other functions.
+		@param fns	{fn[]}	Function of each slot (see `_fn`), None for none.
+		@return		{Plan}	Plan, sharing everything else with this one.
+		"""
+		p = Plan()
+		p._nodes, p._seen, p._outs, p._uses, p.cols = self._nodes, self._seen, self._outs, self._uses, self.cols
+		p._fns = fns
+		return p
+
+	def _add(self, clause) -> int:
+		"""
+		Adds a (sub-)clause to the plan.
+		@param clause	{any}	Clause (see `Table._resolveClause`).
+		@return			{int}	Node holding its value.
+		"""
+		typ = type(clause)
+
+		if isinstance(clause, str): # Column name
+			node = ("col", clause)
+			key = node
+			if not clause in self.cols: self.cols.append(clause)
+		elif typ == list and len(clause) == 1 and isinstance(clause[0], str): # String literal
+			node = ("lit", clause[0])
+			key = node
+		elif typ == list and len(clause) > 0: # (fn, param_1, param_2, ...)
+			slot = _fn(self._fns, clause[0])
+			args = [self._add(c) for c in clause[1:]]
+			node = ("call", slot, args)
+			key = ("call", slot, tuple(args))
+		else: # Anything else is assumed to be a literal, and literals aren't necessarily hashable so we don't dedupe
+			node = ("lit", clause)
+			key = ("lit", len(self._nodes))
+
+		if not key in self._seen:
+			self._seen[key] = len(self._nodes)
+			self._nodes.append(node)
+			self._uses.append(0)
+
+		i = self._seen[key]
+		self._uses[i] += 1
+		return i
+
+def compileClause(clause:dict) -> Plan:
+	"""
+	Compiles an agg/by/where clause. Note that functions are assumed to be pure: a function applied to the same
+	arguments twice in a clause is only called once.
+	@param clause	{dict}	Target --> clause (see `Table._resolveClause`).
+	@return			{Plan}	Compiled plan.
+	"""
+	fns = []
+	key = _key(clause, fns)
+	if not key is None and key in _cache: return _cache[key]._bind(fns)
+
+	p = Plan()
+	for k, c in clause.items(): p._outs[k] = p._add(c)
+
+	if not key is None:
+		if len(_cache) >= _cacheSize: _cache.pop(next(iter(_cache))) # Drop the oldest
+		_cache[key] = p._bind(None)
+
+	return p
+
+def _fn(fns:list, f:Callable) -> int:
+	"""
+	Gets the slot of a function, the same function always getting the same slot.
+	@param fns	{fn[]}	Functions seen so far, updated in place.
+	@param f	{fn}	Function.
+	@return		{int}	Slot.
+	"""
+	for i, g in enumerate(fns):
+		if g is f: return i
+
+	fns.append(f)
+	return len(fns) - 1
+
+def _key(clause, fns:list):
+	"""
+	Builds a hashable key identifying the shape of a clause. Functions are identified by their slot (see `_fn`) rather
+	than themselves, so clauses calling different functions in the same way share a key.
+	@param clause	{any}	Clause, or a dictionary of them.
+	@param fns		{fn[]}	Functions seen so far, updated in place, in the same order as `Plan._add` sees them.
+	@return			{tuple}	Key, or None if the clause contains unhashable literals (and so can't be cached).
+	"""
+	typ = type(clause)
+
+	if typ == dict:
+		res = tuple((k, _key(c, fns)) for k, c in clause.items())
+		return None if any(r[1] is None for r in res) else ("dict",) + res
+	if isinstance(clause, str): return ("col", clause)
+	if typ == list and len(clause) == 1 and isinstance(clause[0], str): return ("str", clause[0])
+
+	if typ == list and len(clause) > 0:
+		slot = _fn(fns, clause[0])
+		args = [_key(c, fns) for c in clause[1:]]
+		return None if None in args else ("call", slot) + tuple(args)
+
+	try:
+		hash(clause)
+		return ("lit", typ, clause)
+	except TypeError:
+		return None
@@ -0,0 +1,290 @@
+########################################################################################################################
+# Lazy queries. A query records the operations to run on a table (in memory or splayed on disk) and only runs them on
+# `collect`, once it has had a chance to rearrange them: filters are pushed down to the source, only the columns that
+# are actually needed are read, and adjacent operations are fused.
+########################################################################################################################
+
+import numpy
+from typing import Union
+import misc
+from table import Table, TableException
+
+class Query:
+	def __init__(self, src:Union[Table,str]):
+		"""
+		Init.
+		@param src	{Table|string}	Source of the query: either a table, or the on-disk location of a splayed table (see
+									`Table.save`).
+		"""
+		if not type(src) in [Table, str]: raise TableException("Query source must be a table or a location")
+
+		self._src = src
+		self._ops = [] # List of (operation, {arg: value})
+
+	#-------------------------------------------------------------------------------------------------------------------
+	# Operations. Each returns a new query, so a query can be used as the base of several others.
+	#-------------------------------------------------------------------------------------------------------------------
+
+	def where(self, clause:Union[str,list]) -> "Query":
+		"""
+		Filters rows. Conditions are assumed to be row-wise, i.e. the result for a row only depends on that row, which
+		is what allows us to move them around.
+		@param clause	{string|list|list[]}	Condition(s) (see `Table.where`).
+		@return			{Query}					Query with the filter added.
+		"""
+		return self._add("where", clause=Query._clauses(clause))
+
+	def takeCol(self, col:Union[str,list]) -> "Query":
+		"""
+		Takes a/many column(s) (see `Table.takeCol`).
+		@param col	{string|string[]}	Column(s) to take.
+		@return		{Query}				Query with the projection added.
+		"""
+		return self._add("takeCol", col=misc.mkList(col))
+
+	def select(self, col:Union[str,list,dict]=[], where:Union[str,list]=[]) -> "Query":
+		"""
+		Selects (see `Table.select`).
+		@param col		{string|list|dictionary}	Column(s) to select.
+		@param where	{string|list|list[]}		Condition(s) rows must satisfy.
+		@return			{Query}						Query with the selection added.
+		"""
+		q = self if where == [] else self.where(where)
+		return q if col == [] else q._add("select", col=Table._stdClause(col))
+
+	def sort(self, cols:Union[str,list], desc:Union[bool,list]=False) -> "Query":
+		"""
+		Sorts (see `Table.sort`).
+		@param cols	{string|string[]}	Column(s) to sort on.
+		@param desc	{bool|bool[]}		Do descending order (default is False), for all columns or each.
+		@return		{Query}				Query with the sort added.
+		"""
+		return self._add("sort", cols=misc.mkList(cols), desc=desc)
+
+	def by(self, byClause:Union[str,list,dict], aggClause:Union[str,list,dict], raggedCols:Union[str,list]=[]) -> "Query":
+		"""
+		Groups (see `Table.by`).
+		@param byClause		{string|list|dictionary}	Group by clause.
+		@param aggClause	{string|list|dictionary}	Aggregation clause.
+		@param raggedCols	{string|string[]}			Ragged target column(s).
+		@return				{Query}						Query with the grouping added.
+		"""
+		return self._add("by", byClause=Table._stdClause(byClause), aggClause=Table._stdClause(aggClause),
+			raggedCols=raggedCols)
+
+	def lj(self, right:Table, key:Union[str,list]=[], col:Union[str,list]=[]) -> "Query":
+		"""
+		Left joins a table (see `Table.lj`).
+		@param right	{Table}				Table to join.
+		@param key		{string|string[]}	Key column(s).
+		@param col		{string|string[]}	Column(s) to join from the right table.
+		@return			{Query}				Query with the join added.
+		"""
+		return self._add("lj", right=right, key=key, col=col)
+
+	def aj(self, right:Table, cols:list) -> "Query":
+		"""
+		As-of joins a table (see `Table.aj`).
+		@param right	{Table}		Table to join.
+		@param cols		{string[]}	Columns to join on, the last being the as-of column.
+		@return			{Query}		Query with the join added.
+		"""
+		return self._add("aj", right=right, cols=misc.mkList(cols))
+
+	#-------------------------------------------------------------------------------------------------------------------
+	# Execution.
+	#-------------------------------------------------------------------------------------------------------------------
+
+	def collect(self) -> Table:
+		"""
+		Runs the query.
+		@return	{Table}	Result.
+		"""
+		cols, where, ops = self._plan()
+		res = self._scan(cols, where)
+
+		for op, a in ops:
+			if op == "where":
+				res = res.where(a["clause"])
+			elif op == "takeCol":
+				res.takeCol(a["col"])
+			elif op == "select":
+				res = res.select(a["col"], a["where"])
+			elif op == "sort":
+				res.sort(a["cols"], a["desc"])
+			elif op == "by":
+				res = res.by(a["byClause"], a["aggClause"], a["raggedCols"])
+			elif op == "lj":
+				res.lj(a["right"], a["key"], a["col"])
+			elif op == "aj":
+				res.aj(a["right"], a["cols"])
+
+		return res
+
+	def explain(self) -> str:
+		"""
+		Describes how the query will run, after optimization.
+		@return	{string}	One line per step, starting with the scan of the source.
+		"""
+		cols, where, ops = self._plan()
+		src = "table" if type(self._src) == Table else self._src
+		res = ["scan {} cols={} where={}".format(src, "*" if cols is None else cols, len(where))]
+
+		for op, a in ops:
+			if op == "where": res.append("where {}".format(len(a["clause"])))
+			elif op == "takeCol": res.append("takeCol {}".format(a["col"]))
+			elif op == "select": res.append("select {} where={}".format(list(a["col"].keys()), len(a["where"])))
+			elif op == "sort": res.append("sort {}{}".format(a["cols"],
+				" desc={}".format(a["desc"]) if type(a["desc"]) == list else " desc" if a["desc"] else ""))
+			elif op == "by": res.append("by {}".format(list(a["byClause"].keys())))
+			else: res.append(op)
+
+		return str.join("\n", res)
+
+	#-------------------------------------------------------------------------------------------------------------------
+	# Private functions.
+	#-------------------------------------------------------------------------------------------------------------------
+
+	def _add(self, op:str, **args) -> "Query":
+		"""
+		Creates a new query with an extra operation.
+		@param op	{string}	Operation.
+		@param args	{dict}		Arguments of the operation.
+		@return		{Query}		New query.
+		"""
+		q = Query(self._src)
+		q._ops = self._ops + [(op, args)]
+		return q
+
+	def _clauses(clause:Union[str,list]) -> list:
+		"""
+		Standardizes a where clause to a list of conditions.
+		@param clause	{string|list|list[]}	Condition(s) (see `Table.where`).
+		@return			{list}					List of conditions.
+		"""
+		if type(clause) == str or (type(clause) == list and len(clause) > 0 and callable(clause[0])): return [clause]
+		return list(clause)
+
+	def _produced(op:str, a:dict) -> list:
+		"""
+		Gets the columns a join adds to (or overwrites in) the left table.
+		@param op	{string}	Join operation ("lj" or "aj").
+		@param a	{dict}		Arguments of the operation.
+		@return		{string[]}	Columns.
+		"""
+		r = a["right"]
+		if op == "aj": return misc.remove(r.cols(), a["cols"])
+		return misc.mkList(a["col"]) if a["col"] != [] else r.cols()
+
+	def _plan(self) -> tuple:
+		"""
+		Optimizes the query.
+		@return	{string[]|None,list,list}	Columns to read from the source (None for all), conditions to apply while
+											reading it, and the operations to run after that.
+		"""
+		ops = [(op, dict(a)) for op, a in self._ops]
+
+		# Push filters as early as they'll go. They can move ahead of sorts, ahead of projections that keep the columns
+		# they need, and ahead of joins that don't produce those columns. Groupings and selections are barriers.
+		moved = True
+
+		while moved:
+			moved = False
+
+			for i in range(1, len(ops)):
+				op, a = ops[i]
+				if op != "where": continue
+				prev, pa = ops[i-1]
+				need = set(Table._clauseSrcCols(a["clause"]))
+
+				if prev == "sort" or \
+					(prev == "takeCol" and need.issubset(pa["col"])) or \
+					(prev in ["lj", "aj"] and need.isdisjoint(Query._produced(prev, pa))):
+					ops[i-1], ops[i] = ops[i], ops[i-1]
+					moved = True
+
+		# Fuse adjacent operations: consecutive filters become one (which short-circuits) and consecutive projections
+		# keep the last.
+		fused = []
+
+		for op, a in ops:
+			prev, pa = fused[-1] if len(fused) > 0 else (None, None)
+
+			if op == "where" and prev == "where":
+				pa["clause"] = pa["clause"] + a["clause"]
+			elif op == "takeCol" and prev == "takeCol":
+				for c in a["col"]:
+					if not c in pa["col"]: raise TableException("Unknown column: {}".format(c))
+				pa["col"] = a["col"]
+			else:
+				fused.append((op, a))
+
+		# Leading filters are applied while reading the source.
+		where = []
+
+		if len(fused) > 0 and fused[0][0] == "where":
+			where = fused[0][1]["clause"]
+			fused = fused[1:]
+
+		# Any other filter followed by a projection or selection is done in a single pass.
+		ops = fused
+		fused = []
+
+		for op, a in ops:
+			prev, pa = fused[-1] if len(fused) > 0 else (None, None)
+
+			if op in ["takeCol", "select"] and prev == "where":
+				fused[-1] = ("select", {"col": Table._stdClause(a["col"]), "where": pa["clause"]})
+			elif op == "select":
+				fused.append((op, {"col": a["col"], "where": []}))
+			else:
+				fused.append((op, a))
+
+		# Work out which source columns are needed by walking backwards from the result.
+		need = None # All
+
+		for op, a in fused[::-1]:
+			if op == "where":
+				if not need is None: need |= set(Table._clauseSrcCols(a["clause"]))
+			elif op == "takeCol":
+				need = set(a["col"]) # Replayed on the scan, so it must find all of its columns there
+			elif op == "select":
+				need = set(Table._clauseSrcCols(list(a["col"].values()) + a["where"]))
+			elif op == "sort":
+				if not need is None: need |= set(a["cols"])
+			elif op == "by":
+				need = set(Table._clauseSrcCols(list(a["byClause"].values()) + list(a["aggClause"].values())))
+			elif op in ["lj", "aj"]:
+				keys = a["cols"] if op == "aj" else misc.mkList(a["key"]) if a["key"] != [] else a["right"].keyCols()
+				if not need is None: need = (need - set(Query._produced(op, a))) | set(keys)
+
+		if not need is None: need |= set(Table._clauseSrcCols(where))
+		srcCols = self._src.cols() if type(self._src) == Table else Table.diskCols(self._src)
+		cols = None if need is None else [c for c in srcCols if c in need]
+		return cols, where, fused
+
+	def _scan(self, cols:Union[list,None], where:list) -> Table:
+		"""
+		Reads the source.
+		@param cols		{string[]|None}	Columns to read, None for all.
+		@param where	{list}			Conditions rows must satisfy.
+		@return			{Table}			Rows and columns of the source we need.
+		"""
+		src = self._src
+
+		if type(src) == Table:
+			if cols is None: cols = src.cols()
+			res = src.takeCol(cols, inPlace=False) if where == [] else src.getRow(src._whereIdx(where), cols)
+			if all(k in cols for k in src.keyCols()): res.key(src.keyCols())
+			return res
+
+		# On disk. Without filters, just read the columns we need.
+		if where == []: return Table.load(src, [] if cols is None else cols)
+
+		# Otherwise, memory-map the columns, evaluate the filters on the columns they need, and only then copy the rows
+		# that survived out of each column we need.
+		if cols is None: cols = Table.diskCols(src)
+		mapped = {c: Table._loadCol(src, c, True) for c in cols}
+		t = Table._wrap({c: mapped[c][0] for c in cols})
+		t._valid = {c: mapped[c][1] for c in cols if not mapped[c][1] is None}
+		return t.getRow(t._whereIdx(where))
@@ -4,13 +4,32 @@
 # To be updated as more features are required!
 ########################################################################################################################
 
-import numpy, os
-from typing import Union
-import null, misc
+import numpy, os, sys, collections, concurrent.futures, multiprocessing, operator, bisect, threading, weakref
+from typing import Iterator, Union
+import null, misc, plan
 
 class Table:
 	_dispWidth = 100 # Default display width
 	_dispHeight = 30 # Default display height
+	_eqChunk = 65536 # Rows compared at a time when checking equality (so we can bail out early)
+	_iterChunk = 65536 # Rows unboxed at a time when iterating
+	_byThreads = 1 # Default number of threads used to aggregate in `by`
+	_byJob = None # Work of a `by` worker process, only ever set in the worker (see `_byInit`)
+	_ioThreads = min(8, os.cpu_count() or 1) # Default number of threads used to read and write columns
+
+	# Where clause functions that attributes can answer without comparing every row, as (column op value).
+	_attrOps = {
+		numpy.equal: "==", operator.eq: "==",
+		numpy.less: "<", operator.lt: "<",
+		numpy.less_equal: "<=", operator.le: "<=",
+		numpy.greater: ">", operator.gt: ">",
+		numpy.greater_equal: ">=", operator.ge: ">=",
+		misc.within: "within",
+		misc.vin: "in", numpy.isin: "in"
+	}
+	_flipOps = {"==": "==", "<": ">", "<=": ">=", ">": "<", ">=": "<="} # (value op column) --> (column op value)
+	_nullKey = object() # Where grouped attributes file float/datetime nulls, which aren't equal to themselves
+	_live = weakref.WeakValueDictionary() # Live tables (id --> table), for `memSummary`
 
 	_types = {
 		"b": bool,
@@ -36,6 +55,10 @@ class Table:
 
 		self._keys = [] # Always init table unkeyed
 		self._isKeyed = False
+		self._valid = {} # Validity bitmaps of nullable columns (column --> packed bits, 1 = valid)
+		self._attr = {} # Column attributes (column --> attribute, see `setAttr`)
+		self._attrIdx = {} # Indices backing attributes (column --> index), for those that need one
+		Table._live[id(self)] = self
 
 		# Empty case.
 		if len(d) == 0:
@@ -100,6 +123,38 @@ class Table:
 		if not x is None: Table._dispWidth = x
 		if not y is None: Table._dispHeight = y
 
+	def setByThreads(n:int):
+		"""
+		Sets the default number of threads used by `by`.
+		@param n	{int}	Number of threads (1 means no threading, which is the default).
+		"""
+		if n < 1: raise TableException("Thread count must be positive, threads={}".format(n))
+		Table._byThreads = n
+
+	def setIoThreads(n:int):
+		"""
+		Sets the default number of threads used by `save` and `load`.
+		@param n	{int}	Number of threads (1 means no threading). Default is the number of CPUs, up to 8.
+		"""
+		if n < 1: raise TableException("Thread count must be positive, threads={}".format(n))
+		Table._ioThreads = n
+
+	def memSummary() -> "Table":
+		"""
+		Summarizes the memory used by all live tables (see `memUsage`). Note that memory shared between tables (e.g.
+		chunks or views of the same columns) is counted in each of them.
+		@return	{Table}	One row per table (id, rows, columns and total bytes), largest first.
+		"""
+		ts = list(Table._live.values())
+		res = Table({
+			"id": numpy.array([id(t) for t in ts], dtype=numpy.int64),
+			"rows": numpy.array([len(t) for t in ts], dtype=numpy.int64),
+			"cols": numpy.array([len(t._dict) for t in ts], dtype=numpy.int64),
+			"bytes": numpy.array([int(t.memUsage().getCol("total").sum()) for t in ts], dtype=numpy.int64)
+		})
+		res.sort("bytes", desc=True)
+		return res
+
 	def fromCSV(file:str, types:Union[list,str], delimiter:str=",") -> "Table":
 		"""
 		Writes down the table as a csv.
@@ -153,38 +208,114 @@ class Table:
 		@param tables	{Table[]}	List of tables.
 		@return			{Table}		Razed tables.
 		"""
-		res = tables[0].copy()
+		i = 0
+		while i < len(tables) - 1 and len(tables[i].cols()) == 0: i += 1 # Tables without columns take on the next's
+		first = tables[i]
+		rest = tables[i+1:]
+		cols = first.cols()
+
+		# Check everything up front, then build each column in one go rather than appending table by table (which
+		# would reallocate every column once per table).
+		for t in rest:
+			for c in cols:
+				if not c in t._dict: raise TableException("Append missing column: " + c)
+				if first._dict[c].ndim > 1: raise TableException("Cannot append to table with nested columns")
+				if t._dict[c].ndim > 1: raise TableException("Cannot append nested columns")
 
-		for i in range(1, len(tables)):
-			res.append(tables[i])
+		ts = [first] + rest
+		res = Table._wrap({c: numpy.concatenate([t._dict[c] for t in ts]) for c in cols}) # Types and widths reconciled
+
+		for c in first._valid.keys():
+			res._setValid(c, numpy.concatenate([~t.nullMask(c) if c in t._valid else numpy.ones(len(t), bool) for t in ts]))
+
+		for c, a in first._attr.items(): # Keep attributes that still hold
+			try:
+				res.setAttr(c, a)
+			except TableException:
+				pass
 
+		res._isKeyed = first._isKeyed
+		res._keys = first._keys
 		return res
 
-	def load(loc:str) -> "Table":
+	def load(loc:Union[str,list], col:Union[str,list]=[], threads:int=None) -> "Table":
 		"""
-		Loads a table from disk.
-		@param loc	{string}	On-disk location of table (root).
-		@return		{Table}		On-disk table, now in memory.
+		Loads a table from disk. Columns are read concurrently.
+		@param loc		{string|string[]}	On-disk location of table (root), or of each partition of a table (e.g.
+											one per date), which are loaded one after the other. Columns are those of
+											the first partition, which all others must have.
+		@param col		{string|string[]}	Column(s) to load -- optional, default is all. Columns keep their on-disk
+											order.
+		@param threads	{int|None}			Number of threads to read with, where 'None' means the class default
+											(see `setIoThreads`).
+		@return			{Table}				On-disk table, now in memory.
 		"""
-		# Start by getting the column order.
-		try:
-			dotD = open(loc + "/.d", "r") # Open the .d file
-			cols = dotD.read().split("\n") # Read the column names
-			if cols[-1] == "": cols = cols[:-1] # Handle trailing \n that always pops up for whatever reason
-		except Exception as ex:
-			raise TableException("Unable to read .d file: {}".format(ex))
+		locs = misc.mkList(loc)
+		if len(locs) == 0: raise TableException("No location to load")
+		cols = Table.diskCols(locs[0]) # Start by getting the column order
+
+		if col != []:
+			cc = misc.mkList(col)
+
+			for c in cc:
+				if not c in cols: raise TableException("Unknown column: {}".format(c))
+
+			cols = [c for c in cols if c in cc]
+
+		for l in locs[1:]:
+			lc = Table.diskCols(l)
+
+			for c in cols:
+				if not c in lc: raise TableException("Partition '{}' is missing column: {}".format(l, c))
 
 		# Read the columns.
+		parts = Table._ioRun(lambda lc: Table._loadCol(*lc), [(l, c) for l in locs for c in cols], threads)
 		res = Table() # Start with an empty table
 
+		for i, c in enumerate(cols):
+			xvs = parts[i::len(cols)] # This column in each partition
+
+			if len(xvs) == 1:
+				x, v = xvs[0]
+			else:
+				x = numpy.concatenate([p[0] for p in xvs])
+				v = None if all(p[1] is None for p in xvs) else numpy.packbits(numpy.concatenate(
+					[numpy.ones(len(p[0]), bool) if p[1] is None else
+						numpy.unpackbits(p[1], count=len(p[0])).astype(bool) for p in xvs]))
+
+			if len(res._dict) > 0 and len(x) != len(res):
+				raise TableException("Unable to read column '{}': Set col length".format(c))
+			res._dict[c] = x
+			if not v is None: res._valid[c] = v
+
+		# Restore attributes, building their indices (e.g. the runs of parted columns) once. They hold within each
+		# partition, but not necessarily across them, so they're checked.
+		attrs = Table._diskAttrs(locs[0])
+
 		for c in cols:
 			try:
-				res[c] = numpy.load(loc + "/" + c + ".npy", allow_pickle=True)
-			except Exception as ex:
-				raise TableException("Unable to read column '{}': {}".format(c, ex))
+				if attrs.get(c, "") != "": res.setAttr(c, attrs[c])
+			except TableException: # Files changed under us, or partitions don't line up
+				pass
 
 		return res
 
+	def diskCols(loc:str) -> list:
+		"""
+		Gets the columns of a table on disk, without loading it.
+		@param loc	{string}	On-disk location of table (root).
+		@return		{string[]}	Columns, in order.
+		"""
+		try:
+			dotD = open(loc + "/.d", "r") # Open the .d file
+			cols = dotD.read().split("\n") # Read the column names
+			dotD.close()
+			if cols[-1] == "": cols = cols[:-1] # Handle trailing \n that always pops up for whatever reason
+		except Exception as ex:
+			raise TableException("Unable to read .d file: {}".format(ex))
+
+		return cols
+
 
 	#-------------------------------------------------------------------------------------------------------------------
 	# Public instance functions. Most, but not all, functions have the `inPlace` parameter. If false,
@@ -253,6 +384,9 @@ class Table:
 		t = Table(self._dict)
 		t._isKeyed = self._isKeyed
 		t._keys = self._keys
+		t._valid = {c: v.copy() for c, v in self._valid.items()}
+		t._attr = self._attr.copy()
+		t._attrIdx = {c: {k: v.copy() for k, v in i.items()} for c, i in self._attrIdx.items()}
 		return t
 
 	def cols(self) -> list:
@@ -269,6 +403,49 @@ class Table:
 		"""
 		return len(self)
 
+	def memUsage(self) -> "Table":
+		"""
+		Accounts for the memory used by each column. Columns of the result are:
+			- col:		Column name.
+			- type:		Column type.
+			- data:		Bytes of the values themselves.
+			- payload:	Bytes of the python objects an object column points to (e.g. strings, nested arrays).
+			- waste:	Bytes of a string column wasted on padding to the widest string (included in data). Columns with
+						a lot of it, or few distinct values, are better off as symbols.
+			- hidden:	Bytes of the underlying buffer a column keeps alive beyond its own values, e.g. when it's a
+						slice of a bigger array.
+			- valid:	Bytes of the validity bitmap, if nullable.
+			- index:	Bytes of the attribute index, if any (approximate).
+			- total:	Sum of the above, except waste.
+		@return	{Table}	One row per column.
+		"""
+		cc = self.cols()
+		u = {k: [] for k in ["data", "payload", "waste", "hidden", "valid", "index"]}
+
+		for c in cc:
+			x = self._dict[c]
+			u["data"].append(x.nbytes)
+			u["payload"].append(sum(sys.getsizeof(o) for o in x.flat) if x.dtype.kind == "O" else 0)
+			u["waste"].append(x.nbytes - 4*int(numpy.char.str_len(x).sum()) if x.dtype.kind == "U" else 0)
+
+			# Walk up to the array that owns the memory. Memory-mapped files aren't held in memory.
+			base = x
+
+			while isinstance(base.base, numpy.ndarray): base = base.base
+
+			u["hidden"].append(base.nbytes - x.nbytes if base is not x and not isinstance(base, numpy.memmap) else 0)
+			u["valid"].append(self._valid[c].nbytes if c in self._valid else 0)
+
+			idx = self._attrIdx.get(c)
+			u["index"].append(0 if idx is None else sys.getsizeof(idx) + sum(sys.getsizeof(k) + sys.getsizeof(v) +
+				(28*len(v) if type(v) == list else 0 if v.flags.owndata else v.nbytes) for k, v in idx.items()))
+
+		res = Table({"col": numpy.array(cc, dtype=str), "type": numpy.array(self.type(cc), dtype=str)})
+		for k, v in u.items(): res.setCol(k, numpy.array(v, dtype=numpy.int64))
+		res.setCol("total", res.getCol("data") + res.getCol("payload") + res.getCol("hidden") + res.getCol("valid") +
+			res.getCol("index"))
+		return res
+
 	def getCol(self, col:Union[str,list]) -> Union[numpy.ndarray,list]:
 		"""
 		Gets one or more column(s) from the table. Note, we return copies of the columns.
@@ -280,6 +457,129 @@ class Table:
 		else: # Single column, presumably
 			return self._dict[col].copy()
 
+	def nullMask(self, col:Union[str,list]) -> Union[numpy.ndarray,list]:
+		"""
+		Gets a mask of the null values of one or more column(s).
+		@param col	{string|string[]}	Column(s) to check.
+		@return		{bool[]|bool[][]}	Mask or list of masks, true where the column is null.
+		"""
+		if type(col) in [list, numpy.ndarray]: # Multiple columns
+			return [self.nullMask(c) for c in col]
+		elif col in self._valid: # Nullable column, the bitmap is the source of truth
+			return ~self._getValid(col)
+		else: # Single column, presumably
+			return null.isNullArray(self._dict[col])
+
+	def nullable(self, col:Union[str,list], inPlace:bool=True) -> "Table":
+		"""
+		Makes column(s) nullable, i.e. backed by a validity bitmap rather than a sentinel value. This lets int columns
+		hold `null.INT` as a genuine value and bool columns hold a genuine `False`. Existing sentinels are turned into
+		nulls, except for bool columns, which start out all valid.
+		@param col		{string|string[]}	Column(s) to make nullable.
+		@param inPlace	{bool}				Do it in place or not.
+		@return			{Table}				Table with nullable column(s).
+		"""
+		if not inPlace:
+			t = self.copy()
+			t.nullable(col)
+			return t
+
+		cc = misc.mkList(col)
+		self._chkCols(cc)
+
+		for c in cc:
+			if c in self._valid: continue # Already nullable
+			x = self._dict[c]
+			self._setValid(c, numpy.ones(len(x), bool) if x.dtype.kind == "b" else ~null.isNullArray(x))
+
+	def isNullable(self, col:str) -> bool:
+		"""
+		Indicates if a column is nullable (see `nullable`).
+		@param col	{string}	Column.
+		@return		{bool}		True if the column has a validity bitmap.
+		"""
+		return col in self._valid
+
+	def attr(self, col:str) -> str:
+		"""
+		Gets the attribute of a column (see `setAttr`).
+		@param col	{string}	Column.
+		@return		{string}	Attribute, empty if none.
+		"""
+		self._chkCols([col])
+		return self._attr.get(col, "")
+
+	def setAttr(self, col:Union[str,list], attr:str, inPlace:bool=True) -> "Table":
+		"""
+		Sets the attribute of column(s). Attributes record properties of a column's values that lookups can exploit.
+		They're checked when set, and dropped when the column is modified in a way that may break them. Supported
+		attributes are:
+			- "s":	Sorted (ascending, with any float/datetime nulls at the end). Set by `sort` on its first column.
+					Equality, range and membership conditions in `where` (e.g. `[numpy.less, "x", 3]`, `[misc.within,
+					"x", (1, 3)]` or `[misc.vin, "x", (1, 3)]`), key lookups and as-of searches on the column use
+					binary search.
+			- "g":	Grouped. Keeps an index of the rows holding each distinct value, which `append` keeps up to date.
+					Equality and membership conditions in `where`, `by` on the column alone and key lookups only touch
+					the matching rows. Costs memory proportional to the length of the table.
+			- "p":	Parted, i.e. each distinct value occupies a single contiguous run of rows (e.g. data clustered by
+					symbol). Set by descending `sort` on its first column (which only builds the index when a lookup
+					first needs it). Keeps the run of each value, so the same lookups as "g" become slices. Costs memory
+					proportional to the number of runs only.
+			- "":	None (removes the attribute).
+		Attributes only speed up non-nullable columns.
+		@param col		{string|string[]}	Column(s).
+		@param attr		{string}			Attribute.
+		@param inPlace	{bool}				Do it in place or not.
+		@return			{Table}				Table with the attribute(s) set.
+		"""
+		if not inPlace:
+			t = self.copy()
+			t.setAttr(col, attr)
+			return t
+
+		cc = misc.mkList(col)
+		self._chkCols(cc)
+		if not attr in ["s", "g", "p", ""]: raise TableException("Unknown attribute: '{}'".format(attr))
+		idx = {}
+
+		for c in cc:
+			if attr == "s" and not Table._isSorted(self._dict[c]):
+				raise TableException("Column '{}' is not sorted".format(c))
+			if attr == "g": idx[c] = Table._indexRows(c, self._dict[c], {}, 0)
+			if attr == "p": idx[c] = Table._partRows(c, self._dict[c], {}, 0)
+
+		for c in cc:
+			self._dropAttr(c)
+
+			if attr != "":
+				self._attr[c] = attr
+				if c in idx: self._attrIdx[c] = idx[c]
+
+	def setNull(self, row:Union[int,list,numpy.ndarray,slice], col:Union[str,list]=[], inPlace:bool=True) -> "Table":
+		"""
+		Sets row(s) to null. Nullable columns only have their validity bits cleared; other columns get the null value of
+		their type.
+		@param row		{int|int[]|array|slice|bool[]}	Row(s) to set.
+		@param col		{string|string[]}				Column(s) to set -- optional, default is all.
+		@param inPlace	{bool}							Do it in place or not.
+		@return			{Table}							Table with row(s) nulled.
+		"""
+		if not inPlace:
+			t = self.copy()
+			t.setNull(row, col)
+			return t
+
+		cc = self.cols() if col == [] else misc.mkList(col)
+		self._chkCols(cc)
+
+		for c in cc:
+			if c in self._valid:
+				valid = self._getValid(c)
+				valid[row] = False
+				self._setValid(c, valid)
+			else:
+				self._setRowOne(row, c, null.getNull(self._dict[c].dtype.name))
+
 	def getRow(self, row:Union[int,list,slice], col:Union[str,list]=[]) -> Union[dict,"Table"]:
 		"""
 		Gets one or multiple rows from the table.
@@ -297,7 +597,73 @@ class Table:
 		for k in keys:
 			res[k] = self._dict[k][row] # Grab appropriate row(s) from each column
 
-		return res if type(row) in [int, numpy.int64] else Table(res)
+		if type(row) in [int, numpy.int64]:
+			for k in keys:
+				if k in self._valid and not self._isValidAt(k, row): res[k] = None # Genuine null
+
+			return res
+
+		t = Table(res)
+		for k in keys:
+			if k in self._valid: t._setValid(k, self._getValid(k)[row])
+		return t
+
+	def rows(self, col:Union[str,list]=[]) -> Iterator[tuple]:
+		"""
+		Iterates over the rows of the table as named tuples. Much lighter than iterating over the table itself, which
+		creates a dictionary per row. Column names that aren't valid identifiers are renamed positionally (e.g. `_0`),
+		but indexing by position always works.
+		@param col	{string|string[]}	Column(s) to get -- optional, default is all.
+		@return		{iterator}			Rows, see `itercols` for the values.
+		"""
+		cc = self.cols() if col == [] else misc.mkList(col)
+		row = collections.namedtuple("Row", cc, rename=True)
+		for r in self.itercols(cc): yield row._make(r)
+
+	def itercols(self, col:Union[str,list]=[]) -> Iterator[tuple]:
+		"""
+		Iterates over the rows of the table as plain tuples. Columns are unboxed a chunk at a time, so no per-row
+		dictionary or indexing is involved. Values are Python scalars where numpy has an exact equivalent (ints, floats,
+		bools, strings) and numpy scalars otherwise; nulls of nullable columns come out as `None`.
+		@param col	{string|string[]}	Column(s) to get -- optional, default is all.
+		@return		{iterator}			Tuples parallel to `col`.
+		"""
+		cc = self.cols() if col == [] else misc.mkList(col)
+		self._chkCols(cc)
+		n = len(self)
+		k = Table._iterChunk
+
+		for lo in range(0, n, k):
+			hi = min(lo + k, n)
+			vals = []
+
+			for c in cc:
+				x = self._dict[c][lo:hi]
+				v = x.tolist() if x.dtype.kind in "iufbU" and x.ndim == 1 else list(x) # Keep datetimes etc. numpy
+
+				if c in self._valid:
+					for i in numpy.flatnonzero(self._nullMaskRange(c, lo, hi)): v[i] = None
+
+				vals.append(v)
+
+			yield from zip(*vals)
+
+	def chunks(self, n:int) -> Iterator["Table"]:
+		"""
+		Iterates over the table in blocks of rows. The blocks are views, not copies: setting values of non-nullable
+		columns in a block, when they fit the column's type, sets them in this table. Anything else (nulls, values that
+		widen a column, appending rows or setting columns) only changes the block.
+		@param n	{int}		Number of rows per block (the last block may be shorter).
+		@return		{iterator}	Sub-tables, with the same key columns as this table.
+		"""
+		if n < 1: raise TableException("Chunk size must be positive, n={}".format(n))
+		l = len(self)
+
+		for lo in range(0, l, n):
+			t = self._view(lo, min(lo + n, l))
+			t._isKeyed = self._isKeyed
+			t._keys = self._keys
+			yield t
 
 	def getKey(self, key, col:Union[str,list]=[]) -> Union[dict,"Table"]:
 		"""
@@ -330,6 +696,8 @@ class Table:
 				for c in res.keys():
 					if c in self.keyCols():
 						res[c] = get(key, 0, self.keyCols().index(c)) # Fill in (missed) key value
+					elif c in self._valid:
+						res[c] = None # Genuine null
 
 				return res
 			else:
@@ -342,17 +710,20 @@ class Table:
 
 				if True in b:
 					null = res.mkNullRow() # Null row
+					nc = [c for c in res._valid.keys() if not c in self.keyCols()] # Nullable non-key columns
+					cc = [c for c in null.keys() if not c in nc] # Columns to write misses in
 					misses =[] # Fill in misses with nulls or key values that missed
 					w = misc.where(b) # Rows where we missed
 
-					for c in null.keys():
+					for c in cc:
 						if c in self.keyCols():
 							j = self.keyCols().index(c) # Index of key col
 							misses.append([get(key, i, j) for i in w])
 						else:
 							misses.append(null[c])
 
-					res.setRow(b, misses) # Fill in misses with null or key
+					if len(cc) > 0: res.setRow(b, misses, cc) # Fill in misses with null or key
+					if len(nc) > 0: res.setNull(b, nc) # Nullable columns only get their bits cleared
 
 				return res
 			else: # All misses
@@ -367,7 +738,12 @@ class Table:
 					else:
 						d[k] = [d[k]]*n # Scalar extend
 
-				return Table(d)
+				res = Table(d)
+
+				for k in d.keys():
+					if k in self._valid and not k in self.keyCols(): res._setValid(k, numpy.zeros(n, bool))
+
+				return res
 
 	def setCol(self, col: Union[str,list], val: Union[list,numpy.ndarray], inPlace:bool=True) -> "Table":
 		"""
@@ -411,6 +787,8 @@ class Table:
 		# Should be safe to set.
 		for i in r:
 			self._dict[c[i]] = numpy.array(v[i]) # Set
+			self._valid.pop(c[i], None) # New values, so any old validity bitmap no longer applies
+			self._dropAttr(c[i]) # Ditto for attributes
 
 	def setRow(self, row:Union[int,list,numpy.ndarray,slice], val, col:Union[str,list]=[], inPlace:bool=True) -> "Table":
 		"""
@@ -472,14 +850,16 @@ class Table:
 
 		# Set rows. In case anything goes wrong, backup previous values so we can restore.
 		bkup = {}
+		vbkup = self._valid.copy() # Bitmaps are replaced rather than modified, so a shallow copy will do
 
 		for i in range(nc):
-			bkup[c[i]] = self.getRow(row, c[i])[c[i]] # Back up rows of the column we're about to change
+			bkup[c[i]] = self._dict[c[i]][row] # Back up rows of the column we're about to change
 
 			try:
 				self._setRowOne(row, c[i], v[i])
 			except Exception as ex:
 				for key in bkup.keys(): self._dict[key][row] = bkup[key] # Restore backups
+				self._valid = vbkup
 				raise TableException("Set row error: " + str(ex))
 
 	def setKey(self, key, val, col:Union[str,list]=[], inPlace:bool=True) -> "Table":
@@ -519,6 +899,8 @@ class Table:
 				newRow = self.mkNullRow() # Null row
 				for i in range(len(self.keyCols())): newRow[self.keyCols()[i]] = get(key, 0, i) # Fill in key values
 				self.append(newRow)
+				nc = [c for c in self._valid.keys() if not c in self._keys] # Nullable non-key columns
+				if len(nc) > 0: self.setNull(idx, nc)
 		else:
 			if -1 in idx:
 				n = 0 # Number of misses
@@ -540,6 +922,8 @@ class Table:
 						d[k] = [d[k]]*n # Or put nulls
 
 				self.append(Table(d)) # Append
+				nc = [c for c in self._valid.keys() if not c in self._keys] # Nullable non-key columns
+				if len(nc) > 0: self.setNull(slice(ogLen, None), nc)
 
 		# By default, we only set non-key cols.
 		if col == []:
@@ -573,6 +957,8 @@ class Table:
 		for c in misc.mkList(col): # For each column...
 			if c in self.cols(): # If it's in the table...
 				self._dict.pop(c) # Pop
+				self._valid.pop(c, None)
+				self._dropAttr(c)
 
 	def takeCol(self, col=Union[str,list], inPlace:bool=True) -> "Table":
 		"""
@@ -590,7 +976,11 @@ class Table:
 			self.deleteCol(toDel) # Delete unwanted columns
 			self.xcol(col) # Order accordingly
 		else:
-			return Table({c: self._dict[c] for c in cc})
+			t = Table({c: self._dict[c] for c in cc})
+			t._valid = {c: self._valid[c].copy() for c in cc if c in self._valid}
+			t._attr = {c: self._attr[c] for c in cc if c in self._attr}
+			t._attrIdx = {c: {k: v.copy() for k, v in self._attrIdx[c].items()} for c in cc if c in self._attrIdx}
+			return t
 
 	def deleteRow(self, row:Union[int,list,slice], inPlace:bool=True) -> Union[dict,"Table"]:
 		"""
@@ -616,8 +1006,13 @@ class Table:
 
 		# Keep only good indices in each column.
 		for col in self._dict.keys():
+			if col in self._valid: self._setValid(col, self._getValid(col)[toKeep])
 			self._dict[col] = self._dict[col][toKeep]
 
+		for col in self._attrIdx.keys(): # Rows moved up
+			f = Table._indexRows if self._attr[col] == "g" else Table._partRows
+			self._attrIdx[col] = f(col, self._dict[col], {}, 0)
+
 	def deleteKey(self, key, inPlace:bool=True) -> "Table":
 		"""
 		Sets the values of the given keys.
@@ -676,7 +1071,7 @@ class Table:
 											otherwise.
 		"""
 		res = [str.join(delimiter, self.cols())] # Column names
-		res += [str.join(delimiter, [str(x) for x in self.getRow(i).values()]) for i in range(len(self))] # Their values
+		res += [str.join(delimiter, [str(x) for x in row]) for row in self.itercols()] # Their values
 
 		if file is None:
 			return res
@@ -733,10 +1128,12 @@ class Table:
 
 		typ = type(toAdd)
 		isEmpty = len(self.cols()) == 0 # Is the table empty? We can trivially copy 'toAdd'
+		n = len(self) # Length before appending
 
 		if typ == Table:
 			if isEmpty:
 				self._dict = toAdd._dict.copy() # Simple copy will do
+				self._valid = toAdd._valid.copy()
 				return
 
 			# Before we start diddling with the memory, ensure all columns are present.
@@ -746,6 +1143,11 @@ class Table:
 
 			# Once we know all columns are there, we can add safely.
 			for c in self.cols():
+				if c in self._valid or c in toAdd._valid: # Either side being nullable makes the result nullable
+					old = self._getValid(c) if c in self._valid else numpy.ones(n, bool)
+					valid = ~toAdd.nullMask(c) if c in toAdd._valid else numpy.ones(len(toAdd), bool)
+					self._setValid(c, numpy.append(old, valid))
+
 				self._dict[c] = numpy.append(self._dict[c], toAdd.getCol(c))
 
 		elif typ == dict:
@@ -765,7 +1167,7 @@ class Table:
 					raise TableException("Append missing key: " + c)
 
 			for c in self.cols():
-				self._dict[c] = numpy.append(self._dict[c], toAdd[c])
+				self._dict[c] = self._appendOne(c, toAdd[c])
 
 		elif typ == tuple:
 			lt = len(toAdd)
@@ -781,47 +1183,147 @@ class Table:
 					raise TableException("Cannot append a nested tuple")
 
 			for i in range(lt):
-				self._dict[c[i]] = numpy.append(self._dict[c[i]], toAdd[i])
+				self._dict[c[i]] = self._appendOne(c[i], toAdd[i])
 
 		else:
 			raise TableException("Table unkown append type: {}".format(typ))
 
-	def save(self, loc:str):
+		# Keep attributes that still hold, checking only the rows we added (and the one before), and update indices.
+		for c in list(self._attr.keys()):
+			if self._attr[c] == "s" and not Table._isSorted(self._dict[c][max(n - 1, 0):]):
+				self._dropAttr(c)
+			elif self._attr[c] in ["g", "p"]:
+				f = Table._indexRows if self._attr[c] == "g" else Table._partRows
+				idx = self._attrIndex(c, n) # Of the rows we had
+				if idx is None: continue # Dropped
+
+				try:
+					f(c, self._dict[c][n:], idx, n)
+				except TableException: # Not parted any more, or can't be indexed
+					self._dropAttr(c)
+
+	def save(self, loc:str, threads:int=None):
 		"""
-		Saves table to disk.
-		@param loc	{string}	Location to save table.
+		Saves table to disk. Columns are written concurrently.
+		@param loc		{string}	Location to save table.
+		@param threads	{int|None}	Number of threads to write with, where 'None' means the class default (see
+									`setIoThreads`).
 		"""
 		# Save all tables splayed:
 		# table/
 		#	.d		--> column names and order
+		#	.a		--> column attributes
 		#	col1	--> numpy file
 		#	col2	--> numpy file
 		#	...
 		if not os.path.exists(loc): os.mkdir(loc) # Make the directory if it doesn't exist already
+
+		def saveCol(c:str):
+			try:
+				numpy.save(loc + "/" + c, self._dict[c]) # Save each column as a numpy array
+
+				# Nullable columns also get their validity bitmap saved alongside.
+				if c in self._valid:
+					numpy.save(loc + "/" + c + ".v", self._valid[c])
+				elif os.path.isfile(loc + "/" + c + ".v.npy"):
+					os.remove(loc + "/" + c + ".v.npy") # Stale bitmap from a previous save
+			except Exception as ex:
+				raise TableException("Unable to save column '{}': {}".format(c, ex))
+
+		Table._ioRun(saveCol, self.cols(), threads)
+
+		# Columns are all there, so describe them.
 		dotD = open(loc + "/.d", "w+") # .d file for column order
 		dotD.write(str.join("\n", self.cols())) # Write it as a plain text file (probably fine)
 		dotD.close() # Close the file as we're done with it
+		dotA = open(loc + "/.a", "w+") # .a file for attributes, one line per column (empty for none)
+		dotA.write(str.join("\n", [self._attr.get(c, "") for c in self.cols()]))
+		dotA.close()
 
-		for c in self.cols():
-			numpy.save(loc + "/" + c, self.getCol(c)) # Save each column as a numpy array
-
-	def sort(self, cols:Union[str,list], desc:bool=False, inPlace:bool=True) -> "Table":
+	def sort(self, cols:Union[str,list], desc:Union[bool,list]=False, inPlace:bool=True) -> "Table":
 		"""
-		Sorts the table in either ascending or descending order.
+		Sorts the table. The sort is stable: rows that tie on all sort columns keep their relative order. Float and
+		datetime nulls sort as the largest values, and so do the nulls of nullable columns, whatever value sits under
+		them. Sorting on a nullable column doesn't set an attribute on it.
 		@param cols		{string|string[]}	Column(s) to sort on (sorts cols_n within ... within cols_2 within cols_1).
-		@param desc		{bool}				Do descending order (default is False).
+		@param desc		{bool|bool[]}		Do descending order (default is False), either for all columns or for each.
 		@param inPlace	{bool}				Do it in place.
 		@return			{Table}				Sorted table.
 		"""
-		if not inPlace:
-			t = self.copy()
-			t.sort(cols, desc)
-			return t
-
-		# Do the sort (numpy sorts multiple cols in the opposite order you'd expect).
 		cc = misc.mkList(cols) # Enlist
-		self._dict = self[numpy.lexsort([self[c] for c in cc[::-1]])]._dict # Reverse the column order
-		if desc: self._dict = self[::-1]._dict # Reverse the order if we wanted it desending
+		t = self.reorder(self._sortIdx(cc, desc), inPlace) # One gather per column
+		if inPlace: t = self
+
+		# Rows moved, so only the sort tells us anything about attributes. The index of a parted column is only built
+		# when first needed (see `_attrIndex`), as it may never be.
+		d = desc[0] if type(desc) == list else desc
+		t._attr = {cc[0]: "p" if d else "s"} if (not d or t._dict[cc[0]].ndim == 1) and not cc[0] in t._valid else {}
+		t._attrIdx = {}
+		if not inPlace: return t
+
+	def top(self, k:int, col:str, desc:bool=True, by:Union[str,list]=[]) -> "Table":
+		"""
+		Gets the top k rows by a column, without sorting the whole table (see `misc.itop`). Same as taking the first k
+		rows after a (stable) `sort`, but O(n) rather than O(n log n). As in `sort`, nulls are the largest values: they
+		come first when descending and last otherwise.
+		@param k	{int}				Number of rows (per group).
+		@param col	{string}			Column to rank on.
+		@param desc	{bool}				Largest (default) or smallest values.
+		@param by	{string|string[]}	Column(s) to group by -- optional. If given, we get the top k rows of each group,
+										groups in order of first appearance.
+		@return		{Table}				Top rows, ordered by 'col' (within each group), keyed like self.
+		"""
+		cc = misc.mkList(by)
+		self._chkCols([col] + cc)
+		x = self._clauseCol(col, False) # Masked if nullable, so nulls rank as the largest (as they sort)
+
+		if cc == []:
+			idx = misc.itop(x, k, desc)
+		else:
+			first, grp = self._keyTable(Table._stdClause(cc))._groupIndex()
+			order = numpy.argsort(grp, kind="stable")
+			bounds = numpy.concatenate([[0], numpy.cumsum(numpy.bincount(grp, minlength=len(first)))])
+			rows = [order[bounds[g]:bounds[g+1]] for g in range(len(first))]
+			idx = numpy.concatenate([numpy.arange(0)] + [r[misc.itop(x[r], k, desc)] for r in rows])
+
+		res = self.getRow(idx)
+		if self._isKeyed: res.key(self._keys)
+		return res
+
+	def iasc(self, cols:Union[str,list]) -> numpy.ndarray:
+		"""
+		Gets the permutation that sorts the table in ascending order (see `sort`), without sorting it. Apply it to this
+		table or any other of the same length with `reorder`.
+		@param cols	{string|string[]}	Column(s) to sort on.
+		@return		{int[]}				Row numbers, in sorted order.
+		"""
+		return self._sortIdx(misc.mkList(cols), False)
+
+	def idesc(self, cols:Union[str,list]) -> numpy.ndarray:
+		"""
+		Gets the permutation that sorts the table in descending order (see `iasc`).
+		@param cols	{string|string[]}	Column(s) to sort on.
+		@return		{int[]}				Row numbers, in sorted order.
+		"""
+		return self._sortIdx(misc.mkList(cols), True)
+
+	def reorder(self, idx:Union[list,numpy.ndarray], inPlace:bool=True) -> "Table":
+		"""
+		Reorders the rows of the table, e.g. by a permutation from `iasc`/`idesc`. Keys are kept, attributes dropped.
+		@param idx		{int[]}	New order: row i of the result is row idx[i] of the table. Must be as long as the table.
+		@param inPlace	{bool}	Do it in place or not.
+		@return			{Table}	Reordered table.
+		"""
+		idx = numpy.asarray(idx, dtype=numpy.int64)
+		if len(idx) != len(self): raise TableException("Reorder length, expected={} got={}".format(len(self), len(idx)))
+		t = self if inPlace else Table()
+		t._dict = {c: x[idx] for c, x in self._dict.items()}
+		t._valid = {c: numpy.packbits(self._getValid(c)[idx]) for c in self._valid.keys()}
+		t._attr = {}
+		t._attrIdx = {}
+		t._isKeyed = self._isKeyed
+		t._keys = self._keys
+		if not inPlace: return t
 
 	def mkNullRow(self, col:Union[str,list]=[]) -> dict:
 		"""
@@ -838,7 +1340,7 @@ class Table:
 	def aj(self, table:"Table", cols:Union[str,list], inPlace:bool=True) -> "Table":
 		"""
 		As-of join.
-		@param table	{Table}		Table to join onto self. Must be sorted on c_n in ascending order within c_1, ..., c_n-1.
+		@param table	{Table}		Table to join onto self. Among rows with the same c_1, ..., c_n, the last one is used.
 		@param cols		{string[]}	List of columns (c_1, ..., c_n) where c_1, ..., c_n-1 are the columns to join on
 									and c_n is the as-of column (e.g. time).
 		@param inPlace	{bool}		True if should be done in place.
@@ -858,39 +1360,54 @@ class Table:
 			if not c in table.cols():
 				raise TableException("aj error: column '{}' not in right".format(c))
 
-		# Proceed as follows on each row of self:
-		#	1) Match all but the last col in table. Do this once at the outset since we have an inbuilt function that
-		#	   does this (`_getKeyMask`).
-		#	2) Binary search over the last col to find the as-of point.
-		#	3) Join all cols of table onto self.
+		# Look up all rows at once:
+		#	1) Code the key columns of both tables together, so that matching keys get the same code.
+		#	2) Rank the as-of column of both tables together, and combine code and rank into a single number that sorts
+		#	   by key, then as-of value.
+		#	3) An as-of search of the left numbers in the (sorted) right ones finds the as-of point, provided it falls
+		#	   within the same key.
+		#	4) Join all cols of table onto self.
 		kc = cols[:-1] # Columns that act as key columns
-		zkc = len(kc) == 0 # Are there any key cols?
-
-		if len(kc) == 0:
-			mask = [slice(None)]*len(self)
-		else:
-			mask, dummy, dummy1 = table._getKeyMask(self[kc], kc) # Mask of matching keys in left table
-
 		aoc = cols[-1] # Last column to be used as the as-of column (e.g. time)
 		l = self.getCol(aoc) # Left table as-of column
-		r = table.getCol(aoc) # Right table as-of column -- assume sorted in ascending order within key
+		r = table.getCol(aoc) # Right table as-of column
 		t = table.deleteCol(cols, inPlace=False) # Subset of columns we now care about
-		res = t[:0] # Table we'll join to left
-		null = t.mkNullRow() # In case we need it ##~ Just use values?
+		if len(t.cols()) == 0: return # Nothing to join
+		n = len(self)
 
-		for i in range(len(self)):
-			sr = r[mask[i]] # Subset of right table for this key
-			j = misc.asof(sr, l[i]) # As-of index into (subset of) right table
-
-			if j == -1:
-				res.append(null) # Null if no such index (mask empty or as-of point predates first)
-			else:
-				if zkc:
-					res.append(t[j]) ##~ Probably a better idea to fix 'where'
-				else:
-					res.append(t.getRow(misc.where(mask[i])[j]))
+		keep = numpy.flatnonzero(~table.nullMask(aoc)) # Right rows with an as-of value; nulls match nothing
 
-		self.setCol(res.cols(), list(res._dict.values()))
+		if len(keep) == 0:
+			js = numpy.full(n, -1) # Nothing to find
+		elif len(kc) == 0 and table._attr.get(aoc) == "s" and not aoc in table._valid:
+			js = misc.asof(r[:Table._sortedLen(r)], l) # Already sorted
+		else:
+			code = self._jointCodes(table, kc)
+			lc, rc = code[0], code[1][keep]
+
+			_, rank = numpy.unique(numpy.concatenate([l, r[keep]]), return_inverse=True)
+			rank = rank.reshape(-1)
+			m = int(rank.max(initial=0)) + 1
+			lx, rx = lc*m + rank[:n], rc*m + rank[n:]
+			order = numpy.argsort(rx, kind="stable") # Ties keep their order, so the last one is the as-of point
+			js = misc.asof(rx[order], lx)
+			found = js >= 0
+			found[found] = rc[order][js[found]] == lc[found] # As-of point in the same key
+			js = numpy.where(found, keep[order[numpy.maximum(js, 0)]], -1)
+
+		js[self.nullMask(aoc)] = -1 # Null as-of values match nothing
+		miss = js == -1 # Rows where the as-of lookup failed
+
+		if len(t) > 0:
+			res = t.getRow(numpy.maximum(js, 0)) # Misses pick up the first row, overwritten below
+		else: # Everything misses
+			res = Table({c: numpy.full(n, v, dtype=t._dict[c].dtype) for c, v in t.mkNullRow().items()})
+			res._valid = {c: numpy.packbits(numpy.zeros(n, bool)) for c in t._valid.keys()}
+
+		if len(res._valid) > 0: res.setNull(miss, list(res._valid.keys())) # Nullable columns mark misses in bitmaps
+		cc = [c for c in res.cols() if not c in res._valid] # Other columns get their type's null
+		if len(cc) > 0 and miss.any(): res.setRow(miss, list(res.mkNullRow(cc).values()), cc)
+		self.join(res)
 
 	def lj(self, right:"Table", key:Union[str,list]=[], col:Union[str,list]=[], inPlace:bool=True) -> "Table":
 		"""
@@ -936,7 +1453,119 @@ class Table:
 
 		return res
 
-	def by(self, byClause:Union[str,list,dict], aggClause:Union[str,list,dict], raggedCols:Union[str,list]=[]) -> "Table":
+	def isIn(self, other:"Table", col:Union[str,list]=[]) -> numpy.ndarray:
+		"""
+		Determines which rows of the table are in another. Rows are compared column by column (nulls being equal to each
+		other) rather than one at a time as dictionaries.
+		@param other	{Table}				Table to look in.
+		@param col		{string|string[]}	Column(s) to compare -- optional, default is all the columns of self.
+		@return			{bool[]}			True where the row is in `other`.
+		"""
+		cc = self.cols() if col == [] else misc.mkList(col)
+
+		for c in cc:
+			if not c in self._dict or not c in other._dict: raise TableException("Unknown column: {}".format(c))
+
+		a, b = self._jointCodes(other, cc)
+		return numpy.isin(a, b)
+
+	def where(self, clause:Union[str,list]) -> "Table":
+		"""
+		Does a 'select from self where {clause}'.
+		@param clause	{string|list|list[]}	Condition(s) that rows must satisfy. Either a single condition or a list of
+												them, each one a boolean column name or a list of the form
+												(function, param_1, ..., param_n), possibly nested (see `by`). The
+												result of a condition must be a boolean per row (or a single boolean).
+												Conditions are applied in order, each one only on the rows that
+												survived the previous ones, so put the most selective ones first.
+		@return			{Table}					Rows satisfying all conditions, keyed like self.
+		"""
+		res = self.getRow(self._whereIdx(clause))
+		if self._isKeyed: res.key(self._keys)
+		res._attr = {c: a for c, a in self._attr.items() if a == "s"} # Rows keep their order
+		return res
+
+	def select(self, col:Union[str,list,dict]=[], where:Union[str,list]=[]) -> "Table":
+		"""
+		Does a 'select {col} from self where {where}'.
+		@param col		{string|list|dictionary}	Column(s) to select, in the same format as the 'aggClause' of `by`
+													-- optional, default is all. Atoms are scalar extended, unless all
+													results are atoms, in which case the result has a single row.
+		@param where	{string|list|list[]}		Condition(s) rows must satisfy (see `where`) -- optional, default is
+													all rows.
+		@return			{Table}						Selected table. The result is keyed like self if the key columns
+													are selected as they are.
+		"""
+		if col == []: return self.copy() if where == [] else self.where(where)
+
+		a = Table._stdClause(col)
+		src = Table._clauseSrcCols(list(a.values())) # Only the columns we need
+		self._chkCols(src)
+		sub = self.takeCol(src, inPlace=False) if where == [] else self.getRow(self._whereIdx(where), src)
+		res = Table._fromClauseVals(sub._resolveClause(a))
+		if self._isKeyed and all(type(misc.getVal(a, k, None)) == str and a[k] == k for k in self._keys):
+			res.key(self._keys)
+		return res
+
+	def update(self, col:Union[str,list,dict], by:Union[str,list,dict]=[], inPlace:bool=True) -> "Table":
+		"""
+		Does an 'update {col} by {by} from self': sets (or adds) columns to the values of clauses evaluated within each
+		group, so that e.g. moving windows restart at key boundaries (`{"s": [misc.msum, "px", 3]}` by "sym").
+		@param col		{string|list|dictionary}	Column(s) to set, in the same format as the 'aggClause' of `by`. Each
+													clause must give a value per row of the group, or an atom, which is
+													scalar extended.
+		@param by		{string|list|dictionary}	Column(s) to group by, in the same format as the 'byClause' of `by`
+													-- optional, default is a single group. Rows keep their order within
+													groups.
+		@param inPlace	{bool}						Do it in place or not.
+		@return			{Table}						Table with the columns set.
+		"""
+		if not inPlace:
+			t = self.copy()
+			t.update(col, by)
+			return t
+
+		a = Table._stdClause(col)
+		p = plan.compileClause(a) # Compile once, run per group
+		self._chkCols(p.cols)
+		n = len(self)
+
+		if by == []:
+			order = None
+			bounds = [0, n]
+			srt = self
+		else:
+			first, grp = self._keyTable(Table._stdClause(by))._groupIndex()
+			order = numpy.argsort(grp, kind="stable")
+			bounds = numpy.concatenate([[0], numpy.cumsum(numpy.bincount(grp, minlength=len(first)))])
+			srt = self.getRow(order, p.cols) if len(p.cols) > 0 else self # Rows of each group next to each other
+
+		parts = {k: [] for k in a.keys()}
+
+		for g in range(len(bounds) - 1):
+			lo, hi = int(bounds[g]), int(bounds[g+1])
+
+			for k, x in p.run(srt._view(lo, hi)._clauseCol).items():
+				if numpy.ndim(x) == 0:
+					x = numpy.full(hi - lo, x)
+				elif len(x) != hi - lo:
+					raise TableException("Update length mismatch, col={} expected={} got={}".format(k, hi - lo, len(x)))
+				parts[k].append(x)
+
+		for k, xs in parts.items():
+			masked = any(isinstance(x, numpy.ma.MaskedArray) for x in xs)
+			x = numpy.zeros(0) if len(xs) == 0 else numpy.ma.concatenate(xs) if masked else numpy.concatenate(xs)
+
+			if not order is None: # Back to table order
+				inv = numpy.empty(n, dtype=numpy.int64)
+				inv[order] = numpy.arange(n)
+				x = x[inv]
+
+			self.setCol(k, numpy.ma.getdata(x))
+			if masked: self._setValid(k, ~numpy.ma.getmaskarray(x))
+
+	def by(self, byClause:Union[str,list,dict], aggClause:Union[str,list,dict], raggedCols:Union[str,list]=[],
+		threads:int=None, workers:int=1) -> "Table":
 		"""
 		Does a 'select {aggClause} by {byClause} from self'.
 		@param byClause		{string|list|dictionary}	Column or list of columns to group by. If a dicitonary, keys are
@@ -950,20 +1579,90 @@ class Table:
 		@param raggedCols	{string|string[]}			Target column(s) which is/are ragged, i.e. a nested column with
 														non-constant shape. By default (empty), we assume that only
 														columns whose 'aggClause' is of the form 'targetCol: sourceCol'.
+		@param threads		{int|None}					Number of threads to aggregate with, where 'None' means the
+														class default (see `setByThreads`). Ranges of groups and, if
+														there are only a few groups, independent target columns are
+														aggregated concurrently. This pays off when the aggregations
+														are numpy reductions (which release the GIL), less so with
+														pure python functions. Functions in 'aggClause' must then be
+														thread safe. The result doesn't depend on the thread count.
+		@param workers		{int}						Number of processes to aggregate with (default is 1, i.e. none).
+														Use this when the aggregations hold the GIL, e.g. pure python
+														functions, so threads don't help. Groups are partitioned across
+														the processes by group, and workers share the table's memory
+														(they fork, so nothing is pickled on the way in, and functions
+														needn't be picklable). Results are pickled back, so must be
+														picklable. Takes precedence over 'threads'. Where processes
+														can't fork (e.g. Windows), or other threads are running (which
+														makes forking unsafe), aggregation falls back to threads.
 		@return				{Table}						Result of 'group by'. Note that the table is keyed by the target
 														columns of 'byClause'.
 		"""
 		b = Table._stdClause(byClause) # Standardize by clause to dictionary
 		a = Table._stdClause(aggClause) # Ditto for agg clause
-		ks = Table(self._resolveClause(b)) # Construct key columns
-		res = ks.distinct() # Distinct keys
-		v = {k: [] for k in a.keys()} # Values -- build as we go
+		if threads is None: threads = Table._byThreads
+		if threads < 1: raise TableException("Thread count must be positive, threads={}".format(threads))
+		if workers < 1: raise TableException("Worker count must be positive, workers={}".format(workers))
+
+		p = plan.compileClause(a) # Compile once, run per group
+		self._chkCols(p.cols)
+		src = list(b.values())[0] if len(b) == 1 else None
+
+		# Find the rows of each group (in table order), groups in order of first appearance. A grouped or parted column
+		# already knows them.
+		idx = self._attrIndex(src) if type(src) == str and self._attr.get(src) in ["g", "p"] and \
+			not src in self._valid else None
+
+		if not idx is None:
+			rows = [r if self._attr[src] == "g" else numpy.arange(*r) for r in idx.values()]
+			first = numpy.array([r[0] for r in rows], dtype=numpy.int64)
+			order = numpy.concatenate([numpy.arange(0)] + rows)
+			bounds = numpy.concatenate([[0], numpy.cumsum([len(r) for r in rows], dtype=numpy.int64)])
+			ks = Table._wrap({list(b.keys())[0]: self._dict[src]})
+		else:
+			ks = self._keyTable(b) # Construct key columns
+			first, grp = ks._groupIndex() # Group of each row
+			order = numpy.argsort(grp, kind="stable")
+			bounds = numpy.concatenate([[0], numpy.cumsum(numpy.bincount(grp, minlength=len(first)))])
+
+		res = ks.getRow(first) # Distinct keys
+		n = len(first)
+
+		# Gather the columns we need once, with the rows of each group next to each other, so that each group is a slice.
+		srt = self.getRow(order, p.cols) if len(p.cols) > 0 else None
+		v = {k: [None]*n for k in a.keys()} # Values -- each task fills in its own groups
+
+		def agg(q:plan.Plan, gs:range):
+			for g, rowVals in zip(gs, Table._aggGroups(srt, bounds, q, gs)):
+				for k, x in rowVals.items(): v[k][g] = x
+
+		if workers > 1 and n > 1 and "fork" in multiprocessing.get_all_start_methods() and \
+			threading.active_count() == 1:
+			# Partition groups across processes, each process getting every 'workers'-th group so that big and small
+			# groups (which tend to cluster, e.g. by time) are spread evenly. Each process gets the work as it starts (it
+			# isn't pickled, as processes fork), so concurrent calls don't share anything.
+			m = min(workers, n)
+
+			with concurrent.futures.ProcessPoolExecutor(m, mp_context=multiprocessing.get_context("fork"),
+				initializer=Table._byInit, initargs=(srt, bounds, p)) as ex:
+				fs = [(range(i, n, m), ex.submit(Table._byWorker, range(i, n, m))) for i in range(m)]
+
+				for gs, f in fs: # Merge
+					for g, rowVals in zip(gs, f.result()):
+						for k, x in rowVals.items(): v[k][g] = x
+		else:
+			if workers > 1: threads = max(threads, workers)
 
-		for row in res:
-			w = misc.where([row == k for k in ks]) # Where this key appears
-			subTbl = self.getRow(w) # Sub-table corresponding to this key
-			rowVals = subTbl._resolveClause(a) # Resolve clause on sub-table
-			for k in v.keys(): v[k].append(rowVals[k]) # Append across row
+			# Split the work: by target column if there aren't enough groups to go around, and by ranges of groups.
+			plans = [p] if threads == 1 or n >= threads or len(a) == 1 else [plan.compileClause({k: a[k]}) for k in a]
+			m = max(1, min(n, threads // len(plans)))
+			tasks = [(q, range(n*i // m, n*(i + 1) // m)) for q in plans for i in range(m)]
+
+			if threads == 1 or len(tasks) == 1:
+				for t in tasks: agg(*t)
+			else:
+				with concurrent.futures.ThreadPoolExecutor(min(threads, len(tasks))) as ex:
+					for f in [ex.submit(agg, *t) for t in tasks]: f.result() # Raise the first error, if any
 
 		# Handle raggedness. If a column is ragged, numpy doesn't like it without specifying 'dtype=object'. However,
 		# it's not always easy for us to know what columns are ragged. So we do one of the following:
@@ -977,7 +1676,19 @@ class Table:
 			for k in misc.mkList(raggedCols):
 				v[k] = numpy.array(v[k], dtype=object)
 
-		res.join(Table(v)) # Join
+		# Aggregates over groups that are all null come back masked. Fill them with a value of the column's type and make
+		# the column nullable rather than letting numpy turn it into a float column.
+		nulls = {}
+		for k in v.keys():
+			m = [x is numpy.ma.masked for x in v[k]]
+			if True in m:
+				fill = next((x for x, isNull in zip(v[k], m) if not isNull), numpy.nan)
+				v[k] = [fill if isNull else x for x, isNull in zip(v[k], m)]
+				nulls[k] = m
+
+		vt = Table(v)
+		for k, m in nulls.items(): vt._setValid(k, ~numpy.array(m))
+		res.join(vt) # Join
 		res.key(ks.cols()) # Set key cols
 		return res
 
@@ -1000,6 +1711,48 @@ class Table:
 
 		c = right.cols() # Columns we're adding (or overwriting)
 		self.setCol(c, right.getCol(c)) # Join
+		for k in c:
+			if k in right._valid: self._valid[k] = right._valid[k].copy()
+
+	def equals(self, other:"Table", ordered:bool=False) -> bool:
+		"""
+		Checks equality of tables, optionally ignoring row order. The unordered comparison hashes each row, so it runs in
+		O(n log n) rather than comparing every row with every other.
+		@param other	{any}	Object to compare (though typically a Table).
+		@param ordered	{bool}	If true, this is the same as `==`. If false (default), the tables are equal if they have
+								the same rows (with multiplicity), in any order. See `__eq__` for all other conditions.
+		@return			{bool}	True if they're equal.
+		"""
+		if ordered: return self == other
+		if not self._sameSchema(other): return False
+
+		# Rows can only match if their hashes do, so first compare the sorted hashes.
+		sh = self._rowHash()
+		oh = other._rowHash()
+		si = numpy.argsort(sh, kind="stable")
+		oi = numpy.argsort(oh, kind="stable")
+		sh = sh[si]
+		if not (sh == oh[oi]).all(): return False
+
+		# Then confirm the values. Rows sorted by hash should line up, unless different rows share a hash.
+		a = self.getRow(si)
+		b = other.getRow(oi)
+		eq = numpy.ones(len(a), bool)
+		for c in a.cols(): eq &= a._colEqual(b, c, 0, len(a))
+		if eq.all(): return True
+
+		# Hash collisions: match up the rows of each colliding hash one by one.
+		for h in numpy.unique(sh[~eq]):
+			w = numpy.flatnonzero(sh == h)
+			left = [a.getRow([i]) for i in w]
+			right = [b.getRow([i]) for i in w]
+
+			for row in left:
+				j = misc.find(right, row)
+				if j == -1: return False
+				right.pop(j)
+
+		return True
 
 	#-------------------------------------------------------------------------------------------------------------------
 	# Private functions.
@@ -1039,7 +1792,7 @@ class Table:
 									- string[1]:	string literal.
 		@return			{dict}	Result of each sub-clause.
 		"""
-		return {k: self._resolveClauseOne(clause[k]) for k in clause.keys()}
+		return plan.compileClause(clause).run(self._clauseCol) # Compiled (and cached), see `plan`
 
 	def _resolveClauseOne(self, clause:list):
 		"""
@@ -1047,17 +1800,673 @@ class Table:
 		@param clause	{list}		See '_resolveClause'.
 		@return			{list|atom}	Column value, where an atom is scalar extended.
 		"""
-		typ = type(clause)
+		return self._resolveClause({"": clause})[""]
+
+	def _keyTable(self, clause:dict) -> "Table":
+		"""
+		Resolves a by clause into key columns. Masked values (from nullable columns) become nullable key columns, so that
+		nulls group together.
+		@param clause	{dict}	By clause (see `_resolveClause`).
+		@return			{Table}	Key columns, one row per row of self (atoms are scalar extended).
+		"""
+		vals = self._resolveClause(clause)
+		return Table._fromClauseVals({k: v if numpy.ndim(v) > 0 else [v]*len(self) for k, v in vals.items()})
+
+	def _whereIdx(self, clause:Union[str,list]) -> numpy.ndarray:
+		"""
+		Gets the rows satisfying a where clause (see `where`).
+		@param clause	{string|list|list[]}	Condition(s).
+		@return			{int[]}					Row numbers, ascending.
+		"""
+		clauses = [clause] if type(clause) == str or (type(clause) == list and len(clause) > 0 and callable(clause[0])) \
+			else clause
+		idx = None # Surviving rows, None for all
+
+		for c in clauses:
+			src = Table._clauseSrcCols([c])
+			self._chkCols(src)
+			rows = self._attrRows(c) # Can an attribute answer it?
+
+			if not rows is None:
+				idx = rows if idx is None else numpy.intersect1d(idx, rows, assume_unique=True)
+				if len(idx) == 0: break
+				continue
+
+			# Only evaluate on the rows that survived so far.
+			if idx is None:
+				sub = Table._wrap({k: self._dict[k] for k in src})
+				sub._valid = {k: self._valid[k] for k in src if k in self._valid}
+				n = len(self)
+			else:
+				sub = self.getRow(idx, src)
+				n = len(idx)
+
+			b = Table._clauseBools(sub._resolveClauseOne(c), n)
+			idx = numpy.flatnonzero(b) if idx is None else idx[b]
+			if len(idx) == 0: break # Nothing left to check
+
+		return numpy.arange(len(self)) if idx is None else idx
+
+	def _clauseBools(b, n:int) -> numpy.ndarray:
+		"""
+		Checks the result of a where condition, and turns it into a boolean per row. Conditions on nullable columns give
+		masked arrays, and null rows don't satisfy them, whatever the value underneath.
+		@param b	{bool[]|bool}	Result of the condition, possibly masked.
+		@param n	{int}			Rows it was evaluated on.
+		@return		{bool[]}		True for rows satisfying it.
+		"""
+		if b is numpy.ma.masked: b = False # Condition on a single null
+		b = numpy.ma.filled(b, False)
+		if b.ndim == 0: b = numpy.full(n, bool(b)) # Scalar extend
+		if b.dtype != bool: raise TableException("Where clause must give booleans, got {}".format(b.dtype))
+		if len(b) != n: raise TableException("Where clause length, expected={} got={}".format(n, len(b)))
+		return b
+
+	def _clauseSrcCols(clauses:list) -> list:
+		"""
+		Gets the columns agg/by/where clauses refer to.
+		@param clauses	{list}		List of clauses (see `_resolveClauseOne`).
+		@return			{string[]}	Column names, in order of first reference.
+		"""
+		return plan.compileClause(dict(enumerate(clauses))).cols
+
+	def _fromClauseVals(vals:dict) -> "Table":
+		"""
+		Builds a table from resolved clause values, scalar extending atoms. Masked arrays (from nullable columns) become
+		nullable columns.
+		@param vals	{dict}	Column name --> resolved value.
+		@return		{Table}	Table.
+		"""
+		n = [len(v) for v in vals.values() if numpy.ndim(v) > 0]
+		n = n[0] if len(n) > 0 else None # None if all atoms
+		d = {k: [v] if n is None else v if numpy.ndim(v) > 0 else [v]*n for k, v in vals.items()}
+		res = Table({k: numpy.ma.getdata(v) for k, v in d.items()})
+
+		for k, v in d.items():
+			if isinstance(v, numpy.ma.MaskedArray): res._setValid(k, ~numpy.ma.getmaskarray(v))
+
+		return res
+
+	def _diskAttrs(loc:str) -> dict:
+		"""
+		Gets the column attributes of a table on disk (see `save`).
+		@param loc	{string}	On-disk location of table (root).
+		@return		{dict}		Column --> attribute, empty if none were saved.
+		"""
+		if not os.path.isfile(loc + "/.a"): return {}
+		dotA = open(loc + "/.a", "r")
+		attrs = dotA.read().split("\n")
+		dotA.close()
+		return dict(zip(Table.diskCols(loc), attrs))
+
+	def _loadCol(loc:str, col:str, mmap:bool=False) -> tuple:
+		"""
+		Loads a single column of a table on disk.
+		@param loc	{string}		On-disk location of table (root).
+		@param col	{string}		Column.
+		@param mmap	{bool}			Memory-map the column rather than reading it, if its type allows (i.e. not object).
+		@return		{array,array}	Column and its packed validity bitmap (None if it isn't nullable).
+		"""
+		try:
+			f = loc + "/" + col + ".npy"
 
-		if typ == str: # Column name
-			return self.getCol(clause)
-		elif typ == list:
-			if len(clause) == 1 and type(clause[0]) == str: # String literal
-				return clause[0]
-			elif len(clause) > 0: # (fn, param_1, param_2, ...)
-				return clause[0](*[self._resolveClauseOne(c) for c in clause[1:]]) # Apply function with nesting
+			try:
+				x = numpy.load(f, mmap_mode="r" if mmap else None, allow_pickle=True)
+			except ValueError: # Python objects can't be memory-mapped
+				x = numpy.load(f, allow_pickle=True)
+
+			v = numpy.load(loc + "/" + col + ".v.npy") if os.path.isfile(loc + "/" + col + ".v.npy") else None
+		except Exception as ex:
+			raise TableException("Unable to read column '{}': {}".format(col, ex))
 
-		return clause # Anything else is assumed to be a literal
+		return x, v
+
+	def _ioRun(f, items:list, threads:int=None) -> list:
+		"""
+		Runs a read or write on each of many items (e.g. columns), concurrently. Everything is attempted even if some
+		fail, and failures are then raised together.
+		@param f		{fn(1)}		Function to run on each item.
+		@param items	{list}		Items.
+		@param threads	{int|None}	Number of threads, where 'None' means the class default (see `setIoThreads`).
+		@return			{list}		Result for each item, in order.
+		"""
+		if threads is None: threads = Table._ioThreads
+		if threads < 1: raise TableException("Thread count must be positive, threads={}".format(threads))
+
+		def run(x):
+			try:
+				return f(x), None
+			except Exception as ex:
+				return None, ex
+
+		if threads == 1 or len(items) < 2:
+			res = [run(x) for x in items]
+		else:
+			with concurrent.futures.ThreadPoolExecutor(min(threads, len(items))) as ex:
+				res = list(ex.map(run, items))
+
+		errs = [e for _, e in res if not e is None]
+		if len(errs) == 1: raise errs[0]
+		if len(errs) > 1: raise TableException(str.join("; ", [str(e) for e in errs]))
+		return [r for r, _ in res]
+
+	def _wrap(d:dict) -> "Table":
+		"""
+		Creates a table around existing arrays, without copying them (unlike `__init__`).
+		@param d	{dict}	Column name --> array. All arrays must have the same length.
+		@return		{Table}	Table sharing memory with `d`.
+		"""
+		t = Table()
+		t._dict = d
+		return t
+
+	def _view(self, lo:int, hi:int) -> "Table":
+		"""
+		Views a range of rows, without copying them (see `chunks`).
+		@param lo	{int}	First row.
+		@param hi	{int}	Row after the last.
+		@return		{Table}	Unkeyed table sharing memory with self.
+		"""
+		t = Table._wrap({c: x[lo:hi] for c, x in self._dict.items()})
+
+		for c in self._valid.keys():
+			if lo & 7 == 0: # Starts on a byte boundary, so we can view the bits as well
+				t._valid[c] = self._valid[c][lo >> 3:(hi + 7) >> 3]
+			else:
+				t._setValid(c, ~self._nullMaskRange(c, lo, hi))
+
+		return t
+
+	def _attrRows(self, clause) -> Union[numpy.ndarray,None]:
+		"""
+		Answers a where condition using column attributes, if possible (see `setAttr`).
+		@param clause	{string|list}	Condition (see `where`).
+		@return			{int[]|None}	Rows satisfying it, ascending, or None if attributes can't help.
+		"""
+		if type(clause) != list or len(clause) != 3: return None
+		op = Table._attrOps.get(clause[0]) if callable(clause[0]) else None
+		if op is None: return None
+		col, val = clause[1], clause[2]
+
+		if type(col) != str: # (value op column)
+			if op in ["within", "in"]: return None
+			col, val, op = val, col, Table._flipOps[op]
+
+		if type(col) != str or not col in self._attr or col in self._valid: return None
+		if type(val) == list and len(val) == 1 and type(val[0]) == str: val = val[0] # String literal
+		elif type(val) in [str, list]: return None # Column or nested clause
+		if op == "within" and numpy.shape(val) != (2,): return None
+		if op == "in" and not type(val) in [tuple, set, frozenset, numpy.ndarray]: return None
+
+		x = self._dict[col]
+		if x.ndim != 1: return None
+
+		try:
+			if op == "in": vals = list(dict.fromkeys(list(val)))
+
+			if self._attr[col] in ["g", "p"]:
+				if not op in ["==", "in"]: return None
+				ks = [Table._attrKey(x, v) for v in (vals if op == "in" else [val]) if v == v] # Nulls never match
+				if any(k is None for k in ks): return None # Can't be looked up exactly, scan instead
+				idx = self._attrIndex(col)
+				if idx is None: return None # Can't be indexed after all
+				none = numpy.arange(0)
+				rows = [idx.get(k, none) for k in ks]
+				if self._attr[col] == "p": rows = [numpy.arange(*r) if len(r) > 0 else r for r in rows] # Runs
+				res = numpy.concatenate([none] + rows)
+				return res if len(rows) == 1 else numpy.sort(res)
+
+			x = x[:Table._sortedLen(x)] # Nulls never satisfy comparisons
+			ss = lambda v, side: int(numpy.searchsorted(x, v, side=side))
+
+			if op == "in": return numpy.sort(numpy.concatenate([numpy.arange(0)] +
+				[numpy.arange(ss(v, "left"), ss(v, "right")) for v in vals]))
+			elif op == "==": lo, hi = ss(val, "left"), ss(val, "right")
+			elif op == "<": lo, hi = 0, ss(val, "left")
+			elif op == "<=": lo, hi = 0, ss(val, "right")
+			elif op == ">": lo, hi = ss(val, "right"), len(x)
+			elif op == ">=": lo, hi = ss(val, "left"), len(x)
+			else: lo, hi = ss(val[0], "left"), ss(val[1], "right")
+		except TypeError: # Let the comparison itself complain
+			return None
+
+		return numpy.arange(lo, max(lo, hi))
+
+	def _attrKey(x:numpy.ndarray, v):
+		"""
+		Casts a value to look up in the index of a grouped or parted column to the type of the column, so that it hashes
+		like the values filed there (e.g. a minute datetime looked up in a day column).
+		@param x	{array}		Column.
+		@param v	{any}		Value.
+		@return		{any|None}	Value as stored in the index, or None if it can't be cast without changing it (the caller
+								then scans the column instead).
+		"""
+		if x.dtype.kind == "O": return v
+
+		try:
+			a = numpy.asarray(v)
+			if a.ndim != 0: return None
+			k = a.astype(x.dtype)
+			return k[()] if bool(k == a) else None
+		except (TypeError, ValueError, OverflowError):
+			return None
+
+	def _indexRows(col:str, x:numpy.ndarray, idx:dict, offset:int) -> dict:
+		"""
+		Adds rows to the index of a grouped column (see `setAttr`).
+		@param col		{string}	Column name (for errors).
+		@param x		{array}		Values of the rows to add.
+		@param idx		{dict}		Index to add to (value --> int64 array of rows, ascending), in order of first
+									appearance.
+		@param offset	{int}		Row number of the first value.
+		@return			{dict}		Index, updated in place.
+		"""
+		if x.ndim != 1: raise TableException("Column '{}' can't be grouped".format(col))
+		first, grp = Table._wrap({col: x})._groupIndex()
+		order = numpy.argsort(grp, kind="stable") + offset
+		bounds = numpy.concatenate([[0], numpy.cumsum(numpy.bincount(grp, minlength=len(first)))])
+
+		try:
+			for g, v in enumerate(x[first]):
+				if v != v: v = Table._nullKey # File all nulls together
+				rows = order[bounds[g]:bounds[g+1]]
+				idx[v] = numpy.concatenate([idx[v], rows]) if v in idx else rows
+		except (TypeError, ValueError):
+			raise TableException("Column '{}' can't be grouped".format(col))
+
+		return idx
+
+	def _partRows(col:str, x:numpy.ndarray, idx:dict, offset:int) -> dict:
+		"""
+		Adds rows to the index of a parted column (see `setAttr`).
+		@param col		{string}	Column name (for errors).
+		@param x		{array}		Values of the rows to add.
+		@param idx		{dict}		Index to add to (value --> [start, end) of its run), in order of the runs.
+		@param offset	{int}		Row number of the first value.
+		@return			{dict}		Index, updated in place (unless the rows break the runs, in which case we raise).
+		"""
+		if x.ndim != 1: raise TableException("Column '{}' can't be parted".format(col))
+		n = null.isNullArray(x) if x.dtype.kind in "fcmM" else None
+		diff = x[1:] != x[:-1]
+		if not n is None: diff &= ~(n[1:] & n[:-1]) # Nulls are all the same
+		starts = numpy.concatenate([[0], numpy.flatnonzero(diff) + 1, [len(x)]]) if len(x) > 0 else numpy.zeros(1, int)
+		last = next(reversed(idx)) if len(idx) > 0 else None # Run the new rows may continue
+		new = {}
+
+		try:
+			for i in range(len(starts) - 1):
+				v = x[starts[i]]
+				if v != v: v = Table._nullKey
+				lo, hi = int(starts[i]) + offset, int(starts[i+1]) + offset
+
+				if i == 0 and v == last and idx[v][1] == lo:
+					new[v] = [idx[v][0], hi] # Carries on
+				elif v in idx or v in new:
+					raise TableException("Column '{}' is not parted".format(col))
+				else:
+					new[v] = [lo, hi]
+		except (TypeError, ValueError):
+			raise TableException("Column '{}' can't be parted".format(col))
+
+		idx.update(new)
+		return idx
+
+	def _attrIndex(self, col:str, n:int=None) -> Union[dict,None]:
+		"""
+		Gets the index of a grouped or parted column, building it if it hasn't been yet (see `sort`). Columns that turn
+		out not to be indexable (e.g. holding lists) lose their attribute.
+		@param col	{string}	Column name.
+		@param n	{int}		Rows to build the index over, if it isn't built yet -- optional, default is all.
+		@return		{dict|None}	Index, or None if the column can't be indexed.
+		"""
+		if not col in self._attrIdx:
+			f = Table._indexRows if self._attr[col] == "g" else Table._partRows
+
+			try:
+				self._attrIdx[col] = f(col, self._dict[col][:n], {}, 0)
+			except TableException:
+				self._dropAttr(col)
+				return None
+
+		return self._attrIdx[col]
+
+	def _dropAttr(self, col:str):
+		"""
+		Drops the attribute of a column (and its index), if any.
+		@param col	{string}	Column name.
+		"""
+		self._attr.pop(col, None)
+		self._attrIdx.pop(col, None)
+
+	def _sortIdx(self, cc:list, desc:Union[bool,list]) -> numpy.ndarray:
+		"""
+		Gets the permutation that sorts the table (see `sort`).
+		@param cc	{string[]}		Columns to sort on.
+		@param desc	{bool|bool[]}	Descending, for all columns or each.
+		@return		{int[]}			Row numbers, in sorted order.
+		"""
+		self._chkCols(cc)
+		dd = desc if type(desc) == list else [desc]*len(cc)
+		if len(dd) != len(cc): raise TableException("Sort direction mismatch, cols={} desc={}".format(len(cc), len(dd)))
+		if len(cc) == 0: return numpy.arange(len(self))
+
+		if len(cc) == 1 and not dd[0] and not cc[0] in self._valid:
+			if self._attr.get(cc[0]) == "s": return numpy.arange(len(self)) # Nothing to do
+			return numpy.argsort(self._dict[cc[0]], kind="stable")
+
+		# Descending columns sort on their negated ranks, so that one stable lexsort does it all (numpy sorts on the
+		# last key first, hence the reversal). Nullable columns sort on their null masks first, nulls being the largest.
+		keys = []
+		for c, d in zip(cc, dd):
+			if c in self._valid: keys.append(-self.nullMask(c).astype(numpy.int8) if d else self.nullMask(c))
+			keys.append(-Table._rank(self._dict[c]) if d else self._dict[c])
+
+		return numpy.lexsort(keys[::-1])
+
+	def _rank(x:numpy.ndarray) -> numpy.ndarray:
+		"""
+		Ranks the values of a column, equal values getting equal ranks and nulls the highest.
+		@param x	{array}	Column.
+		@return		{int[]}	Dense rank of each value.
+		"""
+		_, r = numpy.unique(x, return_inverse=True)
+		r = r.reshape(-1)
+
+		if x.dtype.kind in "fcmM": # NaN (or NaT) isn't equal to itself, but sorts last
+			m = null.isNullArray(x)
+			if m.any(): r[m] = r.max()
+
+		return r
+
+	def _isSorted(x:numpy.ndarray) -> bool:
+		"""
+		Checks if a column is sorted in ascending order, float and datetime nulls (which numpy sorts last) being allowed
+		at the end.
+		@param x	{array}	Column.
+		@return		{bool}	True if sorted.
+		"""
+		if x.ndim != 1: return False
+		if x.dtype.kind == "O": return all(x[i] <= x[i+1] for i in range(len(x) - 1))
+		n = Table._sortedLen(x)
+		if x.dtype.kind in "fcmM" and (null.isNullArray(x[:n]).any() or not null.isNullArray(x[n:]).all()):
+			return False # Nulls before the end
+		return bool((x[:max(n - 1, 0)] <= x[1:n]).all())
+
+	def _sortedLen(x:numpy.ndarray) -> int:
+		"""
+		Gets the length of a sorted column, not counting float/datetime nulls at its end, in O(log n).
+		@param x	{array}	Sorted column.
+		@return		{int}	Number of leading non-nulls.
+		"""
+		if x.dtype.kind in "fc": return bisect.bisect_left(x, True, key=numpy.isnan)
+		if x.dtype.kind in "mM": return bisect.bisect_left(x, True, key=numpy.isnat)
+		return len(x)
+
+	def _aggGroups(srt:Union["Table",None], bounds:numpy.ndarray, q:plan.Plan, gs:range) -> list:
+		"""
+		Aggregates groups for `by`.
+		@param srt		{Table|None}	Columns needed by the aggregation, with the rows of each group next to each other
+										(None if no columns are needed).
+		@param bounds	{int[]}			Start of each group in 'srt', followed by the length of 'srt'.
+		@param q		{Plan}			Compiled aggregation clause.
+		@param gs		{range}			Groups to aggregate.
+		@return			{dict[]}		Target --> value, for each group.
+		"""
+		res = []
+
+		for g in gs:
+			sub = srt._view(bounds[g], bounds[g+1]) if not srt is None else None # Sub-table (private copy)
+			res.append(q.run(lambda c: sub._clauseCol(c, False))) # Resolve clause on sub-table
+
+		return res
+
+	def _byInit(srt:Union["Table",None], bounds:numpy.ndarray, p:plan.Plan):
+		"""
+		Sets up a `by` worker process.
+		@param srt		{Table|None}	See `_aggGroups`.
+		@param bounds	{int[]}			Ditto.
+		@param p		{Plan}			Ditto.
+		"""
+		Table._byJob = (srt, bounds, p)
+
+	def _byWorker(gs:range) -> list:
+		"""
+		Aggregates groups in a `by` worker process, using the work it was set up with (see `_byInit`).
+		@param gs	{range}		Groups to aggregate.
+		@return		{dict[]}	See `_aggGroups`.
+		"""
+		return Table._aggGroups(*Table._byJob, gs)
+
+	def _groupIndex(self) -> tuple:
+		"""
+		Groups the rows of the table by their values, nulls being equal to each other (whatever value sits underneath
+		those of nullable columns).
+		@return	{int[],int[]}	Index of the first row of each group, in order of first appearance, and the group of each
+								row.
+		"""
+		code = numpy.zeros(len(self), dtype=numpy.int64)
+
+		for c in self.cols(): # Combine column codes, keeping them small so they don't overflow
+			x = Table._factorize(self._dict[c])
+			if c in self._valid: x = numpy.where(self._getValid(c), x, x.max(initial=-1) + 1) # Nulls get their own code
+			_, code = numpy.unique(code*(x.max(initial=0) + 1) + x, return_inverse=True)
+
+		_, first, grp = numpy.unique(code, return_index=True, return_inverse=True)
+		o = numpy.argsort(first)
+		rank = numpy.empty(len(o), dtype=numpy.int64)
+		rank[o] = numpy.arange(len(o))
+		return first[o], rank[grp].reshape(-1)
+
+	def _factorize(x:numpy.ndarray) -> numpy.ndarray:
+		"""
+		Codes the values of a column, equal values getting equal codes.
+		@param x	{array}	Column.
+		@return		{int[]}	Non-negative code of each value.
+		"""
+		if x.dtype.kind == "O": # Python objects may not be comparable, so hash them instead
+			d = {}
+
+			def code(o):
+				try:
+					return d.setdefault(o, len(d))
+				except TypeError:
+					return d.setdefault((Table, Table._hashObj(o)), len(d)) # Unhashable, e.g. arrays
+
+			return numpy.fromiter((code(o) for o in x), dtype=numpy.int64, count=len(x))
+
+		if x.ndim > 1:
+			_, res = numpy.unique(x, axis=0, return_inverse=True)
+		else:
+			_, res = numpy.unique(x, return_inverse=True)
+
+		res = res.reshape(-1)
+
+		if x.dtype.kind in "fcmM": # NaN (or NaT) isn't equal to itself, so won't have been grouped together
+			m = null.isNullArray(x) if x.ndim == 1 else numpy.zeros(len(x), dtype=bool)
+			if m.any(): res[m] = res[m][0]
+
+		return res
+
+	def _clauseCol(self, col:str, copy:bool=True) -> numpy.ndarray:
+		"""
+		Gets a column to feed to a clause. Nullable columns come out as masked arrays, so that numpy reductions (e.g.
+		`numpy.sum`, `numpy.mean`) skip nulls.
+		@param col	{string}	Column name.
+		@param copy	{bool}		Copy the column (default), or hand over the column itself.
+		@return		{array}		Column.
+		"""
+		x = self.getCol(col) if copy else self._dict[col]
+		if col in self._valid: return numpy.ma.MaskedArray(x, mask=self.nullMask(col))
+		return x
+
+	def _getValid(self, col:str) -> numpy.ndarray:
+		"""
+		Unpacks the validity bitmap of a nullable column.
+		@param col	{string}	Column name.
+		@return		{bool[]}	True where the column holds a value, false where it's null.
+		"""
+		return numpy.unpackbits(self._valid[col], count=len(self._dict[col])).astype(bool)
+
+	def _setValid(self, col:str, valid:numpy.ndarray):
+		"""
+		Packs and sets the validity bitmap of a column, making it nullable if it wasn't already.
+		@param col		{string}	Column name.
+		@param valid	{bool[]}	True where the column holds a value, false where it's null.
+		"""
+		self._valid[col] = numpy.packbits(numpy.asarray(valid, bool))
+
+	def _isValidAt(self, col:str, row:int) -> bool:
+		"""
+		Reads a single validity bit without unpacking the whole bitmap.
+		@param col	{string}	Column name (must be nullable).
+		@param row	{int}		Row, negative counts from the end.
+		@return		{bool}		True if the row holds a value.
+		"""
+		if row < 0: row += len(self._dict[col])
+		return bool((self._valid[col][row >> 3] >> (7 - (row & 7))) & 1)
+
+	def _appendOne(self, col:str, val) -> numpy.ndarray:
+		"""
+		Appends a single value to a column, handling its validity bitmap if it has one. `None` appends a null.
+		@param col	{string}	Column name.
+		@param val	{any}		Value to append.
+		@return		{array}		New column (the bitmap is updated in place).
+		"""
+		if col in self._valid:
+			self._setValid(col, numpy.append(self._getValid(col), not val is None))
+			if val is None: val = null.getNull(self._dict[col].dtype.name) # Placeholder, masked by the bitmap
+
+		return numpy.append(self._dict[col], val)
+
+	def _sameSchema(self, other:"Table") -> bool:
+		"""
+		Checks that another table has the same schema as this one (conditions 0 to 4 of `__eq__`).
+		@param other	{any}	Object to compare (though typically a Table).
+		@return			{bool}	True if the schemas match.
+		"""
+		if not isinstance(other, Table): return False
+		if self.cols() != other.cols(): return False
+		if self.keyCols() != other.keyCols(): return False
+
+		for c in self.cols():
+			sc = self._dict[c]
+			oc = other._dict[c]
+			if sc.shape != oc.shape: return False
+
+			# Compare type. In general, this is easy, except for strings when the width of the strings is significant.
+			if sc.dtype != oc.dtype:
+				if not sc.dtype.str.startswith("<U") and oc.dtype.str.startswith("<U"): # If both strings, look past it
+					return False
+
+		return True
+
+	def _colEqual(self, other:"Table", col:str, lo:int, hi:int) -> numpy.ndarray:
+		"""
+		Compares a range of rows of a column with another table's, treating nulls as equal to each other.
+		@param other	{Table}		Table with the same schema.
+		@param col		{string}	Column to compare.
+		@param lo		{int}		First row.
+		@param hi		{int}		Row after the last.
+		@return			{bool[]}	True where the rows are equal.
+		"""
+		vals = self._dict[col][lo:hi] == other._dict[col][lo:hi]
+		if type(vals) != numpy.ndarray: raise TableException("Cannot determine equality (nested column)?") ##~
+		nullable = col in self._valid or col in other._valid # Values under null bits are meaningless
+		if vals.all() and not nullable: return vals # Easy case, but because of "nan", inequality isn't good enough
+
+		# In cases where we have an inequality, we also check for null-ness, since "nan == nan" returns false.
+		# Entries are equal if they're both null, or both not null and match.
+		sn = self._nullMaskRange(col, lo, hi)
+		on = other._nullMaskRange(col, lo, hi)
+		return (sn == on) & (vals | sn)
+
+	def _nullMaskRange(self, col:str, lo:int, hi:int) -> numpy.ndarray:
+		"""
+		Gets the null mask of a range of rows of a column (see `nullMask`), only unpacking the bits we need.
+		@param col	{string}	Column.
+		@param lo	{int}		First row.
+		@param hi	{int}		Row after the last.
+		@return		{bool[]}	True where the column is null.
+		"""
+		if not col in self._valid: return null.isNullArray(self._dict[col][lo:hi])
+		bits = numpy.unpackbits(self._valid[col][lo >> 3:(hi + 7) >> 3]) # Whole bytes covering the range
+		return ~bits[lo & 7:(lo & 7) + hi - lo].astype(bool)
+
+	def _jointCodes(self, other:"Table", cols:list) -> tuple:
+		"""
+		Codes the rows of two tables together, so that rows with equal values in the given columns get equal codes.
+		Nulls are equal to each other, whatever the value underneath, and columns whose types can't be compared never
+		match.
+		@param other	{Table}			Other table.
+		@param cols		{string[]}		Columns, in both tables.
+		@return			{int[],int[]}	Codes of the rows of self and of other.
+		"""
+		n = len(self)
+		codes = []
+
+		for c in cols:
+			x, y = self._dict[c], other._dict[c]
+
+			if x.shape[1:] == y.shape[1:] and (misc._comparable(x, y) or "O" in [x.dtype.kind, y.dtype.kind]):
+				code = Table._factorize(numpy.concatenate([x, y]))
+			else: # Never equal
+				code = numpy.concatenate([Table._factorize(x), n + Table._factorize(y)])
+
+			m = numpy.concatenate([self._nullMaskRange(c, 0, n), other._nullMaskRange(c, 0, len(other))])
+			if m.ndim > 1: m = m.reshape(len(m), -1).any(axis=1)
+			codes.append(numpy.where(m, 0, code + 1)) # Nulls get 0
+
+		if len(codes) == 0: code = numpy.zeros(n + len(other), dtype=numpy.int64)
+		else: code = codes[0] if len(codes) == 1 else Table._factorize(numpy.stack(codes, axis=1))
+		return code[:n], code[n:]
+
+	def _rowHash(self) -> numpy.ndarray:
+		"""
+		Hashes each row of the table. Nulls hash the same regardless of the value underneath, and strings hash the same
+		regardless of the width of their column, so rows that are equal (per `__eq__`) hash the same.
+		@return	{uint64[]}	Row hashes.
+		"""
+		n = len(self)
+		res = numpy.zeros(n, numpy.uint64)
+		if n == 0: return res
+		p = numpy.uint64(1000003) # Multiplier used to fold hashes together (overflow wraps, which is what we want)
+
+		with numpy.errstate(over="ignore"):
+			for c in self.cols():
+				x = self._dict[c]
+				kind = x.dtype.kind
+
+				if kind == "U": # Fold code points, skipping the trailing padding
+					h = numpy.zeros(n, numpy.uint64)
+					cp = x.reshape(n, -1).view(numpy.uint32).reshape(n, -1).astype(numpy.uint64)
+					for j in range(cp.shape[1]): h = numpy.where(cp[:, j] != 0, h*p + cp[:, j], h)
+				elif kind == "O": # No choice but to hash each object
+					h = numpy.array([Table._hashObj(v) for v in x], numpy.int64).view(numpy.uint64)
+				else: # Fixed-size types, hash the bits
+					if kind in "fc": x = x + 0 # -0.0 == 0.0, so make sure their bits match too
+					b = numpy.ascontiguousarray(x).reshape(n, -1)
+					b = b.view("u{}".format(b.dtype.itemsize)).astype(numpy.uint64) if b.dtype.itemsize <= 8 else \
+						b.view(numpy.uint64)
+					h = numpy.zeros(n, numpy.uint64)
+					for j in range(b.shape[1]): h = h*p + b[:, j]
+
+				h[self._nullMaskRange(c, 0, n).reshape(n, -1).any(axis=1)] = 0 # All nulls look alike
+				res = res*p + h
+
+		return res
+
+	def _hashObj(obj) -> int:
+		"""
+		Hashes an object, including unhashable ones (e.g. nested arrays).
+		@param obj	{any}	Object.
+		@return		{int}	Hash.
+		"""
+		if isinstance(obj, numpy.ndarray): return hash((obj.dtype.str, obj.shape, obj.tobytes()))
+
+		try:
+			return hash(obj)
+		except TypeError:
+			return hash(repr(obj))
 
 	def _getIdxType(idx) -> "type":
 		"""
@@ -1079,6 +2488,20 @@ class Table:
 		@param col	{string}						Column to set.
 		@param val	{any}							Value(s) to set.
 		"""
+		self._dropAttr(col) # New values may break it
+
+		# Nullable columns take `None` as null and anything else as valid.
+		if col in self._valid:
+			valid = self._getValid(col)
+
+			if val is None:
+				valid[row] = False
+				self._setValid(col, valid)
+				return
+
+			valid[row] = True
+			self._setValid(col, valid)
+
 		# If we're inserting into a string column, expand if required.
 		typ = str(self.getCol(col).dtype)
 
@@ -1116,7 +2539,7 @@ class Table:
 				else:
 					raise TableException("Unknown row type") # Shouldn't really happy but just to cover our bases
 
-				self.setCol(col, numpy.array(newCol).astype(str)) # Re-array-ify
+				self._dict[col] = numpy.array(newCol).astype(str) # Re-array-ify (keeping any validity bitmap)
 				return
 
 		self._dict[col][row] = val
@@ -1130,6 +2553,37 @@ class Table:
 										key in the key "vector" k.
 		"""
 		if not self._isKeyed: raise TableException("Not keyed") # Get the easy case out of the way
+		kc = self._keys[0]
+
+		if len(self._keys) == 1 and self._attr.get(kc) == "s" and not kc in self._valid: # Binary search
+			isSingle, get, n = Table._keyShape(key, 1)
+			x = self._dict[kc]
+			k = numpy.array([get(key, i, 0) for i in range(n)])
+
+			try:
+				i = numpy.searchsorted(x, k)
+				hit = x[numpy.minimum(i, len(x) - 1)] == k if len(x) > 0 else numpy.zeros(n, bool)
+				idx = numpy.where(hit, i, -1).tolist()
+				return (idx[0], get) if isSingle else (idx, get)
+			except TypeError: # Not comparable, fall back to the slow path (where nothing matches)
+				pass
+
+		rows = self._attrIndex(kc) if len(self._keys) == 1 and self._attr.get(kc) in ["g", "p"] and \
+			not kc in self._valid else None
+
+		if not rows is None: # Index lookup
+			isSingle, get, n = Table._keyShape(key, 1)
+
+			try:
+				ks = [get(key, i, 0) for i in range(n)]
+				ks = [Table._attrKey(self._dict[kc], k) if k == k else Table._nullKey for k in ks] # Nulls miss
+
+				if not any(k is None for k in ks): # Otherwise not exactly castable, fall back to the slow path
+					idx = [int(rows[k][0]) if k in rows and k is not Table._nullKey else -1 for k in ks]
+					return (idx[0], get) if isSingle else (idx, get)
+			except (TypeError, ValueError): # Unhashable, fall back to the slow path
+				pass
+
 		masks, isSingle, get = self._getKeyMask(key, self._keys)
 		idx = [list(mask).index(True) if True in mask else -1 for mask in masks]
 		if isSingle: return idx[0], get
@@ -1146,6 +2600,45 @@ class Table:
 																			(k, i, j) and returns the j-th component of
 																			i-th key in the key "vector" k.
 		"""
+		isSingle, get, n = Table._keyShape(key, len(keyCols))
+
+		# Do the key look up. We proceed by going left to right, then up to down through the requested keys.
+		# Whenever a key column matches, we store the information in case we need to look up the same value again.
+		nKeys = len(keyCols)
+		rows = range(n)
+		cols = range(nKeys)
+		mem = {c: {} for c in cols} # Used to store lookups we've already done (map of column (index) --> value --> boolean mask of matches)
+		keyColVals = self.getCol(keyCols) # Key cols [key1, key2, ...] (i.e. list of arrays)
+		valid = [~self.nullMask(c) if c in self._valid else True for c in keyCols] # Null keys match nothing
+		length = len(self) # Length of the table
+		masks = [] # Store matrix of masks
+
+		for i in rows:
+			mask = numpy.array([True]*length) # Mask of rows that match this key
+
+			for j in cols:
+				v = get(key, i, j) # Value to look up
+
+				if not v in mem[j].keys(): # If we haven't seen this before
+					mem[j][v] = (keyColVals[j] == v) & valid[j] # Remember it from here on out
+
+				mask *= mem[j][v] # Whittle down the mask
+
+			masks.append(mask)
+
+		return masks, isSingle, get
+
+	def _keyShape(key, nKeys:int) -> tuple:
+		"""
+		Works out the shape of key(s) to look up.
+		@param key		{scalar|list|tuple|array|list[]|tuple[]|array[]}	Key(s) to lookup (see `_getKeyMask`).
+		@param nKeys	{int}												Number of key columns.
+		@return			{bool,fn(3),int}									A boolean indicating if the key is a single
+																			scalar value, a dyadic function that takes
+																			(k, i, j) and returns the j-th component of
+																			i-th key in the key "vector" k, and the
+																			number of keys.
+		"""
 		# We proceed based on the shape of `key`. There are 3 cases:
 		#	a) ()		Single element lookup.
 		#	b) (x)		Either a list/array or a tuple. If it's the former, it's multiple keys
@@ -1164,7 +2657,6 @@ class Table:
 		#	- n			{int}		The number of keys to look up.
 		shape = numpy.shape(key) # Get shape
 		length = len(shape) # Dimension of shape
-		nKeys = len(keyCols) # Columns considered keys in the table
 		dimErr = "Key dimension mismatch" # Don't want to have to use it, but we will if we have to
 		typErr = "Unrecognized key type" # Ditto
 		getTupleList = lambda tupleList, row, col: tupleList[row][col] # For case 2
@@ -1225,29 +2717,7 @@ class Table:
 		else:
 			raise TableException("Unrecognized key shape")
 
-		# Do the key look up. We proceed by going left to right, then up to down through the requested keys.
-		# Whenever a key column matches, we store the information in case we need to look up the same value again.
-		rows = range(n)
-		cols = range(nKeys)
-		mem = {c: {} for c in cols} # Used to store lookups we've already done (map of column (index) --> value --> boolean mask of matches)
-		keyColVals = self.getCol(keyCols) # Key cols [key1, key2, ...] (i.e. list of arrays)
-		length = len(self) # Length of the table
-		masks = [] # Store matrix of masks
-
-		for i in rows:
-			mask = numpy.array([True]*length) # Mask of rows that match this key
-
-			for j in cols:
-				v = get(key, i, j) # Value to look up
-
-				if not v in mem[j].keys(): # If we haven't seen this before
-					mem[j][v] = keyColVals[j] == v # Remember it from here on out
-
-				mask *= mem[j][v] # Whittle down the mask
-
-			masks.append(mask)
-
-		return masks, isSingle, get
+		return isSingle, get, n
 
 	def _getType(s:str) -> "type":
 		"""
@@ -1438,51 +2908,25 @@ class Table:
 		@param other	{any}	Object to compare (though typically a Table).
 		@return			{bool}	True if they're equal.
 		"""
-		if not isinstance(other, Table): return False
-		if self.cols() != other.cols(): return False
-		if self.keyCols() != other.keyCols(): return False
+		if not self._sameSchema(other): return False
+		n = len(self)
+		k = Table._eqChunk
 
+		# Compare chunk by chunk so that big tables that differ early don't get compared in full.
 		for c in self.cols():
-			sc = self.getCol(c)
-			oc = other.getCol(c)
-			if sc.shape != oc.shape: return False
-
-			# Compare type. In general, this is easy, except for strings when the width of the strings is significant.
-			if sc.dtype != oc.dtype:
-				if not sc.dtype.str.startswith("<U") and oc.dtype.str.startswith("<U"): # If both strings, look past it
-					return False
-
-			vals = sc == oc
-			if type(vals) != numpy.ndarray: raise TableException("Cannot determine equality (nested column)?") ##~
-			if vals.all(): continue # Easy case, but because of "nan", inequality isn't necessarily good enough
-
-			# In cases where we have an inequality, we also check for null-ness, since "nan == nan" returns false.
-			# We'll return false on the first instance where both entries are not null.
-			for i in range(len(sc)):
-				if not vals[i]:
-					if not (null.isNull(sc[i]) and null.isNull(oc[i])): return False
+			for lo in range(0, max(n, 1), k):
+				if not self._colEqual(other, c, lo, min(lo + k, n)).all(): return False
 
 		return True # If we made it all the way through, they're equal
 
-	def __iter__(self) -> "Table":
+	def __iter__(self) -> Iterator[dict]:
 		"""
-		Sets up iteration.
-		@return	{Table}	Self.
-		"""
-		self._index = 0
-		return self
-
-	def __next__(self) -> dict:
+		Iterates over rows. Each call gets its own iterator, so iterating over the same table in several places at once
+		is fine. See `rows` and `itercols` for cheaper ways to iterate.
+		@return	{iterator}	Rows, as dictionaries.
 		"""
-		Gets next row.
-		@return	{dict}	Next row.
-		"""
-		if self._index == len(self):
-			raise StopIteration
-
-		i = self._index
-		self._index += 1
-		return self.getRow(i)
+		for i in range(len(self)):
+			yield self.getRow(i)
 
 
 class TableException(Exception):
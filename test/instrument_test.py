@@ -0,0 +1,73 @@
+########################################################################################################################
+# Instrumentation tests.
+########################################################################################################################
+
+from unittest import TestCase
+from src import instrument
+from src.instrument import Table
+
+class InstrumentTest(TestCase):
+	def setUp(self):
+		self.t = Table({"sym": ["a", "b", "a", "c"], "qty": [1, 2, 3, 4]})
+
+	def tearDown(self):
+		instrument.disable()
+		instrument.reset()
+
+	def test_enable_disable(self):
+		og = Table.by
+		instrument.enable()
+		self.assertTrue(instrument.enabled())
+		self.assertNotEqual(Table.by, og)
+		self.assertEqual(Table.by.__name__, "by")
+		self.assertEqual(Table.by.__doc__, og.__doc__)
+
+		# Enabling again doesn't wrap twice.
+		wrapped = Table.by
+		instrument.enable()
+		self.assertEqual(Table.by, wrapped)
+
+		instrument.disable()
+		self.assertFalse(instrument.enabled())
+		self.assertEqual(Table.by, og)
+
+	def test_stats(self):
+		# Nothing recorded while disabled.
+		self.t.by("sym", {"q": [sum, "qty"]})
+		self.assertEqual(len(instrument.stats()), 0)
+
+		instrument.enable()
+		self.t.by("sym", {"q": [sum, "qty"]})
+		self.t.by("sym", {"q": [sum, "qty"]})
+		self.t.append(Table({"sym": ["d"], "qty": [5]}))
+		Table.raze([self.t, self.t])
+		instrument.disable()
+
+		s = instrument.stats()
+		fns = list(s.getCol("fn"))
+		rows = {f: s.getRow(fns.index(f)) for f in ["by", "append", "raze"]}
+		self.assertEqual(rows["by"]["calls"], 2)
+		self.assertEqual(rows["by"]["rowsIn"], 8) # The table itself
+		self.assertEqual(rows["by"]["rowsOut"], 6)
+		self.assertGreaterEqual(rows["by"]["total"], rows["by"]["max"])
+		self.assertEqual(rows["by"]["mean"], rows["by"]["total"]/2)
+		self.assertEqual(rows["append"]["rowsIn"], 5) # The table itself and the appended one
+		self.assertEqual(rows["append"]["rowsOut"], 5) # In place
+		self.assertEqual(rows["raze"]["rowsIn"], 10)
+		self.assertEqual(rows["raze"]["rowsOut"], 10)
+		self.assertEqual(list(s.getCol("total")), sorted(s.getCol("total"), reverse=True))
+
+		instrument.reset()
+		self.assertEqual(len(instrument.stats()), 0)
+
+	def test_slow(self):
+		msgs = []
+		instrument.enable(slow=0, log=msgs.append)
+		self.t.copy()
+		self.assertTrue(any(m.startswith("Slow call: Table.copy took") and m.endswith("rows in=4 out=4") for m in msgs))
+
+		# Not slow enough.
+		msgs.clear()
+		instrument.enable(slow=3600, log=msgs.append)
+		self.t.copy()
+		self.assertEqual(msgs, [])
@@ -4,7 +4,7 @@
 
 import math, numpy
 from unittest import TestCase
-from src import mock, misc
+from src import mock, misc, null
 
 class MiscTest(TestCase):
 	def tearDown(self):
@@ -80,13 +80,74 @@ class MiscTest(TestCase):
 		self.assertEqual(misc.asof([1, 2, 3, 4, 5], 100), 4) # Beyond
 		self.assertEqual(misc.asof([1, 10, 20, 40, 50, 60 , 70], 59), 4) # General
 		self.assertEqual(misc.asof([1, 10, 20, 40, 50, 60 , 70], 60), 5) # General -- exact
-		self.assertEqual(misc.asof([1, 2, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 10], 3), 2) # Multi
+		self.assertEqual(misc.asof([1, 2, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 10], 3), 15) # Multi -- last
+		self.assertEqual(misc.asof([3, 3], 3), 1) # Multi -- all
+
+		# Many at once.
+		x = [1, 10, 20, 40, 50, 60 , 70]
+		y = [0, 1, 59, 60, 100, 1, 5]
+		act = misc.asof(x, y)
+		self.assertEqual(type(act), numpy.ndarray)
+		self.assertEqual(list(act), [misc.asof(x, v) for v in y])
+		self.assertEqual(list(misc.asof([], numpy.array([1, 2]))), [-1, -1]) # Empty
+		self.assertEqual(list(misc.asof(numpy.array(["a", "e", "p"]), ["b", "a", "z", "0"])), [0, 0, 2, -1]) # Strings
+
+	def test_bin(self):
+		self.assertEqual(list(misc.bin([5, 0, 12.5, 10, 99, -1], [0, 10, 20])), [0, 0, 1, 1, 2, -1])
+		self.assertEqual(list(misc.bin(numpy.array([], dtype=int), [0, 10])), [])
+		self.assertEqual(list(misc.bin(numpy.array(["2021-01-05", "2021-02-01"]).astype(numpy.datetime64),
+			numpy.array(["2021-01-01", "2021-02-01"]).astype(numpy.datetime64))), [0, 1])
 
 	def test_where(self):
 		self.assertEqual(misc.where([True, True, True]), [0, 1, 2]) # All true
 		self.assertEqual(misc.where([False, False]), []) # All true
 		self.assertEqual(misc.where([False, True, True, False, True]), [1, 2, 4]) # Mix
 		self.assertEqual(misc.where([]), []) # Empty
+		self.assertEqual(misc.where((0, 2, None, "x")), [1, 3]) # Truthy values
+		act = misc.where(numpy.array([False, True, True, False, True])) # Array, still gives a list
+		self.assertEqual(act, [1, 2, 4])
+		self.assertEqual(type(act), list)
+		self.assertEqual(misc.where(numpy.array([True, False])) + misc.where(numpy.array([True])), [0, 0]) # Concatenates
+
+	def test_find(self):
+		for x in [[1, 2, 3, 2], numpy.array([1, 2, 3, 2]), numpy.array([1.0, 2.0, 3.0, 2.0])]:
+			self.assertEqual(misc.find(x, 2), 1) # First
+			self.assertEqual(misc.find(x, 2, True), 3) # Last
+			self.assertEqual(misc.find(x, 1, True), 0)
+			self.assertEqual(misc.find(x, 5), -1) # Missing
+			self.assertEqual(misc.find(x, 5, True), -1)
+
+		self.assertEqual(misc.find(numpy.array(["a", "b", "a"]), "a", True), 2) # Strings
+		self.assertEqual(misc.find(numpy.array([1.0, numpy.nan]), numpy.nan), -1) # NaN isn't equal to itself
+		self.assertEqual(misc.find(numpy.array([], dtype=int), 1), -1) # Empty
+		self.assertEqual(misc.find([[1], [2]], [2]), 1) # Lists of lists
+
+	def test_vin(self):
+		self.assertEqual(misc.vin([1, 2, 3], [3, 1]).tolist(), [True, False, True]) # Lists
+		self.assertEqual(misc.vin(numpy.array([1, 2, 3]), numpy.array([3.0, 1.0])).tolist(), [True, False, True])
+		self.assertEqual(misc.vin(numpy.array(["a", "bb", "c"]), ("bb", "a")).tolist(), [True, True, False]) # Strings
+		self.assertEqual(misc.vin(numpy.array([1, 2]), {2, 5}).tolist(), [False, True]) # Sets
+		self.assertEqual(misc.vin(numpy.array(["1", "2"]), [1, 2]).tolist(), [False, False]) # Not comparable
+		x = numpy.array(["2021-01-01", "2021-01-02"]).astype(numpy.datetime64)
+		self.assertEqual(misc.vin(x, x[1:]).tolist(), [False, True]) # Datetimes
+		self.assertEqual(misc.vin([[1], [2]], [[2]]).tolist(), [False, True]) # Unhashable
+		self.assertEqual(misc.vin([], [1]).tolist(), []) # Empty
+
+	def test_fin(self):
+		x = [{"a": 1, "b": "x"}, {"a": 2, "b": "y"}]
+		self.assertEqual(misc.fin(x, [{"b": "y", "a": 2}]).tolist(), [False, True])
+
+	def test_within(self):
+		self.assertTrue(misc.within(2, [1, 3])) # Atom
+		self.assertFalse(misc.within(4, [1, 3]))
+		self.assertEqual(misc.within([0, 1, 2, 3, 4], [1, 3]), [False, True, True, True, False]) # List
+		self.assertEqual(misc.within((0, 1), (1, 3)), (False, True)) # Tuple
+		act = misc.within(numpy.array([0.5, 1.0, 3.0, numpy.nan]), [1, 3]) # Array
+		self.assertEqual(type(act), numpy.ndarray)
+		self.assertEqual(act.tolist(), [False, True, True, False])
+		self.assertEqual(misc.within(numpy.array(["a", "c", "e"]), ["b", "d"]).tolist(), [False, True, False])
+		x = numpy.array(["2021-01-01", "2021-01-05"]).astype(numpy.datetime64)
+		self.assertEqual(misc.within(x, x[[1, 1]]).tolist(), [False, True]) # Datetimes
 
 	def test_remove(self):
 		self.assertEqual(misc.remove([], []), []) # Both empty
@@ -97,4 +158,151 @@ class MiscTest(TestCase):
 		self.assertEqual(misc.remove([1, 2, 3], [10, 1, 20, 3, 2]), []) # Complete overlap
 		self.assertEqual(set(misc.remove("abc", "b")), set(["c", "a"])) # General case with strings (order not guaranteed)
 		self.assertEqual(misc.remove(["abc", "def", "gh"], ["abc", "gh"]), ["def"]) # General case with lists of strings
-		self.assertEqual(set(misc.remove([1, 2, 3], 2)), set([1, 3])) # Remove atom
\ No newline at end of file
+		self.assertEqual(set(misc.remove([1, 2, 3], 2)), set([1, 3])) # Remove atom
+
+	def test_fill(self):
+		self.assertEqual(list(misc.fill([1.5, numpy.nan, 3], 0)), [1.5, 0, 3]) # Float
+		self.assertEqual(list(misc.fill(numpy.array([1, null.INT]), 2)), [1, 2]) # Int
+		self.assertEqual(list(misc.fill(["a", ""], "b")), ["a", "b"]) # String
+		x = numpy.array(["2021-10-23", ""]).astype(numpy.datetime64)
+		self.assertEqual(list(misc.fill(x, numpy.datetime64("2021-10-24"))),
+			list(numpy.array(["2021-10-23", "2021-10-24"]).astype(numpy.datetime64))) # Datetime
+		self.assertEqual(len(misc.fill([], 1)), 0) # Empty
+		x = numpy.ma.MaskedArray([1.0, numpy.nan, 3.0], mask=[True, False, False])
+		self.assertEqual(list(misc.fill(x, 0)), [0, 0, 3]) # Masked
+		x = numpy.array([1, 2])
+		act = misc.fill(x, 0) # No nulls, still a copy
+		self.assertEqual(list(act), [1, 2])
+		self.assertFalse(act is x)
+
+	def test_itop(self):
+		x = numpy.array([5, 1, 3, 5, 2, 3, 9])
+		self.assertEqual(misc.itop(x, 3).tolist(), [6, 0, 3]) # Ties by position
+		self.assertEqual(misc.itop(x, 3, False).tolist(), [1, 4, 2])
+		self.assertEqual(misc.itop(x, 0).tolist(), [])
+		self.assertEqual(misc.itop(x, 10).tolist(), [6, 0, 3, 2, 5, 4, 1])
+		self.assertEqual(misc.itop([], 2).tolist(), [])
+
+		# Same as a stable sort.
+		r = numpy.random.default_rng(0).integers(0, 20, 200)
+		for k in [1, 7, 50]:
+			self.assertEqual(misc.itop(r, k, False).tolist(), numpy.argsort(r, kind="stable")[:k].tolist())
+
+		# Nulls are the largest, masked elements too.
+		f = numpy.array([1.0, numpy.nan, 3.0, numpy.nan, 2.0])
+		self.assertEqual(misc.itop(f, 3).tolist(), [1, 3, 2])
+		self.assertEqual(misc.itop(f, 4, False).tolist(), [0, 4, 2, 1])
+		m = numpy.ma.MaskedArray([1, 7, 3], mask=[False, True, False])
+		self.assertEqual(misc.itop(m, 2).tolist(), [1, 2])
+
+		# Strings.
+		self.assertEqual(misc.itop(["b", "c", "a"], 2).tolist(), [1, 0])
+
+	def test_top(self):
+		self.assertEqual(misc.top([5, 1, 3, 5, 2], 2).tolist(), [5, 5])
+		self.assertEqual(misc.top([5, 1, 3, 5, 2], 2, False).tolist(), [1, 2])
+
+	def test_xbar(self):
+		# Numbers.
+		self.assertEqual(misc.xbar(5, [12, 3, -1, 10]).tolist(), [10, 0, -5, 10])
+		self.assertEqual(misc.xbar(5, 12), 10) # Atom
+		self.assertEqual(misc.xbar(5, numpy.array([12, null.INT])).tolist(), [10, null.INT]) # Nulls stay null
+		act = misc.xbar(0.5, [1.2, -0.2, numpy.nan])
+		self.assertEqual(act[:2].tolist(), [1.0, -0.5])
+		self.assertTrue(numpy.isnan(act[2]))
+
+		# Datetimes.
+		t = numpy.array(["2021-01-31T10:01:59", "2021-02-01T10:02:00", "NaT"]).astype("datetime64[s]")
+		act = misc.xbar(misc.timeDelta(m=1), t)
+		self.assertEqual(act.dtype, t.dtype)
+		self.assertEqual(act.astype(str).tolist(), ["2021-01-31T10:01:00", "2021-02-01T10:02:00", "NaT"])
+		self.assertEqual(misc.xbar(60, t).tolist(), act.tolist()) # Units of x
+		act = misc.xbar(misc.timeDelta(ms=1500), t) # Finer than x
+		self.assertEqual(act.astype(str).tolist()[:2], ["2021-01-31T10:01:58.500", "2021-02-01T10:02:00.000"])
+		act = misc.xbar(misc.timeDelta(M=1), t) # Calendar
+		self.assertEqual(act.dtype, t.dtype)
+		self.assertEqual(act.astype(str).tolist(), ["2021-01-01T00:00:00", "2021-02-01T00:00:00", "NaT"])
+		self.assertEqual(str(misc.xbar(misc.timeDelta(h=1), t[0])), "2021-01-31T10:00:00")
+
+		# Widths that are whole units keep the unit, finer ones give the unit of the width.
+		d = numpy.array(["2021-01-01", "2021-01-04"], dtype="datetime64[D]")
+		act = misc.xbar(misc.timeDelta(h=48), d)
+		self.assertEqual(act.dtype, d.dtype)
+		self.assertEqual(act.astype(str).tolist(), ["2021-01-01", "2021-01-03"])
+		act = misc.xbar(misc.timeDelta(h=5), d)
+		self.assertEqual(act.dtype, numpy.dtype("datetime64[h]"))
+		self.assertEqual(act.astype(str).tolist(), ["2020-12-31T22", "2021-01-03T20"])
+
+		# Widths must be positive.
+		for w in [0, -5, 0.0, numpy.nan, misc.timeDelta(s=0), numpy.timedelta64("NaT")]:
+			self.assertRaisesRegex(ValueError, "Width must be positive, width=", misc.xbar, w, [1, 2])
+
+		# Timedeltas, and masked arrays.
+		d = numpy.array([75, 29], dtype="timedelta64[s]")
+		self.assertEqual(misc.xbar(misc.timeDelta(s=30), d).tolist(), numpy.array([60, 0], dtype="timedelta64[s]").tolist())
+		m = numpy.ma.MaskedArray([7, 12], mask=[True, False])
+		act = misc.xbar(5, m)
+		self.assertEqual(act.mask.tolist(), [True, False])
+		self.assertEqual(act[1], 10)
+
+	def test_moving(self):
+		r = numpy.random.default_rng(0)
+		x = r.normal(size=50)
+		x[[3, 10, 11, 12, 13]] = numpy.nan
+
+		# Same as computing each window.
+		for n in [1, 2, 3, 7, 50, 60]:
+			ws = [x[max(0, i - n + 1):i + 1] for i in range(len(x))]
+			ws = [w[~numpy.isnan(w)] for w in ws]
+			nan = lambda w, f: f(w) if len(w) > 0 else numpy.nan
+			self.assertTrue(numpy.allclose(misc.msum(x, n), [w.sum() for w in ws]))
+			self.assertTrue(numpy.allclose(misc.mavg(x, n), [nan(w, numpy.mean) for w in ws], equal_nan=True))
+			self.assertTrue(numpy.allclose(misc.mdev(x, n), [nan(w, numpy.std) for w in ws], equal_nan=True))
+			self.assertTrue(numpy.array_equal(misc.mmin(x, n), [nan(w, numpy.min) for w in ws], equal_nan=True))
+			self.assertTrue(numpy.array_equal(misc.mmax(x, n), [nan(w, numpy.max) for w in ws], equal_nan=True))
+
+		# Integers stay integers, nulls included.
+		i = numpy.array([4, null.INT, 1, 3, 9])
+		self.assertEqual(misc.msum(i, 2).tolist(), [4, 4, 1, 4, 12])
+		self.assertEqual(misc.mmin(i, 2).tolist(), [4, 4, 1, 1, 3])
+		self.assertEqual(misc.mmax([null.INT, null.INT, 2], 2).tolist(), [null.INT, null.INT, 2])
+		self.assertEqual(misc.mmax([True, False, False], 2).tolist(), [True, True, False]) # Booleans stay booleans
+		self.assertEqual(misc.mmin(numpy.array([True, False, True]), 2).dtype, bool)
+
+		# Datetimes and timedeltas stay so, NaT are nulls.
+		d = numpy.array(["2020-01-03", "NaT", "2020-01-01", "NaT", "NaT"], dtype="datetime64[D]")
+		act = misc.mmax(d, 2)
+		self.assertEqual(act.dtype, d.dtype)
+		self.assertEqual(act.astype(str).tolist(), ["2020-01-03", "2020-01-03", "2020-01-01", "2020-01-01", "NaT"])
+		self.assertEqual(misc.mmin(numpy.array([3, 1, 2], dtype="timedelta64[s]"), 2).astype(int).tolist(), [3, 1, 1])
+		self.assertRaisesRegex(ValueError, "Moving min/max needs numbers, booleans, datetimes or timedeltas, got <U1",
+			misc.mmin, ["a", "b"], 2)
+
+		# Windows must hold something.
+		for f in [misc.msum, misc.mavg, misc.mdev, misc.mmin, misc.mmax]:
+			self.assertRaisesRegex(ValueError, "Window length must be positive, n=0", f, [1, 2], 0)
+		self.assertEqual(misc.msum(numpy.array([1, 2, 3], dtype=numpy.int32), 2).tolist(), [1, 3, 5])
+
+		# Masked elements are nulls.
+		m = numpy.ma.MaskedArray([1.0, 5.0, 2.0], mask=[False, True, False])
+		self.assertEqual(misc.mavg(m, 2).tolist(), [1.0, 1.0, 2.0])
+
+		# Empty.
+		for f in [misc.msum, misc.mavg, misc.mdev, misc.mmin, misc.mmax]: self.assertEqual(len(f([], 3)), 0)
+
+	def test_ema(self):
+		x = [3.0, 1.0, numpy.nan, 4.0, 1.0]
+		self.assertEqual(misc.ema(x, 0.5).tolist(), [3.0, 2.0, 2.0, 3.0, 2.0]) # Nulls carry over
+		for a in [0, -0.5, 1, 1.5, numpy.nan]:
+			self.assertRaisesRegex(ValueError, "Smoothing factor must be in \\(0, 1\\), a=", misc.ema, x, a)
+		act = misc.ema([numpy.nan, 2.0, 4.0], 0.5) # Starts at the first non-null
+		self.assertTrue(numpy.isnan(act[0]))
+		self.assertEqual(act[1:].tolist(), [2.0, 3.0])
+		self.assertEqual(len(misc.ema([], 0.5)), 0)
+
+		# Same as the recurrence, including over many blocks.
+		y = numpy.random.default_rng(0).normal(size=2000)
+		for a in [0.01, 0.5, 0.99]:
+			exp = [y[0]]
+			for v in y[1:]: exp.append(a*v + (1 - a)*exp[-1])
+			self.assertTrue(numpy.allclose(misc.ema(y, a), exp))
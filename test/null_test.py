@@ -19,4 +19,27 @@ class NullTest(TestCase):
 
 		# Unknown.
 		self.assertRaisesRegex(Exception, "No null defined for type=dummy", null.getNull, "dummy")
-		self.assertRaisesRegex(Exception, "Unrecognized type for null check, type=<class 'list'> val=\[\]", null.isNull, [])
\ No newline at end of file
+		self.assertRaisesRegex(Exception, "Unrecognized type for null check, type=<class 'list'> val=\[\]", null.isNull, [])
+
+	def test_isNullArray(self):
+		# Different types.
+		self.assertEqual(list(null.isNullArray([1, null.INT, 3])), [False, True, False]) # Int
+		self.assertEqual(list(null.isNullArray([1.2, null.FLOAT])), [False, True]) # Float
+		self.assertEqual(list(null.isNullArray(numpy.array(["2021-04-11", ""]).astype(numpy.datetime64))),
+			[False, True]) # Datetime
+		self.assertEqual(list(null.isNullArray(numpy.array([null.TIMEDELTA, numpy.timedelta64(1, "s")]))),
+			[True, False]) # Time delta
+		self.assertEqual(list(null.isNullArray(["abc", null.STRING])), [False, True]) # String
+		self.assertEqual(list(null.isNullArray(numpy.array([None, 1, "a"], dtype=object))), [True, False, False]) # Object
+		self.assertEqual(list(null.isNullArray([True, False])), [False, True]) # Boolean
+
+		# Agrees with `isNull`.
+		x = numpy.array([0, null.INT, -1])
+		self.assertEqual(list(null.isNullArray(x)), [null.isNull(y) for y in x])
+
+		# Nested objects are fine.
+		x = numpy.array([numpy.array([1, 2]), None], dtype=object)
+		self.assertEqual(list(null.isNullArray(x)), [False, True])
+
+		# Empty.
+		self.assertEqual(len(null.isNullArray(numpy.array([]).astype(str))), 0)
@@ -0,0 +1,65 @@
+########################################################################################################################
+# Compiled clause tests.
+########################################################################################################################
+
+import gc, numpy, weakref
+from unittest import TestCase
+from src import plan
+
+class PlanTest(TestCase):
+	def test_compileClause(self):
+		calls = []
+
+		def add(x, y):
+			calls.append((x, y))
+			return x + y
+
+		# Columns and sub-expressions referenced many times are only evaluated once.
+		p = plan.compileClause({"a": [numpy.sum, [add, "x", "y"]], "b": [add, "x", "y"], "c": "x", "d": ["x"], "e": 1})
+		self.assertEqual(p.cols, ["x", "y"])
+		got = []
+		res = p.run(lambda c: got.append(c) or {"x": numpy.array([1, 2]), "y": numpy.array([3, 4])}[c])
+		self.assertEqual(got, ["x", "y"])
+		self.assertEqual(len(calls), 1)
+		self.assertEqual(res["a"], 10)
+		self.assertEqual(res["b"].tolist(), [4, 6])
+		self.assertEqual(res["c"].tolist(), [1, 2])
+		self.assertEqual(res["d"], "x")
+		self.assertEqual(res["e"], 1)
+
+		# Cached, by shape: each clause gets the plan bound to its own functions.
+		p = plan.compileClause({"b": [add, "x", "y"]})
+		self.assertIs(plan.compileClause({"b": [add, "x", "y"]})._nodes, p._nodes)
+		self.assertIsNot(plan.compileClause({"b": [add, "y", "x"]})._nodes, p._nodes)
+		q = plan.compileClause({"b": [numpy.subtract, "x", "y"]})
+		self.assertIs(q._nodes, p._nodes)
+		self.assertEqual(q.run(lambda c: {"x": 5, "y": 3}[c])["b"], 2)
+		self.assertIsNot(plan.compileClause({"b": [add, [add, "x", "y"], "y"]})._nodes,
+			plan.compileClause({"b": [add, [numpy.subtract, "x", "y"], "y"]})._nodes) # Different functions, not deduped
+
+		# The cache doesn't keep functions (or what they hold on to) alive.
+		big = numpy.zeros(10)
+		ref = weakref.ref(big)
+		f = lambda x: x + big
+		plan.compileClause({"f": [f, "x"]}).run(lambda c: 1)
+		del f, big
+		gc.collect()
+		self.assertIsNone(ref())
+
+		# Values referenced more than once are copied, so a function modifying its argument doesn't affect the others.
+		def neg(x):
+			x *= -1
+			return x
+
+		res = plan.compileClause({"a": [neg, "x"], "b": [numpy.sum, "x"], "c": "x"}).run(lambda c: numpy.array([1, 2]))
+		self.assertEqual(res["a"].tolist(), [-1, -2])
+		self.assertEqual(res["b"], 3)
+		self.assertEqual(res["c"].tolist(), [1, 2])
+
+		# Numpy strings are column names too.
+		self.assertEqual(plan.compileClause({"a": [add, numpy.str_("x"), [numpy.str_("s")]]}).cols, ["x"])
+
+		# Unhashable literals still work, but aren't cached.
+		c = {"a": [numpy.add, "x", numpy.array([1, 1])]}
+		self.assertIsNot(plan.compileClause(c), plan.compileClause(c))
+		self.assertEqual(plan.compileClause(c).run(lambda c: numpy.array([1, 2]))["a"].tolist(), [2, 3])
@@ -0,0 +1,136 @@
+########################################################################################################################
+# Query tests.
+########################################################################################################################
+
+import numpy, os, glob
+from unittest import TestCase
+from src.query import Query, Table, TableException
+from src import mock
+
+class QueryTest(TestCase):
+	RESOURCES = "test/resources/"
+	LOC = RESOURCES + "test_query"
+
+	gt = lambda x, y: x > y
+	eq = lambda x, y: x == y
+
+	def setUp(self):
+		self.t = Table({
+			"sym": ["a", "b", "a", "c", "b", "a"],
+			"px": [10.0, 20.0, 11.0, 30.0, 21.0, 12.0],
+			"qty": [1, 2, 3, 4, 5, 6],
+			"ex": ["x", "y", "x", "y", "x", "y"]})
+
+	def tearDown(self):
+		mock.resetMocks()
+		QueryTest.rmTbl()
+
+	def rmTbl():
+		if os.path.isdir(QueryTest.LOC):
+			for f in glob.glob(QueryTest.LOC + "/*"): os.remove(f)
+			if os.path.isfile(QueryTest.LOC + "/.d"): os.remove(QueryTest.LOC + "/.d")
+			if os.path.isfile(QueryTest.LOC + "/.a"): os.remove(QueryTest.LOC + "/.a")
+			os.rmdir(QueryTest.LOC)
+
+	def test_init(self):
+		self.assertRaisesRegex(TableException, "Query source must be a table or a location", Query, 1)
+
+	def test_table(self):
+		# Nothing to do.
+		self.assertEqual(Query(self.t).collect(), self.t)
+
+		# Same as eager.
+		q = Query(self.t).where([QueryTest.gt, "qty", 1]).sort("px", desc=True).takeCol(["sym", "px"])
+		exp = self.t.where([QueryTest.gt, "qty", 1])
+		exp.sort("px", desc=True)
+		exp.takeCol(["sym", "px"])
+		self.assertEqual(q.collect(), exp)
+
+		# Chains don't affect each other or the source.
+		og = self.t.copy()
+		base = Query(self.t).where([QueryTest.eq, "sym", ["a"]])
+		a = base.takeCol("qty").collect()
+		b = base.by("ex", {"n": [len, "qty"]}).collect()
+		self.assertEqual(a, Table({"qty": [1, 3, 6]}))
+		self.assertEqual(list(b.getCol("n")), [2, 1])
+		self.assertEqual(self.t, og)
+
+	def test_pushdown(self):
+		# Filters move ahead of sorts and projections, and get fused with each other and with projections.
+		q = Query(self.t).sort("px").takeCol(["sym", "qty"]).where([QueryTest.gt, "qty", 1]).where(
+			[QueryTest.eq, "sym", ["a"]])
+		self.assertEqual(q.explain(),
+			"scan table cols=['sym', 'px', 'qty'] where=2\nsort ['px']\ntakeCol ['sym', 'qty']")
+		self.assertEqual(q.collect(), Table({"sym": ["a", "a"], "qty": [3, 6]}))
+
+		q = Query(self.t).takeCol(["sym", "qty", "px"]).sort("px").where([QueryTest.gt, "qty", 1]).takeCol(
+			["sym", "qty"])
+		self.assertEqual(q.explain(),
+			"scan table cols=['sym', 'px', 'qty'] where=1\ntakeCol ['sym', 'qty', 'px']\nsort ['px']\ntakeCol ['sym', 'qty']")
+		self.assertEqual(q.collect(), Table({"sym": ["a", "a", "b", "b", "c"], "qty": [3, 6, 2, 5, 4]}))
+
+		# Filters can't move ahead of a projection that drops their columns (that's an error), or ahead of groupings.
+		q = Query(self.t).takeCol("sym").where([QueryTest.gt, "qty", 1])
+		self.assertEqual(q.explain(), "scan table cols=['sym'] where=0\ntakeCol ['sym']\nwhere 1")
+		self.assertRaisesRegex(TableException, "Unknown column: qty", q.collect)
+
+		# A projection followed by a narrower selection still reads all the columns the projection takes.
+		q = Query(self.t).takeCol(["sym", "qty"]).select(["sym"])
+		self.assertEqual(q.explain(), "scan table cols=['sym', 'qty'] where=0\ntakeCol ['sym', 'qty']\nselect ['sym'] where=0")
+		self.assertEqual(q.collect(), Table({"sym": ["a", "b", "a", "c", "b", "a"]}))
+
+		q = Query(self.t).by("sym", {"q": [sum, "qty"]}).where([QueryTest.gt, "q", 5])
+		self.assertEqual(q.explain(), "scan table cols=['sym', 'qty'] where=0\nby ['sym']\nwhere 1")
+		act = q.collect()
+		self.assertEqual(list(act.getCol("sym")), ["a", "b"])
+		self.assertEqual(list(act.getCol("q")), [10, 7])
+
+		# Joins only let through filters that don't use the columns they produce.
+		right = Table({"sym": ["a", "b"], "name": ["A", "B"]}).key("sym", inPlace=False)
+		q = Query(self.t).lj(right).where([QueryTest.gt, "qty", 4]).where([QueryTest.eq, "name", ["B"]])
+		self.assertEqual(q.explain(), "scan table cols=* where=1\nlj\nwhere 1")
+		exp = self.t.getRow([4])
+		exp["name"] = ["B"]
+		self.assertEqual(q.collect(), exp)
+
+		# Selections.
+		q = Query(self.t).select({"v": [lambda x, y: x*y, "px", "qty"]}, where=[QueryTest.eq, "ex", ["y"]])
+		self.assertEqual(q.explain(), "scan table cols=['px', 'qty', 'ex'] where=1\nselect ['v'] where=0")
+		self.assertEqual(q.collect(), Table({"v": [40.0, 120.0, 72.0]}))
+
+	def test_disk(self):
+		self.t.nullable("qty")
+		self.t.setNull(2, "qty")
+		self.t.save(QueryTest.LOC)
+
+		# Spy on what gets read.
+		read = []
+		load = numpy.load
+		def spy(f, *args, **kwargs):
+			read.append(os.path.basename(f))
+			return load(f, *args, **kwargs)
+		mock.mock(numpy, "load", spy)
+
+		# Whole thing.
+		self.assertEqual(Query(QueryTest.LOC).collect(), self.t)
+
+		# Only the needed columns.
+		read.clear()
+		act = Query(QueryTest.LOC).takeCol(["qty", "sym"]).collect()
+		self.assertEqual(act, self.t.takeCol(["qty", "sym"], inPlace=False))
+		self.assertTrue(act.isNullable("qty"))
+		self.assertEqual(sorted(read), ["qty.npy", "qty.v.npy", "sym.npy"])
+
+		# Filters on disk.
+		read.clear()
+		act = Query(QueryTest.LOC).where([QueryTest.gt, "px", 15]).by("sym", {"p": [max, "px"]}).collect()
+		self.assertEqual(list(act.getCol("sym")), ["b", "c"])
+		self.assertEqual(list(act.getCol("p")), [21.0, 30.0])
+		self.assertEqual(sorted(read), ["px.npy", "sym.npy"])
+
+		act = Query(QueryTest.LOC).where([QueryTest.eq, "sym", ["a"]]).collect()
+		self.assertEqual(act, self.t.getRow([0, 2, 5]))
+		self.assertEqual(list(act.nullMask("qty")), [False, True, False])
+
+		# Unknown location.
+		self.assertRaisesRegex(TableException, "Unable to read .d file", Query(QueryTest.LOC + "x").collect)
@@ -2,9 +2,9 @@
 # Table tests.
 ######################################################################
 
-import numpy, os, glob
+import numpy, os, glob, operator, shutil, concurrent.futures, threading, warnings
 from unittest import TestCase
-from src.table import Table, TableException
+from src.table import Table, TableException, misc
 from src import null, mock
 
 class TableTest(TestCase):
@@ -173,10 +173,33 @@ class TableTest(TestCase):
 		exp = Table({"x": [1, 2, 10, 20, 30, 100], "y": [True, False, True, True, False, True]})
 		self.assertEqual(act, exp)
 
+		# Many chunks, string widths reconciled.
+		chunks = [Table({"i": [i, i], "s": ["x"*i, "y"]}) for i in range(1, 50)]
+		act = Table.raze(chunks)
+		self.assertEqual(len(act), 98)
+		self.assertEqual(act.getCol("s")[96], "x"*49)
+		self.assertEqual(act, chunks[0].append(Table.raze(chunks[1:]), inPlace=False))
+
+		# Keys, nulls and attributes carry over from the first table.
+		x = Table({"k": [1, 2], "v": [1, 2]}).key("k", inPlace=False).nullable("v", inPlace=False)
+		x.setNull(0, "v")
+		x.setAttr("k", "s")
+		y = Table({"k": [3], "v": [3]}).nullable("v", inPlace=False)
+		y.setNull(0, "v")
+		act = Table.raze([x, y, Table({"k": [4], "v": [4]})])
+		self.assertEqual(act.keyCols(), ["k"])
+		self.assertEqual(act.nullMask("v").tolist(), [True, False, True, False])
+		self.assertEqual(act.attr("k"), "s")
+		self.assertEqual(Table.raze([x, Table({"k": [0], "v": [4]})]).attr("k"), "")
+
+		# Leading tables without columns.
+		self.assertEqual(Table.raze([Table(), Table({"x": [1]}), Table({"x": [2]})]), Table({"x": [1, 2]}))
+
 	def rmTbl(path):
 		if "test_table_save_load" in os.listdir(TableTest.RESOURCES):
 			for f in glob.glob(path + "/*"): os.remove(f)
 			if os.path.isfile(path + "/.d"): os.remove(path + "/.d")
+			if os.path.isfile(path + "/.a"): os.remove(path + "/.a")
 			os.rmdir(path)
 
 	def test_save_load(self):
@@ -195,6 +218,24 @@ class TableTest(TestCase):
 		exp.save(testFile)
 		act = Table.load(testFile)
 		self.assertEqual(act, exp)
+		self.assertEqual(Table.diskCols(testFile), ["date", "price"])
+
+		# Subset of columns.
+		act = Table.load(testFile, "price")
+		self.assertEqual(act, exp.takeCol("price", inPlace=False))
+		act = Table.load(testFile, ["price", "date"])
+		self.assertEqual(act, exp)
+		self.assertRaisesRegex(TableException, "Unknown column: blah", Table.load, testFile, ["price", "blah"])
+
+		# Attributes are saved, and their indices rebuilt.
+		exp.setAttr("price", "s")
+		exp.setCol("sym", ["b", "a"])
+		exp.setAttr("sym", "p")
+		exp.save(testFile)
+		act = Table.load(testFile)
+		self.assertEqual([act.attr(c) for c in act.cols()], ["", "s", "p"])
+		self.assertEqual(act._attrIdx["sym"], {"b": [0, 1], "a": [1, 2]})
+		self.assertEqual(Table.load(testFile, "sym").attr("sym"), "p")
 
 		# Error reading column.
 		os.remove(testFile + "/price.npy")
@@ -202,6 +243,59 @@ class TableTest(TestCase):
 
 		TableTest.rmTbl(testFile) # Clean up
 
+	def test_save_load_threads(self):
+		parts = [TableTest.RESOURCES + "test_table_part{}".format(i) for i in range(2)]
+		for p in parts: shutil.rmtree(p, ignore_errors=True) # In case they're here from a previous run
+
+		try:
+			t = Table({"c{}".format(i): numpy.arange(5) + i for i in range(20)})
+			t.nullable("c3")
+			t.setNull([1, 4], "c3")
+
+			# Same whatever the thread count, columns keep their order.
+			for n in [1, 4]:
+				t.save(parts[0], threads=n)
+				self.assertEqual(Table.diskCols(parts[0]), t.cols())
+				act = Table.load(parts[0], threads=n)
+				self.assertEqual(act, t)
+				self.assertEqual(act.nullMask("c3").tolist(), [False, True, False, False, True])
+
+			# Partitions, one after the other. Attributes are kept if they still hold.
+			u = t.getRow([0, 1, 2])
+			u.unkey()
+			u.setCol("c3", [7, 8, 9]) # Not nullable in this partition
+			t.setAttr("c0", "s")
+			u.setAttr("c0", "s")
+			t.save(parts[0])
+			u.save(parts[1])
+			act = Table.load(parts)
+			self.assertEqual(act.getCol("c1").tolist(), [1, 2, 3, 4, 5, 1, 2, 3])
+			self.assertEqual(act.nullMask("c3").tolist(), [False, True, False, False, True, False, False, False])
+			self.assertEqual(act.getCol("c3").tolist()[-3:], [7, 8, 9])
+			self.assertEqual(act.attr("c0"), "")
+			self.assertEqual(Table.load(parts[::-1], ["c2", "c1"]).cols(), ["c1", "c2"])
+			self.assertEqual(Table.load(parts[:1]), Table.load(parts[0]))
+			self.assertRaisesRegex(TableException, "No location to load", Table.load, [])
+
+			Table({"c1": [1]}).save(parts[1])
+			self.assertRaisesRegex(TableException, "Partition '.*part1' is missing column: c0", Table.load, parts)
+
+			# All failures are reported together.
+			os.remove(parts[0] + "/c2.npy")
+			os.remove(parts[0] + "/c7.npy")
+			self.assertRaisesRegex(TableException, "Unable to read column 'c2':.*; Unable to read column 'c7':",
+				Table.load, parts[0])
+
+			# Thread counts.
+			self.assertRaisesRegex(TableException, "Thread count must be positive, threads=0", t.save, parts[0], 0)
+			self.assertRaisesRegex(TableException, "Thread count must be positive, threads=0", Table.setIoThreads, 0)
+			og = Table._ioThreads
+			Table.setIoThreads(2)
+			self.assertEqual(Table._ioThreads, 2)
+			Table.setIoThreads(og)
+		finally:
+			for p in parts: shutil.rmtree(p, ignore_errors=True)
+
 	def test_key_unkey(self):
 		# Unkeyed.
 		t = Table({"x": [1, 2, 3], "y": ["a", "b", "c"], "z": [True, False, True]})
@@ -336,6 +430,139 @@ class TableTest(TestCase):
 		self.assertRaisesRegex(Exception, "'unknownCol'",  t.getCol, "unknownCol")
 
 
+	def test_nullMask(self):
+		t = Table({"i": [1, null.INT], "f": [null.FLOAT, 1.2], "s": ["a", ""],
+			"d": numpy.array(["", "2021-10-23"]).astype(numpy.datetime64)})
+
+		# Single column.
+		self.assertEqual(list(t.nullMask("i")), [False, True])
+		self.assertEqual(list(t.nullMask("s")), [False, True])
+
+		# Multiple columns.
+		act = t.nullMask(["f", "d"])
+		self.assertEqual(len(act), 2)
+		self.assertEqual(list(act[0]), [True, False])
+		self.assertEqual(list(act[1]), [True, False])
+
+		# Unknown column.
+		self.assertRaisesRegex(KeyError, "x", t.nullMask, "x")
+
+	def test_nullable(self):
+		t = Table({"i": [1, null.INT, 3], "b": [True, False, True], "s": ["a", "", "c"]})
+		self.assertFalse(t.isNullable("i"))
+
+		# Sentinels become nulls, except for bools.
+		act = t.nullable(["i", "b"], inPlace=False)
+		self.assertFalse(t.isNullable("i"))
+		self.assertTrue(act.isNullable("i"))
+		self.assertTrue(act.isNullable("b"))
+		self.assertFalse(act.isNullable("s"))
+		self.assertEqual(list(act.nullMask("i")), [False, True, False])
+		self.assertEqual(list(act.nullMask("b")), [False, False, False])
+		self.assertEqual(act.getRow(1), {"i": None, "b": False, "s": ""})
+
+		# Genuine sentinel and false values.
+		act.setRow(1, (null.INT, False, "x"))
+		self.assertEqual(list(act.nullMask("i")), [False, False, False])
+		self.assertEqual(act.getRow(1), {"i": null.INT, "b": False, "s": "x"})
+
+		# Set nulls -- bits for nullable columns, sentinel otherwise.
+		act.setNull([0, 2], ["b", "s"])
+		self.assertEqual(list(act.nullMask("b")), [True, False, True])
+		self.assertEqual(list(act["b"]), [True, False, True]) # Values untouched
+		self.assertEqual(list(act["s"]), ["", "x", ""])
+		self.assertEqual(act.getRow(-1), {"i": 3, "b": None, "s": ""})
+		act.setRow(0, None, "b")
+		self.assertEqual(act.getRow(0)["b"], None)
+		self.assertRaisesRegex(TableException, "Unknown column: x", act.setNull, 0, "x")
+
+		# Rows carry their bits.
+		sub = act[[2, 1]]
+		self.assertEqual(list(sub.nullMask("b")), [True, False])
+		act.append({"i": None, "b": True, "s": "y"})
+		act.append((4, None, "z"))
+		self.assertEqual(list(act.nullMask("i")), [False, False, False, True, False])
+		self.assertEqual(list(act.nullMask("b")), [True, False, True, False, True])
+		act.deleteRow(0)
+		self.assertEqual(list(act.nullMask("b")), [False, True, False, True])
+		plain = Table({"i": [7], "b": [True], "s": ["w"]})
+		self.assertEqual(plain.append(act, inPlace=False).nullMask("b").tolist(), [False, False, True, False, True])
+		act.sort("i")
+		self.assertEqual(list(act["i"]), [null.INT, 3, 4, null.INT])
+		self.assertEqual(list(act.nullMask("i")), [False, False, False, True])
+
+		# Nulls sort as the largest values, whatever value sits underneath, and leave no attribute behind.
+		x = Table({"x": [3, 1, 2], "y": [0, 1, 2]}).nullable("x", inPlace=False)
+		x.setNull(0, "x")
+		self.assertEqual(x.sort("x", inPlace=False).getCol("y").tolist(), [1, 2, 0])
+		self.assertEqual(x.sort("x", inPlace=False).attr("x"), "")
+		self.assertEqual(x.sort("x", desc=True, inPlace=False).getCol("y").tolist(), [0, 2, 1])
+		self.assertEqual(x.sort(["x", "y"], [False, True], inPlace=False).getCol("y").tolist(), [1, 2, 0])
+
+		# Nulls compare equal regardless of the value underneath, but never to a value.
+		x = Table({"i": [1, 2]}).nullable("i", inPlace=False)
+		y = x.copy()
+		x.setNull(1)
+		y.setNull(1)
+		y.setRow(1, 100, "i")
+		y.setNull(1)
+		self.assertEqual(x, y)
+		y.setRow(1, 2, "i")
+		self.assertNotEqual(x, y)
+		self.assertNotEqual(x, Table({"i": [1, 2]}))
+
+		# Setting a column drops its bitmap.
+		x.setCol("i", [5, null.INT])
+		self.assertFalse(x.isNullable("i"))
+
+		# Key misses mark bits.
+		t = Table({"k": ["a", "b"], "v": [10, 20]}).nullable("v", inPlace=False)
+		t.key("k")
+		self.assertEqual(t.getKey("z"), {"k": "z", "v": None})
+		act = t.getKey(["b", "z"])
+		self.assertEqual(act["v"][0], 20) # Misses aren't written, just marked
+		self.assertEqual(list(act.nullMask("v")), [False, True])
+		self.assertEqual(list(t.getKey(["y", "z"]).nullMask("v")), [True, True])
+		left = Table({"k": ["z", "b", "a"]})
+		left.lj(t)
+		self.assertEqual(list(left.nullMask("v")), [True, False, False])
+		t.setKey(["c", "d"], [[1, 2]], "v")
+		self.assertEqual(list(t.nullMask("v")), [False, False, False, False])
+
+		# Null keys match nothing, whatever value sits underneath.
+		r = Table({"k": [3, 1], "v": [10.0, 20.0]}).nullable("k", inPlace=False)
+		r.setNull(0, "k")
+		r.key("k")
+		self.assertTrue(numpy.isnan(r.getKey(3)["v"]))
+		act = r.getKey([3, 1])
+		self.assertEqual(act.getCol("k").tolist(), [3, 1])
+		self.assertEqual(act.nullMask("k").tolist(), [False, False])
+		self.assertTrue(numpy.isnan(act.getCol("v")[0]))
+		left = Table({"k": [3, 1, 5]})
+		left.lj(r)
+		self.assertEqual(left.getCol("k").tolist(), [3, 1, 5])
+		self.assertEqual(left.nullMask("k").tolist(), [False, False, False])
+		self.assertEqual(left.nullMask("v").tolist(), [True, False, True])
+
+		# Aggregates skip nulls.
+		t = Table({"k": [1, 1, 2], "v": [10, 20, 30], "w": [1, 1, 1]}).nullable("v", inPlace=False)
+		t.setNull(0, "v")
+		act = t.by("k", {"s": [numpy.sum, "v"], "n": [numpy.ma.count, "v"]})
+		self.assertEqual(list(act.getCol("s")), [20, 30])
+		self.assertEqual(list(act.getCol("n")), [1, 1])
+
+		# Bits survive a save/load.
+		testFile = TableTest.RESOURCES + "test_table_save_load"
+		TableTest.rmTbl(testFile)
+		t.save(testFile)
+		act = Table.load(testFile)
+		self.assertTrue(act.isNullable("v"))
+		self.assertEqual(act, t)
+		t.setCol("v", [1, 2, 3])
+		t.save(testFile) # Overwrite drops the stale bitmap
+		self.assertFalse(Table.load(testFile).isNullable("v"))
+		TableTest.rmTbl(testFile)
+
 	# Slice is explicitly not tested here since it's easier to test as an actual indexing.
 	def test_getRow(self):
 		# Empty table.
@@ -1344,7 +1571,7 @@ class TableTest(TestCase):
 		# Sort single column descending.
 		act = t.copy()
 		act.sort("y", desc=True)
-		exp = t.getRow([1, 4, 3, 5, 2, 0])
+		exp = t.getRow([1, 4, 3, 5, 0, 2]) # Stable
 		self.assertEqual(act, exp)
 
 		# Sort multiple columns ascending.
@@ -1356,16 +1583,353 @@ class TableTest(TestCase):
 		# Sort multiple columns descending.
 		act = t.copy()
 		act.sort(["x", "y"], desc=True)
-		exp = t.getRow([4, 0, 5, 3, 1, 2])
+		exp = t.getRow([4, 0, 3, 5, 1, 2])
 		self.assertEqual(act, exp)
 
 		# Not in place.
 		cp = t.copy()
 		act = t.sort("x", desc=True, inPlace=False)
-		exp = t.getRow([4, 0, 5, 3, 2, 1])
+		exp = t.getRow([4, 0, 3, 5, 1, 2])
 		self.assertEqual(act, exp)
 		self.assertEqual(t, cp)
 
+		# Direction per column.
+		act = t.sort(["x", "y"], [False, True], inPlace=False)
+		self.assertEqual(act, t.getRow([1, 2, 3, 5, 0, 4]))
+		act = t.sort(["y", "x"], [True, False], inPlace=False)
+		self.assertEqual(act, t.getRow([1, 4, 3, 5, 2, 0]))
+		self.assertRaisesRegex(TableException, "Sort direction mismatch, cols=2 desc=1", t.sort, ["x", "y"], [True])
+
+		# Nulls sort as the largest values, and keep their order.
+		f = Table({"f": [2.0, numpy.nan, 1.0, numpy.nan], "i": [0, 1, 2, 3]})
+		self.assertEqual(f.sort("f", inPlace=False).getCol("i").tolist(), [2, 0, 1, 3])
+		self.assertEqual(f.sort("f", desc=True, inPlace=False).getCol("i").tolist(), [1, 3, 0, 2])
+
+		# Keyed and nullable tables.
+		k = t.key("y", inPlace=False).nullable("x", inPlace=False)
+		k.setNull(4, "x")
+		act = k.sort("y", inPlace=False)
+		self.assertEqual(act.keyCols(), ["y"])
+		self.assertEqual(act.nullMask("x").tolist(), [False, False, False, False, True, False])
+
+	def test_by_xbar(self):
+		t = Table({"time": numpy.array(["2021-01-01T10:01:59", "2021-01-01T10:02:00", "2021-01-01T10:01:00"]).astype(
+			"datetime64[s]"), "q": [1, 2, 3]})
+		act = t.by({"bar": [misc.xbar, misc.timeDelta(m=1), "time"]}, {"q": [sum, "q"]})
+		self.assertEqual(act.type("bar"), "datetime64[s]")
+		self.assertEqual(act.getCol("bar").astype(str).tolist(), ["2021-01-01T10:01:00", "2021-01-01T10:02:00"])
+		self.assertEqual(act.getCol("q").tolist(), [4, 2])
+
+	def test_by_nullable(self):
+		# Nulls of nullable key columns form a single group, whatever value sits underneath, and stay null.
+		t = Table({"k": [1, 2, 3, 2, 5], "q": [1, 2, 3, 4, 5]}).nullable("k", inPlace=False)
+		t.setNull([0, 2, 4], "k")
+		act = t.by("k", {"q": [sum, "q"]})
+		self.assertEqual(act.keyCols(), ["k"])
+		self.assertEqual(act.nullMask("k").tolist(), [True, False])
+		self.assertEqual(act.getCol("q").tolist(), [9, 6])
+
+		# Same through clauses and with other key columns.
+		t["s"] = ["a", "a", "a", "b", "b"]
+		act = t.by({"k": [lambda x: x*10, "k"], "s": "s"}, {"q": [sum, "q"]})
+		self.assertEqual(act.nullMask("k").tolist(), [True, False, False, True])
+		self.assertEqual(act.getCol("s").tolist(), ["a", "a", "b", "b"])
+		self.assertEqual(act.getCol("q").tolist(), [4, 2, 4, 5])
+
+		# Update groups them the same way.
+		act = t.update({"n": [len, "q"]}, by="k", inPlace=False)
+		self.assertEqual(act.getCol("n").tolist(), [3, 2, 3, 2, 3])
+
+		# Aggregates over all-null groups are null, and the column keeps its type.
+		g = Table({"g": ["a", "a", "b"], "x": [1, 2, 3]}).nullable("x", inPlace=False)
+		g.setNull([0, 1], "x")
+		with warnings.catch_warnings():
+			warnings.simplefilter("error")
+			act = g.by("g", {"s": [sum, "x"]})
+		self.assertEqual(act.type("s"), "int64")
+		self.assertEqual(act.nullMask("s").tolist(), [True, False])
+		self.assertEqual(act.getCol("s")[1], 3)
+
+	def test_update(self):
+		t = Table({"sym": ["a", "b", "a", "b", "a"], "px": [1.0, 2.0, 3.0, 4.0, 5.0]})
+
+		# Windows restart at key boundaries, and rows keep their order.
+		act = t.update({"s": [misc.msum, "px", 2], "n": 1}, by="sym", inPlace=False)
+		self.assertEqual(act.cols(), ["sym", "px", "s", "n"])
+		self.assertEqual(act.getCol("s").tolist(), [1.0, 2.0, 4.0, 6.0, 8.0])
+		self.assertEqual(act.getCol("n").tolist(), [1]*5)
+		self.assertEqual(t.cols(), ["sym", "px"])
+
+		# No groups, and overwriting.
+		t.update({"px": [misc.mmax, "px", 2]})
+		self.assertEqual(t.getCol("px").tolist(), [1.0, 2.0, 3.0, 4.0, 5.0])
+		t.update({"px": [lambda x: x[::-1], "px"]})
+		self.assertEqual(t.getCol("px").tolist(), [5.0, 4.0, 3.0, 2.0, 1.0])
+
+		# Nullable columns stay nullable through masked results.
+		t.nullable("px")
+		t.setNull(1, "px")
+		act = t.update({"q": [lambda x: x*2, "px"]}, by="sym", inPlace=False)
+		self.assertEqual(act.nullMask("q").tolist(), [False, True, False, False, False])
+		self.assertEqual(act.getRow([0, 2, 3, 4]).getCol("q").tolist(), [10.0, 6.0, 4.0, 2.0])
+
+		self.assertRaisesRegex(TableException, "Update length mismatch, col=q expected=3 got=1",
+			t.update, {"q": [lambda x: x[:1], "px"]}, "sym")
+		self.assertRaisesRegex(TableException, "Unknown column: w", t.update, {"q": "w"})
+
+	def test_top(self):
+		r = numpy.random.default_rng(0)
+		t = Table({"s": r.choice(["a", "b", "c"], 300), "p": r.integers(0, 50, 300), "i": numpy.arange(300)})
+
+		# Same as sorting and taking the first k.
+		for k in [0, 1, 10, 300, 400]:
+			self.assertEqual(t.top(k, "p"), t.sort("p", desc=True, inPlace=False).getRow(slice(0, k)))
+			self.assertEqual(t.top(k, "p", False), t.sort("p", inPlace=False).getRow(slice(0, k)))
+
+		# Per group.
+		act = t.top(2, "p", by="s")
+		exp = Table.raze([t.where([operator.eq, "s", [str(s)]]).top(2, "p") for s in dict.fromkeys(t.getCol("s").tolist())])
+		self.assertEqual(act, exp)
+		self.assertEqual(t.by("s", {"p": [misc.top, "p", 2]}, raggedCols="p").getCol("p").tolist(),
+			[x.tolist() for x in act.by("s", "p").getCol("p")])
+
+		# Nulls rank highest, as they sort, and keys are kept.
+		n = Table({"k": [1, 2, 3, 4], "v": [1, 2, 3, 4]}).nullable("v", inPlace=False).key("k", inPlace=False)
+		n.setNull(1, "v")
+		act = n.top(2, "v")
+		self.assertEqual(act.keyCols(), ["k"])
+		self.assertEqual(act.unkey(inPlace=False).getCol("k").tolist(), [2, 4])
+		self.assertEqual(n.top(3, "v", False).unkey(inPlace=False).getCol("k").tolist(), [1, 3, 4])
+
+		n.unkey()
+		for k in [1, 4]:
+			self.assertEqual(n.top(k, "v"), n.sort("v", desc=True, inPlace=False).getRow(slice(0, k)))
+			self.assertEqual(n.top(k, "v", False), n.sort("v", inPlace=False).getRow(slice(0, k)))
+		self.assertRaisesRegex(TableException, "Unknown column: w", n.top, 2, "w")
+
+	def test_iasc_idesc(self):
+		t = Table({"x": [3, 1, 1, 2], "y": ["a", "z", "a", "b"]})
+		self.assertEqual(t.iasc("x").tolist(), [1, 2, 3, 0])
+		self.assertEqual(t.idesc(["x", "y"]).tolist(), [0, 3, 1, 2])
+		self.assertEqual(t, Table({"x": [3, 1, 1, 2], "y": ["a", "z", "a", "b"]})) # Untouched
+
+		# Apply to another table.
+		o = Table({"v": [30, 10, 11, 20]})
+		act = o.reorder(t.iasc("x"), inPlace=False)
+		self.assertEqual(act, Table({"v": [10, 11, 20, 30]}))
+		o.reorder(t.idesc("x"))
+		self.assertEqual(o, Table({"v": [30, 20, 10, 11]}))
+		self.assertRaisesRegex(TableException, "Reorder length, expected=4 got=2", o.reorder, [0, 1])
+
+	def test_attr(self):
+		t = Table({"x": [3, 1, 1, 2, 5, 2], "y": ["a", "z", "a", "b", "c", "b"], "f": [0.5, numpy.nan, 1.5, 1.5, 0.1, 2.0]})
+		self.assertEqual(t.attr("x"), "")
+		self.assertRaisesRegex(TableException, "Unknown column: w", t.attr, "w")
+
+		# Sorting sets it on the first column only.
+		s = t.sort(["x", "y"], inPlace=False)
+		self.assertEqual([s.attr(c) for c in s.cols()], ["s", "", ""])
+		self.assertEqual(t.sort("x", desc=True, inPlace=False).attr("x"), "p")
+		self.assertEqual(s.copy().attr("x"), "s")
+		self.assertEqual(s.takeCol(["y", "x"], inPlace=False).attr("x"), "s")
+
+		# Set and verified on demand, nulls allowed at the end.
+		self.assertRaisesRegex(TableException, "Column 'y' is not sorted", t.setAttr, "y", "s")
+		self.assertRaisesRegex(TableException, "Unknown attribute: 'q'", t.setAttr, "x", "q")
+		f = Table({"f": [0.1, 0.5, 1.5, numpy.nan, numpy.nan]}).setAttr("f", "s", inPlace=False)
+		self.assertEqual(f.attr("f"), "s")
+		self.assertRaisesRegex(TableException, "Column 'f' is not sorted", t.setAttr, "f", "s")
+		s.setAttr("x", "")
+		self.assertEqual(s.attr("x"), "")
+
+		# Dropped when violated, kept when not.
+		s = t.sort("x", inPlace=False)
+		s.append({"x": 5, "y": "d", "f": 0.0})
+		self.assertEqual(s.attr("x"), "s")
+		s.append({"x": 4, "y": "d", "f": 0.0})
+		self.assertEqual(s.attr("x"), "")
+		s = t.sort("x", inPlace=False)
+		s.deleteRow(2)
+		self.assertEqual(s.attr("x"), "s")
+		s.setRow(0, 0, "x")
+		self.assertEqual(s.attr("x"), "")
+		s = t.sort("x", inPlace=False)
+		s.setCol("x", s.getCol("x"))
+		self.assertEqual(s.attr("x"), "")
+
+		# Range lookups binary search, and give the same rows as a scan.
+		s = t.sort("f", inPlace=False)
+		u = s.copy().setAttr("f", "", inPlace=False)
+
+		for c in [[numpy.equal, "f", 1.5], [numpy.less, "f", 1.5], [numpy.less_equal, "f", 1.5],
+			[numpy.greater, "f", 0.3], [numpy.greater_equal, "f", 0.5], [numpy.less, 1.0, "f"],
+			[misc.within, "f", (0.2, 1.5)]]:
+			self.assertIsNotNone(s._attrRows(c))
+			self.assertEqual(s.where(c), u.where(c))
+
+		self.assertIsNone(s._attrRows([numpy.less, "f", "x"])) # Column, not a value
+		self.assertIsNone(u._attrRows([numpy.less, "f", 1.5]))
+		self.assertEqual(s.where([numpy.greater, "f", 0.3]).attr("f"), "s")
+
+		# Key lookups.
+		k = Table({"k": [1, 3, 5, 7], "v": ["a", "b", "c", "d"]}).key("k", inPlace=False)
+		k.setAttr("k", "s")
+		self.assertEqual(k.getKey(5), {"k": 5, "v": "c"})
+		self.assertEqual(k.getKey([7, 2, 1]).getCol("v").tolist(), ["d", "", "a"])
+
+		# As-of searches.
+		r = Table({"t": [1, 3, 5], "v": [10, 30, 50]})
+		l = Table({"t": [0, 1, 4, 9]})
+		exp = l.aj(r, ["t"], inPlace=False)
+		r.setAttr("t", "s")
+		self.assertEqual(l.aj(r, ["t"], inPlace=False), exp)
+
+	def test_attr_grouped(self):
+		t = Table({"s": ["a", "b", "a", "c", "b", "a"], "v": [1, 2, 3, 4, 5, 6], "f": [1.0, numpy.nan, 2.0, 1.0, numpy.nan, 3.0]})
+		ix = lambda t, c: {k: v.tolist() for k, v in t._attrIdx[c].items()} # Rows are kept as int64 arrays
+		g = t.setAttr(["s", "f"], "g", inPlace=False)
+		self.assertEqual(g.attr("s"), "g")
+		self.assertEqual(ix(g, "s"), {"a": [0, 2, 5], "b": [1, 4], "c": [3]})
+		self.assertEqual(g._attrIdx["s"]["a"].dtype, numpy.int64)
+		o = numpy.empty(2, dtype=object)
+		o[0], o[1] = [1], [2]
+		self.assertRaisesRegex(TableException, "Column 'o' can't be grouped", Table({"o": o}).setAttr, "o", "g")
+
+		# Filters only touch matching rows, and agree with a scan.
+		for c in [[operator.eq, "s", ["a"]], [operator.eq, ["b"], "s"], [misc.vin, "s", ("c", "a", "c")],
+			[numpy.isin, "s", numpy.array(["b", "z"])], [numpy.equal, "f", numpy.nan], [misc.vin, "f", (1.0, numpy.nan)]]:
+			self.assertIsNotNone(g._attrRows(c))
+			self.assertEqual(g.where(c), t.where(c))
+
+		self.assertIsNone(g._attrRows([operator.lt, "s", ["b"]])) # Grouping doesn't know about order
+		self.assertEqual(g.where([misc.vin, "s", ("c", "a")]).getCol("v").tolist(), [1, 3, 4, 6])
+
+		# Group bys.
+		a = {"n": [numpy.sum, "v"], "v": "v"}
+		for c in ["s", "f"]:
+			exp = t.by(c, a)
+			act = g.by(c, a)
+			self.assertEqual(act.deleteCol("v", inPlace=False), exp.deleteCol("v", inPlace=False))
+			for x, y in zip(act.getCol("v"), exp.getCol("v")): self.assertEqual(x.tolist(), y.tolist())
+
+		self.assertEqual(g.by({"k": "s"}, "v").cols(), ["k", "v"])
+
+		# Appends update the index, other changes drop it or rebuild it.
+		g.append({"s": "d", "v": 7, "f": 1.0})
+		g.append(Table({"s": ["a", "d"], "v": [8, 9], "f": [numpy.nan, 4.0]}))
+		self.assertEqual(ix(g, "s"), {"a": [0, 2, 5, 7], "b": [1, 4], "c": [3], "d": [6, 8]})
+		self.assertEqual(ix(g, "f")[Table._nullKey], [1, 4, 7])
+		self.assertEqual(g.by("f", {"n": [numpy.sum, "v"]}), g.setAttr("f", "", inPlace=False).by("f", {"n": [numpy.sum, "v"]}))
+		g.deleteRow([0, 1])
+		self.assertEqual(ix(g, "s"), {"a": [0, 3, 5], "c": [1], "b": [2], "d": [4, 6]})
+		self.assertEqual(ix(g.copy(), "s"), ix(g, "s"))
+		g.setRow(0, "z", "s")
+		self.assertEqual(g.attr("s"), "")
+		self.assertNotIn("s", g._attrIdx)
+		g.sort("v")
+		self.assertEqual(g._attrIdx, {})
+
+		# Key lookups.
+		k = Table({"k": ["x", "y", "z"], "v": [1, 2, 3]}).key("k", inPlace=False)
+		k.setAttr("k", "g")
+		self.assertEqual(k.getKey("y"), {"k": "y", "v": 2})
+		self.assertEqual(k.getKey(["z", "w"]).getCol("v").tolist(), [3, null.INT])
+
+		# Lookups agree with a scan when the value's type differs from the column's.
+		d = Table({"d": numpy.array(["2020-01-01", "2020-01-02", "2020-01-01"], dtype="datetime64[D]"), "v": [1, 2, 3]})
+		dg = d.setAttr("d", "g", inPlace=False)
+		for v in [numpy.datetime64("2020-01-01T00:00", "m"), numpy.datetime64("2020-01-01T00:01", "m")]:
+			self.assertEqual(dg.where([numpy.equal, "d", v]), d.where([numpy.equal, "d", v]))
+		dk = dg.key("d", inPlace=False)
+		self.assertEqual(dk.getKey(numpy.datetime64("2020-01-01T00:00", "m"))["v"], 1)
+		self.assertEqual(dk.getKey([numpy.datetime64("2020-01-02T00:01", "m")]).getCol("v").tolist(), [null.INT])
+		i = Table({"i": [1, 2, 1], "v": [1, 2, 3]}).setAttr("i", "g", inPlace=False)
+		self.assertEqual(i.where([numpy.equal, "i", 1.0]).getCol("v").tolist(), [1, 3])
+		self.assertEqual(len(i.where([numpy.equal, "i", 1.5])), 0)
+
+	def test_attr_parted(self):
+		t = Table({"s": ["b", "b", "a", "a", "a", "c"], "v": [1, 2, 3, 4, 5, 6], "f": [2.0, numpy.nan, numpy.nan, 1.0, 1.0, 3.0]})
+		p = t.setAttr(["s", "f"], "p", inPlace=False)
+		self.assertEqual(p._attrIdx["s"], {"b": [0, 2], "a": [2, 5], "c": [5, 6]})
+		self.assertEqual(p._attrIdx["f"], {2.0: [0, 1], Table._nullKey: [1, 3], 1.0: [3, 5], 3.0: [5, 6]})
+		self.assertRaisesRegex(TableException, "Column 'v' is not parted", Table({"v": [1, 2, 1]}).setAttr, "v", "p")
+
+		# Descending sorts leave the first column parted.
+		d = t.sort(["s", "v"], desc=True, inPlace=False)
+		self.assertEqual(d.attr("s"), "p")
+		self.assertNotIn("s", d._attrIdx) # Built when first needed
+		self.assertEqual(d._attrIndex("s"), {"c": [0, 1], "b": [1, 3], "a": [3, 6]})
+
+		# Even if the values can't be indexed, in which case lookups drop the attribute and scan.
+		o = numpy.empty(3, dtype=object)
+		o[0], o[1], o[2] = [1], [3], [2]
+		l = Table({"o": o, "v": [1, 2, 3]}).sort("o", desc=True, inPlace=False)
+		self.assertEqual(l.getCol("v").tolist(), [2, 3, 1])
+		self.assertEqual(l.where([operator.eq, "v", 3]).getCol("v").tolist(), [3])
+		self.assertEqual(len(l.by("o", {"n": [len, "v"]})), 3)
+		self.assertEqual(l.attr("o"), "")
+
+		# Filters and group bys are slices, and agree with a scan.
+		for c in [[operator.eq, "s", ["a"]], [misc.vin, "s", ("c", "b", "z")], [numpy.equal, "f", numpy.nan],
+			[numpy.equal, "f", 1.0]]:
+			self.assertIsNotNone(p._attrRows(c))
+			self.assertEqual(p.where(c), t.where(c))
+
+		for c in ["s", "f"]:
+			self.assertEqual(p.by(c, {"n": [numpy.sum, "v"]}), t.by(c, {"n": [numpy.sum, "v"]}))
+
+		# Appends extend the last run, or drop the attribute if they'd reopen an earlier one.
+		p.append(Table({"s": ["c", "d"], "v": [7, 8], "f": [3.0, 4.0]}))
+		self.assertEqual(p._attrIdx["s"], {"b": [0, 2], "a": [2, 5], "c": [5, 7], "d": [7, 8]})
+		p.append({"s": "d", "v": 9, "f": 1.0})
+		self.assertEqual(p.attr("s"), "p")
+		self.assertEqual(p.attr("f"), "")
+		p.deleteRow([0, 7])
+		self.assertEqual(p._attrIdx["s"], {"b": [0, 1], "a": [1, 4], "c": [4, 6], "d": [6, 7]})
+		p.append({"s": "a", "v": 10, "f": 1.0})
+		self.assertEqual(p.attr("s"), "")
+
+		# Key lookups.
+		k = Table({"k": ["x", "x", "y"], "v": [1, 2, 3]}).key("k", inPlace=False)
+		k.setAttr("k", "p")
+		self.assertEqual(k.getKey("y"), {"k": "y", "v": 3})
+		self.assertEqual(k.getKey(["x", "w"]).getCol("v").tolist(), [1, null.INT])
+
+		# Lookups agree with a scan when the value's type differs from the column's.
+		d = Table({"d": numpy.array(["2020-01-01", "2020-01-01", "2020-01-02"], dtype="datetime64[D]"), "v": [1, 2, 3]})
+		dp = d.setAttr("d", "p", inPlace=False)
+		for v in [numpy.datetime64("2020-01-02T00:00", "m"), numpy.datetime64("2020-01-02T00:01", "m")]:
+			self.assertEqual(dp.where([numpy.equal, "d", v]), d.where([numpy.equal, "d", v]))
+		dk = dp.key("d", inPlace=False)
+		self.assertEqual(dk.getKey(numpy.datetime64("2020-01-02T00:00", "m"))["v"], 3)
+
+	def test_memUsage(self):
+		o = numpy.empty(2, dtype=object)
+		o[0], o[1] = "abc", numpy.arange(10)
+		t = Table({"i": [1, 2], "s": ["a", "bbb"], "o": o}).nullable("i", inPlace=False).setAttr("s", "g", inPlace=False)
+		act = t.memUsage()
+		self.assertEqual(act.cols(), ["col", "type", "data", "payload", "waste", "hidden", "valid", "index", "total"])
+		self.assertEqual(act.getCol("col").tolist(), ["i", "s", "o"])
+		self.assertEqual(act.getCol("data").tolist(), [16, 24, 16])
+		self.assertEqual(act.getCol("waste").tolist(), [0, 8, 0])
+		self.assertGreater(act.getCol("payload")[2], 80) # Includes the nested array
+		self.assertEqual(act.getCol("valid").tolist(), [1, 0, 0])
+		self.assertEqual(act.getCol("index")[[0, 2]].tolist(), [0, 0])
+		self.assertGreater(act.getCol("index")[1], 0)
+		self.assertEqual(act.getCol("total").tolist(), (act.getCol("data") + act.getCol("payload") +
+			act.getCol("valid") + act.getCol("index")).tolist())
+
+		# Views keep their whole buffer alive.
+		c = next(Table({"x": numpy.arange(10)}).chunks(4))
+		self.assertEqual(c.memUsage().getCol("hidden").tolist(), [48])
+
+		# Summary of live tables.
+		s = Table.memSummary()
+		self.assertEqual(s.cols(), ["id", "rows", "cols", "bytes"])
+		self.assertIn(id(t), s.getCol("id").tolist())
+		b = s.getCol("bytes")
+		self.assertTrue((b[:-1] >= b[1:]).all())
+
 	def test_mkNullRow(self):
 		# All rows.
 		t = Table({"i": [1], "f": [1.2], "d": [numpy.datetime64("today")],
@@ -1438,6 +2002,47 @@ class TableTest(TestCase):
 		exp = Table({"x": [0, 1, 2, 3], "time": [1, 5, 7, 9], "y": [0, 0, 10, 10]})
 		self.assertEqual(act, exp)
 
+		# Right table not sorted, and ties take the last row.
+		right = Table({"sym": ["b", "a", "a", "b", "a"], "time": [3, 6, 0, 1, 6], "y": [0, 1, 2, 3, 4]})
+		left = Table({"sym": ["a", "b", "a", "b", "c"], "time": [7, 2, 0, 0, 9]})
+		act = left.aj(right, ["sym", "time"], inPlace=False)
+		self.assertEqual(list(act.getCol("y")), [4, 3, 2, null.INT, null.INT])
+
+		# Null as-of values match nothing, and nullable columns mark misses in their bitmaps.
+		right = Table({"time": [0.0, 1.0], "y": [1, 2]})
+		right.nullable("y")
+		act = Table({"time": [0.5, numpy.nan, -1.0, 2.0]}).aj(right, ["time"], inPlace=False)
+		self.assertEqual(list(act.nullMask("y")), [False, True, True, False])
+		self.assertEqual(act.getRow([0, 3]).getCol("y").tolist(), [1, 2])
+
+		# Same for nulls of nullable as-of columns, on either side, whatever value sits underneath.
+		right = Table({"time": [1, 5], "y": [7, 8]}).nullable("time", inPlace=False)
+		right.setNull(1, "time")
+		left = Table({"time": [6, 6, 0]}).nullable("time", inPlace=False)
+		left.setNull(1, "time")
+		act = left.aj(right, ["time"], inPlace=False)
+		self.assertEqual(act.getCol("y").tolist(), [7, null.INT, null.INT])
+		act = left.aj(right.setAttr("time", "s", inPlace=False), ["time"], inPlace=False)
+		self.assertEqual(act.getCol("y").tolist(), [7, null.INT, null.INT])
+
+		# An empty right table misses everywhere.
+		act = Table({"time": [0.5, 1.0]}).aj(right[[]], ["time"], inPlace=False)
+		self.assertEqual(list(act.nullMask("y")), [True, True])
+		self.assertEqual(act.type("y"), "int64")
+
+		# Same as a brute force search.
+		rng = numpy.random.default_rng(0)
+		right = Table({"k1": rng.integers(0, 3, 200), "k2": rng.integers(0, 2, 200), "time": rng.integers(0, 50, 200),
+			"y": numpy.arange(200)})
+		left = Table({"k1": rng.integers(0, 4, 100), "k2": rng.integers(0, 2, 100), "time": rng.integers(0, 60, 100)})
+		act = left.aj(right, ["k1", "k2", "time"], inPlace=False)
+		k1, k2, tm = right.getCol("k1"), right.getCol("k2"), right.getCol("time")
+
+		for i, row in enumerate(left):
+			m = numpy.flatnonzero((k1 == row["k1"]) & (k2 == row["k2"]) & (tm <= row["time"]))
+			exp = null.INT if len(m) == 0 else m[numpy.lexsort((m, tm[m]))][-1]
+			self.assertEqual(act.getCol("y")[i], exp)
+
 	def test_getitem(self):
 		# Row.
 		t = Table({"c1": [1, 2, 3], "c2": [1.1, 2.2, 3.3]})
@@ -1619,12 +2224,229 @@ class TableTest(TestCase):
 			self.assertEqual(row, table.getRow(i))
 			i += 1
 
+	def test_rows(self):
+		t = Table({"x": [1, 2, 3], "y": ["a", "b", "c"], "bad name": [1.1, 2.2, 3.3]})
+
+		# All columns.
+		act = list(t.rows())
+		self.assertEqual(len(act), 3)
+		self.assertEqual(act[1].x, 2)
+		self.assertEqual(act[1].y, "b")
+		self.assertEqual(act[1]._2, 2.2) # Renamed
+		self.assertEqual(tuple(act[2]), (3, "c", 3.3))
+
+		# Subset of columns.
+		act = [r.y for r in t.rows("y")]
+		self.assertEqual(act, ["a", "b", "c"])
+
+		# Keyed tables still iterate over rows.
+		t.key("y")
+		self.assertEqual([r.x for r in t.rows()], [1, 2, 3])
+
+	def test_itercols(self):
+		d = numpy.array(["2021-10-23", "2021-10-24", "2021-10-25"]).astype(numpy.datetime64)
+		t = Table({"x": [1, 2, 3], "y": ["a", "b", "c"], "d": d, "b": [True, False, True]})
+
+		# All columns, same values as `getRow`.
+		act = list(t.itercols())
+		for i in range(len(t)): self.assertEqual(act[i], tuple(t.getRow(i).values()))
+		self.assertIsInstance(act[0][2], numpy.datetime64) # Datetimes stay numpy
+
+		# Chosen columns, across chunks.
+		mock.mock(Table, "_iterChunk", 2)
+		act = list(t.itercols(["y", "x"]))
+		self.assertEqual(act, [("a", 1), ("b", 2), ("c", 3)])
+
+		# Nullable nulls.
+		t.nullable("b")
+		t.setNull(1, "b")
+		self.assertEqual([r[0] for r in t.itercols("b")], [True, None, True])
+
+		# Empty.
+		self.assertEqual(list(Table({"x": "i"}).itercols()), [])
+
+		# Unknown column.
+		self.assertRaisesRegex(TableException, "Unknown column: z", list, t.itercols("z"))
+
+	def test_iter_independent(self):
+		# Iterators don't share state.
+		table = Table({"x": [1, 2, 3]})
+		a = iter(table)
+		self.assertEqual(next(a), {"x": 1})
+		b = iter(table)
+		self.assertEqual(next(b), {"x": 1})
+		self.assertEqual(next(a), {"x": 2})
+		self.assertEqual([r["x"] for r in table for s in table], [1, 1, 1, 2, 2, 2, 3, 3, 3])
+
+	def test_chunks(self):
+		t = Table({"x": list(range(10)), "y": [1.5*i for i in range(10)]})
+
+		# Blocks.
+		act = list(t.chunks(4))
+		self.assertEqual([len(c) for c in act], [4, 4, 2])
+		self.assertEqual(act[1], t.getRow(slice(4, 8)))
+		self.assertEqual(Table.raze(act), t)
+
+		# Views, not copies.
+		self.assertTrue(numpy.shares_memory(act[2]._dict["x"], t._dict["x"]))
+		act[0].setRow(0, 100, "x")
+		self.assertEqual(t.getRow(0)["x"], 100)
+
+		# Independent iteration.
+		a = t.chunks(3)
+		b = t.chunks(5)
+		self.assertEqual(len(next(a)), 3)
+		self.assertEqual(len(next(b)), 5)
+		self.assertEqual(len(next(a)), 3)
+		self.assertEqual(len(next(b)), 5)
+
+		# Keys and nulls carry over.
+		t.key("x")
+		t.nullable("y")
+		t.setNull([3, 9], "y")
+		act = list(t.chunks(8)) + list(t.chunks(3))
+		self.assertTrue(all(c.keyCols() == ["x"] for c in act))
+		self.assertEqual(list(act[0].nullMask("y")), [False]*3 + [True] + [False]*4)
+		self.assertEqual(list(act[1].nullMask("y")), [False, True])
+		self.assertEqual(list(act[3].nullMask("y")), [True, False, False])
+		self.assertEqual(list(act[5].nullMask("y")), [True])
+
+		# Nulls only change the block.
+		act[0].setNull(0, "y")
+		self.assertEqual(act[0].nullMask("y")[0], True)
+		self.assertEqual(t.nullMask("y")[0], False)
+
+		# Bad size and empty table.
+		self.assertRaisesRegex(TableException, "Chunk size must be positive, n=0", list, t.chunks(0))
+		self.assertEqual(list(Table({"x": "i"}).chunks(2)), [])
+
 	def test_distinct(self):
 		t = Table({"x": [1, 1, 1, 2, 2, 2], "y": ["a", "b", "a", "c", "c", "c"]})
 		act = t.distinct()
 		ex = Table({"x": [1, 1, 2], "y": ["a", "b", "c"]})
 		self.assertEqual(act, ex)
 
+	def test_isIn(self):
+		t = Table({"x": [1, 2, 3, 1], "y": ["a", "b", "c", "b"], "z": [0.5, numpy.nan, 1.0, 2.0]})
+		u = Table({"y": ["bb", "b", "a"], "x": [2, 2, 1], "z": [numpy.nan, numpy.nan, 0.5]})
+		self.assertEqual(t.isIn(u).tolist(), [True, True, False, False]) # Column order doesn't matter, NaNs match
+		self.assertEqual(t.isIn(u, "x").tolist(), [True, True, False, True])
+		self.assertEqual(t.isIn(u, ["y"]).tolist(), [True, True, False, True]) # Strings of different widths
+		self.assertEqual(t.isIn(u[:0]).tolist(), [False]*4) # Empty
+		self.assertEqual(t[:0].isIn(u).tolist(), [])
+		self.assertRaisesRegex(TableException, "Unknown column: w", t.isIn, u, "w")
+
+		# Nulls match whatever is underneath, and types that can't be compared never match.
+		t = Table({"x": [1, 2, 3]})
+		t.nullable("x")
+		t.setNull([0, 1], "x")
+		u = Table({"x": [5]})
+		u.nullable("x")
+		u.setNull(0, "x")
+		self.assertEqual(t.isIn(u).tolist(), [True, True, False])
+		self.assertEqual(Table({"x": ["1", "2"]}).isIn(Table({"x": [1, 2]})).tolist(), [False, False])
+
+		# Objects, including unhashable ones.
+		o = numpy.empty(3, dtype=object)
+		o[:] = [[1], [2], "a"]
+		p = numpy.empty(2, dtype=object)
+		p[:] = [[2], "a"]
+		self.assertEqual(Table({"o": o}).isIn(Table({"o": p})).tolist(), [False, True, True])
+
+	def test_where(self):
+		t = Table({"x": [1, 2, 3, 4, 5], "y": ["a", "b", "a", "b", "a"], "b": [True, False, True, True, False]})
+		gt = lambda x, y: x > y
+		eq = lambda x, y: x == y
+
+		# Single clause.
+		act = t.where([gt, "x", 2])
+		self.assertEqual(act, t.getRow([2, 3, 4]))
+
+		# Boolean column.
+		act = t.where("b")
+		self.assertEqual(act, t.getRow([0, 2, 3]))
+
+		# Multiple clauses, later ones only see survivors.
+		seen = []
+		def spy(x):
+			seen.append(len(x))
+			return x == "a"
+
+		act = t.where([[gt, "x", 2], [spy, "y"]])
+		self.assertEqual(act, t.getRow([2, 4]))
+		self.assertEqual(seen, [3])
+
+		# Short circuit once nothing is left.
+		seen.clear()
+		act = t.where([[gt, "x", 10], [spy, "y"]])
+		self.assertEqual(len(act), 0)
+		self.assertEqual(act.cols(), t.cols())
+		self.assertEqual(seen, [])
+
+		# Scalar result and string literals.
+		self.assertEqual(t.where([eq, 1, 1]), t)
+		self.assertEqual(t.where([eq, "y", ["b"]]), t.getRow([1, 3]))
+
+		# Keyed tables are filtered on rows and stay keyed.
+		k = t.key("x", inPlace=False)
+		act = k.where([eq, "y", ["b"]])
+		exp = t.getRow([1, 3])
+		exp.key("x")
+		self.assertEqual(act, exp)
+
+		# Nulls of nullable columns don't satisfy conditions, whatever value sits underneath.
+		n = t.nullable("x", inPlace=False)
+		n.setNull(0, "x")
+		self.assertEqual(len(n.where([numpy.equal, "x", 1])), 0)
+		self.assertEqual(n.where([numpy.greater, "x", 0]), n.getRow([1, 2, 3, 4]))
+		self.assertEqual(n.where([operator.le, "x", 2]), n.getRow([1]))
+		n.append({"x": None, "y": "c", "b": True}) # Placeholder underneath is null.INT
+		self.assertEqual(n.where([operator.lt, "x", 0]).getCol("y").tolist(), [])
+		self.assertEqual(n.where([[operator.ne, "x", 3], "b"]), n.getRow([3]))
+		self.assertEqual(len(n.where([numpy.equal, "x", None])), 0)
+
+		# Errors.
+		self.assertRaisesRegex(TableException, "Unknown column: z", t.where, [gt, "z", 1])
+		self.assertRaisesRegex(TableException, "Where clause must give booleans, got int64", t.where, "x")
+		self.assertRaisesRegex(TableException, "Where clause length, expected=5 got=2", t.where, [lambda: [True, False]])
+
+	def test_select(self):
+		t = Table({"x": [1, 2, 3, 4], "y": [10, 20, 30, 40], "z": ["a", "b", "a", "b"]})
+		eq = lambda x, y: x == y
+		times = lambda x, y: x*y
+
+		# Everything.
+		self.assertEqual(t.select(), t)
+		self.assertEqual(t.select(where=[eq, "z", ["a"]]), t.getRow([0, 2]))
+
+		# Columns.
+		self.assertEqual(t.select(["z", "x"]), Table({"z": ["a", "b", "a", "b"], "x": [1, 2, 3, 4]}))
+		self.assertEqual(t.select("y", [eq, "z", ["b"]]), Table({"y": [20, 40]}))
+
+		# Clauses, with scalar extension.
+		act = t.select({"xy": [times, "x", "y"], "one": 1}, [eq, "z", ["a"]])
+		self.assertEqual(act, Table({"xy": [10, 90], "one": [1, 1]}))
+
+		# All atoms give a single row.
+		act = t.select({"s": [sum, "y"], "n": [len, "x"]}, [eq, "z", ["b"]])
+		self.assertEqual(act, Table({"s": [60], "n": [2]}))
+
+		# Keys are kept if selected as is.
+		k = t.key("z", inPlace=False)
+		self.assertEqual(k.select(["z", "x"]).keyCols(), ["z"])
+		self.assertEqual(k.select({"z": [eq, "z", ["a"]], "x": "x"}).keyCols(), [])
+		self.assertEqual(k.select("x").keyCols(), [])
+
+		# Nullable columns stay nullable.
+		n = t.nullable("y", inPlace=False)
+		n.setNull(1, "y")
+		act = n.select(["y"], [eq, "z", ["b"]])
+		self.assertTrue(act.isNullable("y"))
+		self.assertEqual(list(act.nullMask("y")), [True, False])
+
+		# Unknown column.
+		self.assertRaisesRegex(TableException, "Unknown column: w", t.select, ["x", "w"])
+
 	def test_by(self):
 		# Single simple.
 		t = Table({"x": [1, 2, 1, 1, 2], "y": [10, 20, 30, 40, 50], "z": ["a", "b", "c", "d", "e"]})
@@ -1693,6 +2515,81 @@ class TableTest(TestCase):
 		# Key type error.
 		self.assertRaisesRegex(TableException, "Incorrect clause key type: <class 'int'>", t.by, ["x", 1], "y")
 
+	def test_by_threads(self):
+		# Same result whatever the thread count, with many groups (split by group ranges) or few (split by column).
+		r = numpy.random.default_rng(0)
+		t = Table({"k": r.integers(0, 50, 1000), "j": r.integers(0, 2, 1000), "v": r.random(1000)})
+		a = {"s": [numpy.sum, "v"], "m": [numpy.max, "v"], "n": [len, "v"]}
+		exp = t.by("k", a)
+		self.assertEqual(exp.cols(), ["k", "s", "m", "n"])
+		self.assertEqual(exp.getCol("k").tolist(), list(dict.fromkeys(t.getCol("k").tolist())))
+		self.assertEqual(t.by("k", a, threads=4), exp)
+		self.assertEqual(t.by("j", a, threads=1), t.by("j", a, threads=8))
+
+		# Class default.
+		Table.setByThreads(3)
+		try:
+			self.assertEqual(t.by("k", a), exp)
+		finally:
+			Table.setByThreads(1)
+
+		# Errors propagate.
+		boom = lambda x: 1/0
+		self.assertRaises(ZeroDivisionError, t.by, "k", {"x": [boom, "v"]}, threads=4)
+		self.assertRaisesRegex(TableException, "Thread count must be positive, threads=0", t.by, "k", a, threads=0)
+		self.assertRaisesRegex(TableException, "Thread count must be positive, threads=0", Table.setByThreads, 0)
+
+		# Nulls group together.
+		t = Table({"k": [1.0, numpy.nan, 2.0, numpy.nan], "v": [1, 2, 3, 4]})
+		self.assertEqual(t.by("k", {"v": [numpy.sum, "v"]}).getCol("v").tolist(), [1, 6, 3])
+
+	def test_by_workers(self):
+		# Same result as in process, with functions that can't be pickled, and nulls.
+		r = numpy.random.default_rng(0)
+		t = Table({"k": r.integers(0, 20, 500), "v": r.random(500), "s": r.choice(["a", "b", "c"], 500)})
+		t.setNull(3, "v")
+		a = {"n": [lambda x: len(x), "v"], "m": [numpy.sum, "v"], "s": [lambda x: str.join("", sorted(set(x))), "s"],
+			"v": "v"}
+		exp = t.by("k", a)
+		act = t.by("k", a, workers=3)
+		self.assertEqual(act.deleteCol("v", inPlace=False), exp.deleteCol("v", inPlace=False))
+		for x, y in zip(act.getCol("v"), exp.getCol("v")): self.assertTrue(numpy.array_equal(x, y, equal_nan=True))
+		self.assertIsNone(Table._byJob)
+
+		# More workers than groups.
+		act = t.by("k", {"m": [numpy.sum, "v"]}, workers=50)
+		self.assertEqual(act.keyCols(), ["k"])
+		self.assertEqual(act.unkey(inPlace=False), exp.takeCol(["k", "m"], inPlace=False))
+
+		# Errors propagate.
+		boom = lambda x: 1/0
+		self.assertRaises(ZeroDivisionError, t.by, "k", {"x": [boom, "v"]}, workers=2)
+		self.assertIsNone(Table._byJob)
+		self.assertRaisesRegex(TableException, "Worker count must be positive, workers=0", t.by, "k", a, workers=0)
+
+		# Processes only fork while no other thread is running, otherwise threads do the work.
+		pools = []
+		og = concurrent.futures.ProcessPoolExecutor
+		mock.mock(concurrent.futures, "ProcessPoolExecutor", lambda *args, **kwargs: pools.append(1) or og(*args, **kwargs))
+		t.by("k", {"m": [numpy.sum, "v"]}, workers=2)
+		self.assertEqual(len(pools), 1)
+
+		stop = threading.Event()
+		th = threading.Thread(target=stop.wait)
+		th.start()
+
+		try:
+			res = [None]*2
+			calls = [threading.Thread(target=lambda i=i: res.__setitem__(i, t.by("k", a, workers=2))) for i in range(2)]
+			for c in calls: c.start()
+			for c in calls: c.join()
+		finally:
+			stop.set()
+			th.join()
+
+		self.assertEqual(len(pools), 1)
+		for r in res: self.assertEqual(r.deleteCol("v", inPlace=False), exp.deleteCol("v", inPlace=False))
+
 	def test_join(self):
 		# Normal case.
 		base = Table({"x": [1, 2, 3], "y": ["a", "b", "c"]})
@@ -1766,4 +2663,81 @@ class TableTest(TestCase):
 		right = Table({"x": [1, 1], "y": [10, 20]})
 		left.lj(right, "x")
 		exp = Table({"x": [1], "y": [10]})
-		self.assertEqual(left, exp)
\ No newline at end of file
+		self.assertEqual(left, exp)
+
+	def test_eq(self):
+		t = Table({"x": [1, null.INT, 3], "y": [1.1, null.FLOAT, 3.3], "z": ["a", "", "c"]})
+
+		# Nulls are equal.
+		self.assertEqual(t, t.copy())
+		self.assertEqual(Table({"y": [null.FLOAT]}), Table({"y": [null.FLOAT]}))
+
+		# But not to values.
+		self.assertNotEqual(t, Table({"x": [1, 2, 3], "y": [1.1, null.FLOAT, 3.3], "z": ["a", "", "c"]}))
+		self.assertNotEqual(t, Table({"x": [1, null.INT, 3], "y": [1.1, 2.2, 3.3], "z": ["a", "", "c"]}))
+
+		# String width doesn't matter.
+		self.assertEqual(Table({"s": numpy.array(["a", "b"], "<U1")}), Table({"s": numpy.array(["a", "b"], "<U10")}))
+
+		# Schema.
+		self.assertNotEqual(t, 1)
+		self.assertNotEqual(t, t.takeCol(["x", "y"], inPlace=False))
+		self.assertNotEqual(t, t.key("x", inPlace=False))
+		self.assertNotEqual(t, t.getRow([0, 1]))
+
+		# Difference in a later chunk.
+		mock.mock(Table, "_eqChunk", 2)
+		u = t.copy()
+		self.assertEqual(t, u)
+		u.setRow(2, 4, "x")
+		self.assertNotEqual(t, u)
+		u = t.copy()
+		u.setRow(1, 2.2, "y")
+		self.assertNotEqual(t, u)
+
+		# Empty.
+		self.assertEqual(Table({"x": "i"}), Table({"x": "i"}))
+
+	def test_equals(self):
+		t = Table({"x": [1, 2, 2, 3], "y": [1.1, null.FLOAT, null.FLOAT, -0.0], "z": ["a", "bc", "bc", ""],
+			"w": numpy.array([None, "o", "o", (1, 2)], dtype=object)})
+
+		# Ordered is the same as `==`.
+		u = t.getRow([3, 1, 0, 2])
+		self.assertTrue(t.equals(t.copy(), ordered=True))
+		self.assertFalse(t.equals(u, ordered=True))
+
+		# Unordered.
+		self.assertTrue(t.equals(u))
+		self.assertTrue(u.equals(t))
+		u.setRow(0, 0.0, "y") # Signed zeros are equal
+		self.assertTrue(t.equals(u))
+		u.setRow(3, "zz", "z") # Wider string column
+		u.setRow(3, "bc", "z")
+		self.assertTrue(t.equals(u))
+		u.setRow(0, 4, "x")
+		self.assertFalse(t.equals(u))
+
+		# Multiplicity matters.
+		self.assertFalse(Table({"x": [1, 1, 2]}).equals(Table({"x": [1, 2, 2]})))
+
+		# Schema.
+		self.assertFalse(t.equals(t.takeCol(["x", "y"], inPlace=False)))
+		self.assertFalse(t.equals(t.getRow([0, 1])))
+		self.assertFalse(t.equals(None))
+
+		# Nullable columns ignore values under nulls.
+		a = Table({"x": [1, 2]}).nullable("x", inPlace=False)
+		b = a.copy()
+		a.setNull(0)
+		b.setRow(0, 100, "x")
+		b.setNull(0)
+		self.assertTrue(a.equals(b.getRow([1, 0])))
+
+		# Collisions are resolved by comparing values.
+		mock.mock(Table, "_rowHash", lambda self: numpy.zeros(len(self), numpy.uint64))
+		self.assertTrue(t.equals(t.getRow([3, 1, 0, 2])))
+		self.assertFalse(t.equals(t.getRow([3, 1, 0, 0])))
+
+		# Empty.
+		self.assertTrue(Table({"x": "i"}).equals(Table({"x": "i"})))